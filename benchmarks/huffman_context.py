@@ -0,0 +1,49 @@
+"""Compares order 0 Huffman coding with the order 1 context model: compression ratio and
+compression and decompression throughput.
+
+Run from the project root:
+    python -m benchmarks.huffman_context [file ...]
+
+Without arguments, the text files in tests/ are used.
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+from compressor.compression_methods import Huffman
+
+DEFAULT_FILES = sorted(Path("tests").glob("*.txt"))
+
+
+def main() -> None:
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(dest="files", type=Path, nargs="*", default=DEFAULT_FILES)
+    args = arg_parser.parse_args()
+
+    print(f"{'file':<28} {'order':>5} {'ratio':>7} {'compress':>13} {'decompress':>13}")
+    for file in args.files:
+        data = file.read_bytes()
+        size_mb = len(data) / 1024**2
+
+        for order in (0, 1):
+            h = Huffman(order=order)
+
+            start = perf_counter()
+            compressed = h.compress_bytes(data)
+            compress_time = perf_counter() - start
+
+            start = perf_counter()
+            decompressed = h.decompress_bytes(compressed)
+            decompress_time = perf_counter() - start
+            assert decompressed == data
+
+            print(
+                f"{file.name:<28} {order:>5} {len(compressed) / len(data):>7.3f} "
+                + f"{size_mb / compress_time:>8.2f} MB/s "
+                + f"{size_mb / decompress_time:>8.2f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compares Huffman decoding with the table-driven decoder against the per-bit tree walk
+it replaced.
+
+Run from the project root:
+    python -m benchmarks.huffman_decode [file]
+"""
+
+from argparse import ArgumentParser
+from io import BytesIO
+from pathlib import Path
+from time import perf_counter
+
+from bitarray import bitarray
+
+from compressor.compression_methods import Huffman
+from compressor.compression_methods.huffman_tree import HuffmanTreeNode
+
+DEFAULT_FILE = Path("tests/large_ascii_eng.txt")
+
+
+def build_tree(codes: dict[int, bitarray]) -> HuffmanTreeNode:
+    """Builds the Huffman tree corresponding to the given codes."""
+    huffman_tree = HuffmanTreeNode("", 0)
+    for symbol, code in codes.items():
+        node = huffman_tree
+        for bit in code:
+            if bit:
+                node.right = node.right or HuffmanTreeNode("", 0)
+                node = node.right
+            else:
+                node.left = node.left or HuffmanTreeNode("", 0)
+                node = node.left
+        node.char = chr(symbol)
+
+    return huffman_tree
+
+
+def tree_walk_decode(compressed: bytes) -> bytes:
+    """Decodes compressed data by walking the Huffman tree one bit at a time."""
+    h = Huffman()
+    bin_in = BytesIO(compressed)
+    padding_len, codes = h._read_headers(bin_in, bin_in.read(1))
+    huffman_tree = build_tree(codes)
+
+    encoded_text = bitarray()
+    encoded_text.frombytes(bin_in.read())
+    if padding_len > 0:
+        del encoded_text[-padding_len:]
+
+    result: list[str] = []
+    current_node = huffman_tree
+    for bit in encoded_text:
+        if bit == 0 and current_node.left is not None:
+            current_node = current_node.left
+        elif bit == 1 and current_node.right is not None:
+            current_node = current_node.right
+
+        if current_node.left is None and current_node.right is None:
+            result.append(current_node.char)
+            current_node = huffman_tree
+
+    return "".join(result).encode(HuffmanTreeNode.TREE_TEXT_ENCODING)
+
+
+def table_decode(compressed: bytes) -> bytes:
+    """Decodes compressed data with `Huffman.decompress_bytes`."""
+    return Huffman().decompress_bytes(compressed)
+
+
+def main() -> None:
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(dest="file", type=Path, nargs="?", default=DEFAULT_FILE)
+    args = arg_parser.parse_args()
+
+    data = args.file.read_bytes()
+    compressed = Huffman().compress_bytes(data)
+    size_mb = len(data) / 1024**2
+
+    print(f"{args.file}: {size_mb:.2f} MB, {len(compressed) / 1024**2:.2f} MB compressed")
+    for name, decode in (("tree walk", tree_walk_decode), ("table", table_decode)):
+        start = perf_counter()
+        decoded = decode(compressed)
+        elapsed = perf_counter() - start
+        assert decoded == data
+        print(f"{name:>10}: {elapsed:.3f}s ({size_mb / elapsed:.2f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
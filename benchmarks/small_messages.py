@@ -0,0 +1,74 @@
+"""Compares compressing and decompressing many small messages one by one with
+`CompressionMethod.compress_bytes`/`decompress_bytes` against reusable `Compressor` and
+`Decompressor` objects.
+
+Run from the project root:
+    python -m benchmarks.small_messages [file] [--size N]
+
+The messages are consecutive slices of the file. The dictionaries of the primed modes
+are trained from the first 10% of the messages.
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+from compressor.compression_methods import (
+    Huffman,
+    HuffmanDictionary,
+    LZW,
+    LZWDictionary,
+)
+from compressor.compression_methods.interface import CompressionMethod
+
+DEFAULT_FILE = Path("tests/repetitive_ascii.txt")
+MESSAGE_COUNT = 5000
+
+
+def messages_per_second(func: Callable[[bytes], bytes], messages: list[bytes]) -> float:
+    start = perf_counter()
+    for message in messages:
+        func(message)
+    return len(messages) / (perf_counter() - start)
+
+
+def main() -> None:
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(dest="file", type=Path, nargs="?", default=DEFAULT_FILE)
+    arg_parser.add_argument("--size", type=int, default=200, help="Message size in bytes")
+    args = arg_parser.parse_args()
+
+    data = args.file.read_bytes()
+    messages = [
+        data[i : i + args.size]
+        for i in range(0, min(len(data), args.size * MESSAGE_COUNT), args.size)
+    ]
+    samples = messages[: len(messages) // 10]
+
+    methods: dict[str, CompressionMethod] = {
+        "lzw": LZW(),
+        "lzw variable width": LZW(variable_width=True),
+        "lzw primed": LZW(dictionary=LZWDictionary.train(samples)),
+        "huffman": Huffman(),
+        "huffman dictionary": Huffman(dictionary=HuffmanDictionary.train(samples)),
+    }
+
+    print(f"{len(messages)} messages of {args.size} bytes, messages/s")
+    print(f"{'method':<20} {'compress':>9} {'objects':>9} {'decompress':>11} {'objects':>9}")
+    for name, method in methods.items():
+        compressed = [method.compress_bytes(message) for message in messages]
+        compressor = method.compressor()
+        decompressor = method.decompressor()
+
+        print(
+            f"{name:<20} "
+            + f"{messages_per_second(method.compress_bytes, messages):>9.0f} "
+            + f"{messages_per_second(compressor.compress, messages):>9.0f} "
+            + f"{messages_per_second(method.decompress_bytes, compressed):>11.0f} "
+            + f"{messages_per_second(decompressor.decompress, compressed):>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Measures the startup time of the cli: running `compressor -h` and compressing and
+decompressing a tiny file, each in a new Python process, against starting Python alone.
+Also lists the modules slow to import that `-h` loads, which should be none.
+
+Run from the project root:
+    python -m benchmarks.startup [--runs N]
+
+Times are in milliseconds, the best and the median of the runs.
+"""
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+
+# Runs the cli with the args given after it, like the `compressor` script
+CLI = "import sys; from compressor.cli import run; sys.argv[0] = 'compressor'; run()"
+
+# Modules that make up most of the import time, imported only when they are needed
+HEAVY_MODULES = [
+    "bitarray",
+    "multiprocessing",
+    "concurrent.futures.process",
+    "tempfile",
+    "json",
+    "compressor.compression_methods.huffman",
+    "compressor.compression_methods.lzw",
+]
+TINY_DATA = b"The quick brown fox jumps over the lazy dog.\n"
+
+
+def cli(*args: str) -> list[str]:
+    return [sys.executable, "-c", CLI, *args]
+
+
+def run_times(command: Callable[[int], list[str]], runs: int) -> list[float]:
+    """Returns the time in milliseconds of running command(i) for each run i."""
+    times: list[float] = []
+    for i in range(runs):
+        args = command(i)
+        start = perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+        times.append((perf_counter() - start) * 1000)
+    return times
+
+
+def imported_heavy_modules(*args: str) -> list[str]:
+    """Returns the modules of `HEAVY_MODULES` imported by running the cli with args."""
+    check = (
+        f"try:\n    {CLI}\nexcept SystemExit:\n    pass\n"
+        + f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check, *args], check=True, capture_output=True, text=True
+    )
+    return [module for module in result.stdout.splitlines()[-1].split(",") if module]
+
+
+def main() -> None:
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument("--runs", type=int, default=20, help="Runs per command")
+    args = arg_parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        tmp = Path(tmp_dir)
+        tiny = tmp / "tiny.txt"
+        tiny.write_bytes(TINY_DATA)
+
+        # Name -> function returning the command of the i:th run, with a new output
+        # file for each run
+        commands: dict[str, Callable[[int], list[str]]] = {
+            "python": lambda i: [sys.executable, "-c", "pass"],
+            "compressor -h": lambda i: cli("-h"),
+        }
+        for method in ("lzw", "huffman"):
+            compressed = tmp / f"tiny.{method}"
+            subprocess.run(
+                cli("compress", method, str(tiny), str(compressed)),
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            commands[f"compress {method}"] = lambda i, method=method: cli(
+                "compress", method, str(tiny), str(tmp / f"{i}.{method}")
+            )
+            commands[f"decompress {method}"] = lambda i, method=method, compressed=(
+                compressed
+            ): cli("decompress", method, str(compressed), str(tmp / f"{i}.txt"))
+
+        print(f"{'command':<20} {'best':>7} {'median':>7}")
+        for name, command in commands.items():
+            times = run_times(command, args.runs)
+            print(f"{name:<20} {min(times):>7.1f} {median(times):>7.1f}")
+            for output in tmp.glob("[0-9]*"):
+                output.unlink()
+
+    heavy = imported_heavy_modules("-h")
+    print(f"Slow imports loaded by -h: {', '.join(heavy) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Benchmark suite for comparing the performance of the compression methods between
+releases: compression and decompression throughput, compression ratio and peak memory
+use for the text files in tests/ and synthetic inputs of several sizes, and the latency
+of compressing and decompressing small messages one by one.
+
+The results are output as JSON, to be saved and compared with the results of a later
+run, either by diffing the files or with --baseline, which reports the throughputs and
+ratios that got worse by more than the tolerance and exits with status 1 if any did.
+
+Run from the project root:
+    python -m benchmarks.suite [--output results.json] [--baseline old.json]
+
+Throughputs are the best of --repeat runs. Peak memory is measured with tracemalloc in a
+separate run, as tracing slows down allocations.
+"""
+
+import json
+import platform
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from random import Random
+from statistics import median, quantiles
+from time import perf_counter, perf_counter_ns
+from typing import Any, Callable
+
+from compressor.compression_methods import LZW, Huffman
+from compressor.compression_methods.interface import CompressionMethod
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+FORMAT_VERSION = 1
+DEFAULT_FILES = sorted(Path("tests").glob("*.txt"))
+DEFAULT_SIZES = [64 * 1024, 1024 * 1024]
+DEFAULT_MESSAGE_SIZES = [64, 1024]
+MESSAGE_COUNT = 1000
+
+METHODS: dict[str, Callable[[], CompressionMethod]] = {
+    "lzw": LZW,
+    "lzw-variable-width": lambda: LZW(variable_width=True),
+    "huffman": Huffman,
+    "huffman-order1": lambda: Huffman(order=1),
+}
+
+
+def random_bytes(size: int) -> bytes:
+    """Uniformly random bytes, which no method can compress."""
+    return Random(0).randbytes(size)
+
+
+def text(size: int) -> bytes:
+    """Words of a random vocabulary with Zipf distributed frequencies, like natural
+    language text."""
+    rng = Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = [
+        "".join(rng.choices(letters, k=rng.randint(1, 10))) for _ in range(5000)
+    ]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    words = rng.choices(vocabulary, weights, k=size // 4 + 1)
+    return " ".join(words).encode()[:size]
+
+
+def runs(size: int) -> bytes:
+    """Runs of random bytes of random lengths, with a small alphabet."""
+    rng = Random(0)
+    result = bytearray()
+    while len(result) < size:
+        result += bytes([rng.randrange(16)]) * rng.randint(1, 200)
+    return bytes(result[:size])
+
+
+GENERATORS: dict[str, Callable[[int], bytes]] = {
+    "random": random_bytes,
+    "text": text,
+    "runs": runs,
+}
+
+
+def best_time(func: Callable[[bytes], bytes], data: bytes, repeat: int) -> float:
+    """Returns the shortest time in seconds of repeat calls of func(data)."""
+    times: list[float] = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func(data)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def peak_memory(func: Callable[[bytes], bytes], data: bytes) -> int:
+    """Returns the peak memory in bytes allocated by func(data), as traced by
+    tracemalloc."""
+    tracemalloc.start()
+    try:
+        func(data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def max_rss() -> int | None:
+    """Returns the peak resident set size of the process in bytes, if available."""
+    if resource is None:
+        return None
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in kilobytes elsewhere
+    return max_rss_kb if sys.platform == "darwin" else max_rss_kb * 1024
+
+
+def throughput(
+    method_name: str, input_name: str, data: bytes, repeat: int
+) -> dict[str, Any]:
+    """Benchmarks compressing and decompressing data as a whole."""
+    method = METHODS[method_name]()
+    compressed = method.compress_bytes(data)
+    if method.decompress_bytes(compressed) != data:
+        raise AssertionError(f"{method_name} failed to decompress {input_name}")
+
+    size_mb = len(data) / 1024**2
+    compress_time = best_time(method.compress_bytes, data, repeat)
+    decompress_time = best_time(method.decompress_bytes, compressed, repeat)
+    return {
+        "method": method_name,
+        "input": input_name,
+        "size": len(data),
+        "compressed_size": len(compressed),
+        "ratio": round(len(compressed) / len(data), 4),
+        "compress_mb_s": round(size_mb / compress_time, 2),
+        "decompress_mb_s": round(size_mb / decompress_time, 2),
+        "compress_peak_bytes": peak_memory(method.compress_bytes, data),
+        "decompress_peak_bytes": peak_memory(method.decompress_bytes, compressed),
+    }
+
+
+def percentiles(func: Callable[[bytes], bytes], messages: list[bytes]) -> dict[str, float]:
+    """Returns the median and the 99th percentile of the time in microseconds of
+    calling func for each message."""
+    times: list[int] = []
+    for message in messages:
+        start = perf_counter_ns()
+        func(message)
+        times.append(perf_counter_ns() - start)
+    return {
+        "p50_us": round(median(times) / 1000, 2),
+        "p99_us": round(quantiles(times, n=100)[98] / 1000, 2),
+    }
+
+
+def latency(method_name: str, size: int, count: int) -> dict[str, Any]:
+    """Benchmarks compressing and decompressing count messages of the given size one by
+    one, each as a whole."""
+    method = METHODS[method_name]()
+    data = text(size * count)
+    messages = [data[i : i + size] for i in range(0, len(data), size)]
+    compressed = [method.compress_bytes(message) for message in messages]
+    return {
+        "method": method_name,
+        "size": size,
+        "count": count,
+        "compress": percentiles(method.compress_bytes, messages),
+        "decompress": percentiles(method.decompress_bytes, compressed),
+    }
+
+
+def inputs(files: list[Path], sizes: list[int]) -> dict[str, bytes]:
+    """Returns the inputs to benchmark by name: the files and the synthetic inputs of
+    each size."""
+    result = {file.name: file.read_bytes() for file in files}
+    for name, generate in GENERATORS.items():
+        for size in sizes:
+            result[f"{name}-{size // 1024}k"] = generate(size)
+    return result
+
+
+def run(
+    methods: list[str],
+    files: list[Path],
+    sizes: list[int],
+    message_sizes: list[int],
+    repeat: int,
+) -> dict[str, Any]:
+    """Runs the benchmarks and returns the results."""
+    results: dict[str, Any] = {
+        "format_version": FORMAT_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "throughput": [],
+        "latency": [],
+    }
+    for input_name, data in inputs(files, sizes).items():
+        for method_name in methods:
+            print(f"throughput: {method_name} {input_name}", file=sys.stderr)
+            results["throughput"].append(throughput(method_name, input_name, data, repeat))
+    for size in message_sizes:
+        for method_name in methods:
+            print(f"latency: {method_name} {size} bytes", file=sys.stderr)
+            results["latency"].append(latency(method_name, size, MESSAGE_COUNT))
+    results["environment"]["max_rss_bytes"] = max_rss()
+    return results
+
+
+def regressions(
+    baseline: dict[str, Any], results: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Compares results with a baseline, and returns a description of each throughput
+    or ratio more than tolerance (a fraction) worse than in the baseline. Benchmarks
+    missing from either one are skipped."""
+    found: list[str] = []
+
+    def compare(name: str, old: float, new: float, higher_is_better: bool) -> None:
+        change = (new - old) / old if old else 0.0
+        if (-change if higher_is_better else change) > tolerance:
+            found.append(f"{name}: {old} -> {new} ({change:+.1%})")
+
+    old_throughput = {
+        (entry["method"], entry["input"]): entry for entry in baseline["throughput"]
+    }
+    for entry in results["throughput"]:
+        old = old_throughput.get((entry["method"], entry["input"]))
+        if old is None:
+            continue
+        name = f"{entry['method']} {entry['input']}"
+        compare(f"{name} ratio", old["ratio"], entry["ratio"], higher_is_better=False)
+        for key in ("compress_mb_s", "decompress_mb_s"):
+            compare(f"{name} {key}", old[key], entry[key], higher_is_better=True)
+
+    old_latency = {(entry["method"], entry["size"]): entry for entry in baseline["latency"]}
+    for entry in results["latency"]:
+        old = old_latency.get((entry["method"], entry["size"]))
+        if old is None:
+            continue
+        for direction in ("compress", "decompress"):
+            compare(
+                f"{entry['method']} {entry['size']} bytes {direction} p50_us",
+                old[direction]["p50_us"],
+                entry[direction]["p50_us"],
+                higher_is_better=False,
+            )
+    return found
+
+
+def main() -> None:
+    arg_parser = ArgumentParser()
+    arg_parser.add_argument(
+        "--files", type=Path, nargs="*", default=DEFAULT_FILES, help="Files to benchmark"
+    )
+    arg_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=DEFAULT_SIZES,
+        help="Sizes of the synthetic inputs in bytes",
+    )
+    arg_parser.add_argument(
+        "--message-sizes",
+        type=int,
+        nargs="*",
+        default=DEFAULT_MESSAGE_SIZES,
+        help="Sizes of the messages for latency in bytes",
+    )
+    arg_parser.add_argument(
+        "--methods", nargs="+", choices=list(METHODS), default=list(METHODS)
+    )
+    arg_parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per throughput measurement"
+    )
+    arg_parser.add_argument("--output", type=Path, help="Output file, stdout by default")
+    arg_parser.add_argument(
+        "--baseline", type=Path, help="Earlier results to check for regressions"
+    )
+    arg_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Fraction by which a result can be worse than the baseline",
+    )
+    args = arg_parser.parse_args()
+
+    results = run(args.methods, args.files, args.sizes, args.message_sizes, args.repeat)
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output + "\n")
+
+    if args.baseline is not None:
+        found = regressions(json.loads(args.baseline.read_text()), results, args.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
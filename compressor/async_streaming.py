@@ -0,0 +1,438 @@
+"""asyncio adapters for compressing and decompressing streams without blocking the event
+loop, e.g. in network services handling many concurrent streams.
+
+The compression work is run in an executor, by default a process pool, through a
+`CompressionPool` shared by all the streams of an event loop. The pool bounds the number
+of jobs in flight across all the streams, and each stream has at most `window` blocks in
+flight. So there is backpressure both ways: writing to a compressing stream waits while
+its blocks are being compressed or the underlying writer is draining, and a
+decompressing stream stops reading its input while its decompressed data is not read.
+
+Streams are compressed in block mode like in `compressor.streaming`, so that the blocks
+of a stream can be compressed in parallel. Incremental methods can also compress into a
+single stream (block_size=None), a chunk at a time in a thread, as the state of the
+stream cannot be sent to worker processes.
+
+Example:
+    async with CompressionPool() as pool:
+        reader, writer = await asyncio.open_connection(host, port)
+        await compress_stream(source, writer, Huffman(), pool)
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from os import cpu_count
+from types import TracebackType
+from typing import Any, Callable, Protocol, Self
+from zlib import crc32
+
+from .block_container import MAGIC
+from .compression_methods.interface import (
+    CompressionMethod,
+    CompressionMethodError,
+    CompressObj,
+)
+from .streaming import DEFAULT_BLOCK_SIZE, BlockReader, BlockWriter
+
+
+_CHUNK_SIZE = 64 * 1024  # Bytes read from the input at a time
+# Blocks of a single stream in flight at a time
+_DEFAULT_WINDOW = 2
+
+
+class AsyncReader(Protocol):
+    """Input of the adapters, e.g. `asyncio.StreamReader`."""
+
+    async def read(self, n: int = -1) -> bytes: ...
+
+
+class AsyncWriter(Protocol):
+    """Output of the adapters, e.g. `asyncio.StreamWriter`."""
+
+    def write(self, data: bytes) -> None: ...
+
+    async def drain(self) -> None: ...
+
+
+class CompressionPool:
+    """Runs compression jobs in an executor, with a bounded number of jobs in flight.
+
+    The pool is shared by the streams of a single event loop. Jobs wait for a free slot
+    before they are submitted to the executor, so that a burst of streams does not queue
+    up unbounded amounts of data in the executor.
+    """
+
+    def __init__(
+        self, executor: Executor | None = None, max_jobs: int | None = None
+    ) -> None:
+        """
+        Args:
+            executor (Executor | None, optional): Executor to run the jobs in. Defaults
+            to None, creating a process pool with a worker per CPU, which is shut down
+            by `aclose`. In a process pool the methods must be picklable.
+            max_jobs (int | None, optional): Max number of jobs in flight at a time.
+            Defaults to None, i.e. two per CPU.
+
+        Raises:
+            ValueError: If max_jobs is not positive.
+        """
+        if max_jobs is not None and max_jobs <= 0:
+            raise ValueError("Max jobs must be positive")
+
+        self._owns_executor = executor is None
+        self._executor = executor or ProcessPoolExecutor()
+        self._slots = asyncio.Semaphore(max_jobs or 2 * (cpu_count() or 1))
+
+    async def run[R](self, fn: Callable[..., R], *args: Any) -> R:
+        """Runs fn(*args) in the executor once there is a free slot."""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def run_in_thread[R](self, fn: Callable[..., R], *args: Any) -> R:
+        """Runs fn(*args) in the default thread pool of the event loop once there is a
+        free slot. For jobs on state that cannot be sent to another process."""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, fn, *args)
+
+    async def compress(self, method: CompressionMethod, data: bytes) -> bytes:
+        """Compresses a complete input, like `CompressionMethod.compress_bytes`."""
+        return await self.run(method.compress_bytes, data)
+
+    async def decompress(self, method: CompressionMethod, data: bytes) -> bytes:
+        """Decompresses a complete input, like `CompressionMethod.decompress_bytes`."""
+        return await self.run(method.decompress_bytes, data)
+
+    async def aclose(self) -> None:
+        """Shuts down the executor if it was created by the pool."""
+        if self._owns_executor:
+            await asyncio.to_thread(self._executor.shutdown)
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
+
+class AsyncCompressWriter:
+    """Compresses the data written to it into an `AsyncWriter`.
+
+    Used as an async context manager, which finishes the stream on exit, or cancels the
+    blocks in flight on errors. The underlying writer is not closed.
+    """
+
+    def __init__(
+        self,
+        writer: AsyncWriter,
+        method: CompressionMethod,
+        pool: CompressionPool,
+        block_size: int | None = None,
+        window: int = _DEFAULT_WINDOW,
+    ) -> None:
+        """
+        Args:
+            writer (AsyncWriter): Where to write the compressed stream.
+            method (CompressionMethod): The method to compress with.
+            pool (CompressionPool): The pool to run the compression in.
+            block_size (int | None, optional): Size of the blocks in bytes, see
+            `streaming.compressobj`. Defaults to None.
+            window (int, optional): Max number of blocks in flight. Defaults to 2.
+
+        Raises:
+            ValueError: If block_size or window is not positive.
+            BlockContainerError: If the method cannot be used in block mode.
+        """
+        if block_size is not None and block_size <= 0:
+            raise ValueError("Block size must be positive")
+        if window <= 0:
+            raise ValueError("Window must be positive")
+
+        self._writer = writer
+        self._method = method
+        self._pool = pool
+        self._window = window
+
+        self._compressobj: CompressObj | None = None
+        self._block_writer: BlockWriter | None = None
+        if block_size is None and method.incremental:
+            self._compressobj = method.compressobj()
+        else:
+            self._block_writer = BlockWriter(method)
+        self._block_size = block_size or DEFAULT_BLOCK_SIZE
+
+        self._pending = bytearray()
+        # Size and checksum of the blocks in flight, and their compression jobs
+        self._jobs: deque[tuple[int, int, asyncio.Future[bytes]]] = deque()
+        self._finished = False
+
+    async def write(self, data: bytes) -> None:
+        """Compresses data. Waits while the stream has its window of blocks in flight
+        or the underlying writer is draining.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already finished")
+
+        if self._compressobj is not None:
+            compressed = await self._pool.run_in_thread(self._compressobj.compress, data)
+            await self._output(compressed)
+            return
+
+        self._pending += data
+        while len(self._pending) >= self._block_size:
+            await self._submit(bytes(self._pending[: self._block_size]))
+            del self._pending[: self._block_size]
+
+    async def finish(self) -> None:
+        """Compresses the rest of the data and writes the end of the stream.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already finished")
+        self._finished = True
+
+        if self._compressobj is not None:
+            await self._output(await self._pool.run_in_thread(self._compressobj.flush))
+            return
+
+        assert self._block_writer is not None
+        if self._pending:
+            await self._submit(bytes(self._pending))
+            self._pending.clear()
+        while self._jobs:
+            await self._write_next()
+        await self._output(self._block_writer.end())
+
+    def abort(self) -> None:
+        """Cancels the blocks in flight, leaving the stream unfinished."""
+        self._finished = True
+        for _, _, job in self._jobs:
+            job.cancel()
+        self._jobs.clear()
+
+    async def _submit(self, block: bytes) -> None:
+        if len(self._jobs) >= self._window:
+            await self._write_next()
+        job = asyncio.ensure_future(self._pool.run(self._method.compress_bytes, block))
+        self._jobs.append((len(block), crc32(block), job))
+
+    async def _write_next(self) -> None:
+        assert self._block_writer is not None
+        uncompressed_size, checksum, job = self._jobs.popleft()
+        compressed = await job
+        await self._output(self._block_writer.block(uncompressed_size, checksum, compressed))
+
+    async def _output(self, data: bytes) -> None:
+        if data:
+            self._writer.write(data)
+            await self._writer.drain()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if exc is None:
+            await self.finish()
+        else:
+            self.abort()
+
+
+class AsyncDecompressReader:
+    """Decompresses a stream read from an `AsyncReader`, either a block container or a
+    single stream of an incremental method, detected like `streaming.decompressobj`.
+
+    The input is read and decompressed in a background task, at most `window` blocks
+    ahead of the data read from this reader. Used as an async context manager, which
+    cancels the background task on exit, or as an async iterator of the decompressed
+    data.
+    """
+
+    def __init__(
+        self,
+        reader: AsyncReader,
+        method: CompressionMethod,
+        pool: CompressionPool,
+        window: int = _DEFAULT_WINDOW,
+    ) -> None:
+        """
+        Args:
+            reader (AsyncReader): Where to read the compressed stream from.
+            method (CompressionMethod): The method the stream was compressed with.
+            pool (CompressionPool): The pool to run the decompression in.
+            window (int, optional): Max number of blocks in flight. Defaults to 2.
+
+        Raises:
+            ValueError: If window is not positive.
+        """
+        if window <= 0:
+            raise ValueError("Window must be positive")
+
+        self._reader = reader
+        self._method = method
+        self._pool = pool
+        # Decompressed data in order, None at the end of the stream
+        self._results: asyncio.Queue[asyncio.Future[bytes] | None] = asyncio.Queue(
+            window
+        )
+        self._block_reader: BlockReader | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._done = False
+
+    async def read(self) -> bytes:
+        """Returns the next piece of decompressed data, or b"" at the end of the stream,
+        once it has been checked to be complete.
+
+        Raises:
+            CompressionMethodError: If the compressed data is invalid or truncated.
+            BlockContainerError: If the block container is invalid or truncated.
+        """
+        if self._done:
+            return b""
+        if self._task is None:
+            self._task = asyncio.create_task(self._decompress_input())
+
+        result = await self._results.get()
+        try:
+            if result is None:
+                if self._block_reader is not None:
+                    self._block_reader.finish()
+                self._done = True
+                return b""
+
+            data = await result
+            if self._block_reader is not None:
+                self._block_reader.decompressed(data)
+            return data
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def _decompress_input(self) -> None:
+        """Reads and decompresses the input, putting the results in the queue."""
+        try:
+            data = b""
+            while len(data) < len(MAGIC):
+                chunk = await self._reader.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                data += chunk
+
+            if data.startswith(MAGIC):
+                await self._decompress_blocks(data)
+            elif self._method.incremental:
+                await self._decompress_single_stream(data)
+            else:
+                raise CompressionMethodError(
+                    f"Not a block container: {type(self._method).__name__} can only "
+                    + "be decompressed incrementally in block mode"
+                )
+        except Exception as e:
+            failed = asyncio.get_running_loop().create_future()
+            failed.set_exception(e)
+            await self._results.put(failed)
+        else:
+            await self._results.put(None)
+
+    async def _decompress_blocks(self, data: bytes) -> None:
+        self._block_reader = BlockReader(self._method)
+        while data:
+            for method, compressed in self._block_reader.feed(data):
+                job = self._pool.run(method.decompress_bytes, compressed)
+                await self._results.put(asyncio.ensure_future(job))
+            data = await self._reader.read(_CHUNK_SIZE)
+
+    async def _decompress_single_stream(self, data: bytes) -> None:
+        decompressobj = self._method.decompressobj()
+        while data:
+            await self._put(await self._pool.run_in_thread(decompressobj.decompress, data))
+            data = await self._reader.read(_CHUNK_SIZE)
+        await self._put(await self._pool.run_in_thread(decompressobj.flush))
+
+    async def _put(self, data: bytes) -> None:
+        if data:
+            result = asyncio.get_running_loop().create_future()
+            result.set_result(data)
+            await self._results.put(result)
+
+    async def aclose(self) -> None:
+        """Cancels the background task and the blocks in flight."""
+        self._done = True
+        if self._task is not None:
+            self._task.cancel()
+        while not self._results.empty():
+            result = self._results.get_nowait()
+            if result is not None:
+                result.cancel()
+
+    def __aiter__(self) -> Self:
+        return self
+
+    async def __anext__(self) -> bytes:
+        data = await self.read()
+        if not data:
+            raise StopAsyncIteration
+        return data
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
+
+async def compress_stream(
+    reader: AsyncReader,
+    writer: AsyncWriter,
+    method: CompressionMethod,
+    pool: CompressionPool,
+    block_size: int | None = None,
+) -> None:
+    """Compresses everything read from reader into writer, see `AsyncCompressWriter`.
+
+    Raises:
+        CompressionMethodError: Raises this error if unable to perform the compression method.
+    """
+    async with AsyncCompressWriter(writer, method, pool, block_size) as compress_writer:
+        while data := await reader.read(_CHUNK_SIZE):
+            await compress_writer.write(data)
+
+
+async def decompress_stream(
+    reader: AsyncReader,
+    writer: AsyncWriter,
+    method: CompressionMethod,
+    pool: CompressionPool,
+) -> None:
+    """Decompresses the stream read from reader into writer, see
+    `AsyncDecompressReader`.
+
+    Raises:
+        CompressionMethodError: If the compressed data is invalid or truncated.
+        BlockContainerError: If the block container is invalid or truncated.
+    """
+    async with AsyncDecompressReader(reader, method, pool) as decompress_reader:
+        async for data in decompress_reader:
+            writer.write(data)
+            await writer.drain()
@@ -0,0 +1,340 @@
+"""Container format for files compressed as independent blocks.
+
+Layout:
+    magic (4 bytes) | format version (1 byte)
+    for each block: compressed size | method id (1 byte) | compressed block
+    end of blocks: compressed size 0 | method id 0
+    index: an entry for each block, see `BlockInfo`
+    block count | index offset
+
+Integers are unsigned big-endian, 8 bytes long unless stated otherwise. As the index is at
+the end, the blocks can be written as soon as they are compressed, and readers find the
+index from the footer. The index maps uncompressed offsets to compressed blocks, so any
+range of the original data can be read by decompressing only the blocks it overlaps.
+As each block is preceded by its size and method, the blocks can also be read and
+decompressed one after the other without the index, as they arrive, see
+`compressor.streaming`.
+
+Version 3 containers, without the method ids before the blocks, and version 2
+containers, without any block headers and the end of blocks, can still be read.
+"""
+
+from bisect import bisect_left, bisect_right
+from functools import cache
+from typing import BinaryIO, NamedTuple
+
+from .compression_methods.interface import CompressionMethod
+
+
+MAGIC = b"CMPB"
+VERSION = 4
+_SUPPORTED_VERSIONS = (2, 3, VERSION)
+
+
+_INT_SIZE = 8
+_CHECKSUM_SIZE = 4
+HEADER_SIZE = len(MAGIC) + 1
+BLOCK_HEADER_SIZE = _INT_SIZE + 1
+_INDEX_ENTRY_SIZE = 4 * _INT_SIZE + 1 + _CHECKSUM_SIZE
+_FOOTER_SIZE = 2 * _INT_SIZE
+
+
+class BlockContainerError(Exception):
+    """Error in reading a block container."""
+
+
+class BlockInfo(NamedTuple):
+    """Index entry of a single block."""
+
+    uncompressed_offset: int
+    uncompressed_size: int
+    compressed_offset: int
+    compressed_size: int
+    method_id: int
+    checksum: int  # CRC-32 of the uncompressed data, 4 bytes
+
+    def to_bytes(self) -> bytes:
+        return (
+            _int_to_bytes(self.uncompressed_offset)
+            + _int_to_bytes(self.uncompressed_size)
+            + _int_to_bytes(self.compressed_offset)
+            + _int_to_bytes(self.compressed_size)
+            + bytes([self.method_id])
+            + self.checksum.to_bytes(length=_CHECKSUM_SIZE, byteorder="big")
+        )
+
+    @staticmethod
+    def from_bytes(entry: bytes) -> "BlockInfo":
+        ints = [
+            _int_from_bytes(entry[i : i + _INT_SIZE])
+            for i in range(0, 4 * _INT_SIZE, _INT_SIZE)
+        ]
+        return BlockInfo(
+            uncompressed_offset=ints[0],
+            uncompressed_size=ints[1],
+            compressed_offset=ints[2],
+            compressed_size=ints[3],
+            method_id=entry[4 * _INT_SIZE],
+            checksum=_int_from_bytes(entry[4 * _INT_SIZE + 1 :]),
+        )
+
+
+def _int_to_bytes(value: int) -> bytes:
+    return value.to_bytes(length=_INT_SIZE, byteorder="big", signed=False)
+
+
+def _int_from_bytes(data: bytes) -> int:
+    return int.from_bytes(data, byteorder="big", signed=False)
+
+
+@cache
+def block_methods() -> dict[int, type[CompressionMethod]]:
+    """Returns the compression method of each method id stored per block in the index.
+    The methods are imported on first use, not with the container format."""
+    from .compression_methods import LZW, Huffman
+
+    return {1: Huffman, 2: LZW}
+
+
+def method_id(method: CompressionMethod) -> int:
+    """Returns the id stored in the index for blocks compressed with method.
+
+    Raises:
+        BlockContainerError: If the method cannot be stored in a block container.
+    """
+    for id_, method_type in block_methods().items():
+        if type(method) is method_type:
+            return id_
+    raise BlockContainerError(f"Unsupported method for block mode: {repr(method)}")
+
+
+def block_method(
+    block: BlockInfo, method: CompressionMethod | None
+) -> CompressionMethod:
+    """Returns the method for decompressing a block: the given method if the block was
+    compressed with the same method, otherwise a new instance of the block's method.
+
+    Raises:
+        BlockContainerError: If the block's method id is unknown.
+    """
+    return method_for_id(block.method_id, method)
+
+
+def method_for_id(
+    method_id_: int, method: CompressionMethod | None
+) -> CompressionMethod:
+    """Returns the method for decompressing a block with the given method id, like
+    `block_method`.
+
+    Raises:
+        BlockContainerError: If the method id is unknown.
+    """
+    method_type = block_methods().get(method_id_)
+    if method_type is None:
+        raise BlockContainerError(f"Unknown method id in block container: {method_id_}")
+    if type(method) is method_type:
+        return method
+    return method_type()
+
+
+def is_block_container(bin_in: BinaryIO) -> bool:
+    """Checks whether bin_in starts with a block container header.
+    The position of bin_in is left unchanged.
+    """
+    saved_pointer = bin_in.tell()
+    magic = bin_in.read(len(MAGIC))
+    bin_in.seek(saved_pointer)
+    return magic == MAGIC
+
+
+def header_bytes() -> bytes:
+    """Returns the container header. The blocks are written right after it."""
+    return MAGIC + bytes([VERSION])
+
+
+def block_bytes(compressed: bytes, method_id_: int) -> bytes:
+    """Returns a compressed block preceded by its size and method id, as written into
+    the container. The compressed data starts `BLOCK_HEADER_SIZE` bytes after the start
+    of the block.
+    """
+    return _int_to_bytes(len(compressed)) + bytes([method_id_]) + compressed
+
+
+def index_bytes(blocks: list[BlockInfo], offset: int) -> bytes:
+    """Returns the end of blocks, the block index and the footer.
+
+    Args:
+        blocks (list[BlockInfo]): Index entries of all the blocks, in order.
+        offset (int): Offset right after the last block, where they are written.
+    """
+    index_offset = offset + BLOCK_HEADER_SIZE
+    return (
+        bytes(BLOCK_HEADER_SIZE)
+        + b"".join(block.to_bytes() for block in blocks)
+        + _int_to_bytes(len(blocks))
+        + _int_to_bytes(index_offset)
+    )
+
+
+def write_header(bin_out: BinaryIO) -> None:
+    """Writes the container header. The blocks are written right after it."""
+    bin_out.write(header_bytes())
+
+
+def write_block(bin_out: BinaryIO, compressed: bytes, method_id_: int) -> int:
+    """Writes a compressed block after the previous one.
+
+    Returns:
+        int: Offset of the compressed data, for the index.
+    """
+    compressed_offset = bin_out.tell() + BLOCK_HEADER_SIZE
+    bin_out.write(block_bytes(compressed, method_id_))
+    return compressed_offset
+
+
+def write_index(bin_out: BinaryIO, blocks: list[BlockInfo]) -> None:
+    """Writes the end of blocks, the block index and the footer after the last block.
+
+    Args:
+        bin_out (BinaryIO): Output positioned right after the last block.
+        blocks (list[BlockInfo]): Index entries of all the blocks, in order.
+    """
+    bin_out.write(index_bytes(blocks, bin_out.tell()))
+
+
+def read_header(header: bytes) -> int:
+    """Checks the container header and returns the format version.
+
+    Raises:
+        BlockContainerError: If the header is invalid or the version unsupported.
+    """
+    if header[: len(MAGIC)] != MAGIC:
+        raise BlockContainerError("Not a block container: invalid header")
+    version = header[len(MAGIC) : HEADER_SIZE]
+    if len(version) != 1 or version[0] not in _SUPPORTED_VERSIONS:
+        raise BlockContainerError(
+            f"Unsupported block container version: {version.hex()}"
+        )
+    return version[0]
+
+
+def block_header_size(version: int) -> int:
+    """Returns the size of the header preceding each block in containers of version."""
+    if version >= 4:
+        return BLOCK_HEADER_SIZE
+    return _INT_SIZE if version == 3 else 0
+
+
+def read_block_header(block_header: bytes) -> tuple[int, int | None]:
+    """Reads the header preceding a block.
+
+    Returns:
+        tuple[int, int | None]: The compressed size, 0 at the end of blocks, and the
+        method id of the block, or None for version 3 headers, which do not have it.
+    """
+    size = _int_from_bytes(block_header[:_INT_SIZE])
+    if len(block_header) == _INT_SIZE:
+        return size, None
+    return size, block_header[_INT_SIZE]
+
+
+def read_index_tail(tail: bytes, index_offset: int) -> list[BlockInfo]:
+    """Reads the block index and the footer, i.e. the rest of a container after the
+    end of blocks.
+
+    Args:
+        tail (bytes): The rest of the container.
+        index_offset (int): Offset at which the tail starts.
+
+    Raises:
+        BlockContainerError: If the index is invalid.
+
+    Returns:
+        list[BlockInfo]: Index entries of all the blocks, in order.
+    """
+    if len(tail) < _FOOTER_SIZE:
+        raise BlockContainerError("Invalid block container: missing footer")
+    block_count = _int_from_bytes(tail[-_FOOTER_SIZE:-_INT_SIZE])
+    if (
+        _int_from_bytes(tail[-_INT_SIZE:]) != index_offset
+        or _INDEX_ENTRY_SIZE * block_count + _FOOTER_SIZE != len(tail)
+    ):
+        raise BlockContainerError("Invalid block container: index out of bounds")
+    return _index_entries(tail[:-_FOOTER_SIZE])
+
+
+def _index_entries(index: bytes) -> list[BlockInfo]:
+    return [
+        BlockInfo.from_bytes(index[i : i + _INDEX_ENTRY_SIZE])
+        for i in range(0, len(index), _INDEX_ENTRY_SIZE)
+    ]
+
+
+def read_index(bin_in: BinaryIO) -> list[BlockInfo]:
+    """Reads the header and the block index of a container.
+
+    Args:
+        bin_in (BinaryIO): Seekable input containing a block container.
+
+    Raises:
+        BlockContainerError: If the header or the index is invalid.
+
+    Returns:
+        list[BlockInfo]: Index entries of all the blocks, in order.
+    """
+    bin_in.seek(0)
+    version = read_header(bin_in.read(HEADER_SIZE))
+    header_size = block_header_size(version)
+
+    file_size = bin_in.seek(0, 2)
+    if file_size < HEADER_SIZE + _FOOTER_SIZE:
+        raise BlockContainerError("Invalid block container: missing footer")
+
+    bin_in.seek(file_size - _FOOTER_SIZE)
+    footer = bin_in.read(_FOOTER_SIZE)
+    block_count = _int_from_bytes(footer[:_INT_SIZE])
+    index_offset = _int_from_bytes(footer[_INT_SIZE:])
+
+    # Index and footer should fill the rest of the file exactly
+    if index_offset + _INDEX_ENTRY_SIZE * block_count + _FOOTER_SIZE != file_size:
+        raise BlockContainerError("Invalid block container: index out of bounds")
+
+    bin_in.seek(index_offset)
+    blocks = _index_entries(bin_in.read(_INDEX_ENTRY_SIZE * block_count))
+
+    # Blocks should cover the uncompressed data and lie between the header and the index
+    uncompressed_offset = 0
+    for block in blocks:
+        if (
+            block.uncompressed_offset != uncompressed_offset
+            or block.compressed_offset < HEADER_SIZE + header_size
+            or block.compressed_offset + block.compressed_size > index_offset
+        ):
+            raise BlockContainerError("Invalid block container: block out of bounds")
+        uncompressed_offset += block.uncompressed_size
+
+    return blocks
+
+
+def find_blocks(blocks: list[BlockInfo], start: int, length: int) -> list[BlockInfo]:
+    """Finds the blocks overlapping a range of the uncompressed data.
+
+    Args:
+        blocks (list[BlockInfo]): Index entries of all the blocks, in order.
+        start (int): Uncompressed offset at which the range starts.
+        length (int): Length of the range.
+
+    Returns:
+        list[BlockInfo]: The blocks overlapping the range, in order.
+    """
+    if length <= 0:
+        return []
+
+    offsets = [block.uncompressed_offset for block in blocks]
+    first = max(bisect_right(offsets, start) - 1, 0)
+    last = bisect_left(offsets, start + length)
+    return [
+        block
+        for block in blocks[first:last]
+        if start < block.uncompressed_offset + block.uncompressed_size
+    ]
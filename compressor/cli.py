@@ -1,18 +1,144 @@
+import os
 import sys
-from argparse import ArgumentParser, Namespace
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
 from pathlib import Path
-from typing import Callable
+from typing import TYPE_CHECKING, Callable, Iterable
 
 from compressor.file_compressor import FileCompressionError
 
-from .compression_methods import Huffman, LZW
-from .file_compressor import FileCompressor
+# The methods are accessed through the package, which imports them on first use, so
+# that e.g. `-h` does not load them and their dependencies
+from . import compression_methods
+from .compression_methods.interface import CompressionMethod, CompressionMethodError
+from .compression_methods.lzw_dictionary import LZWDictionary
+from .compression_methods.stats import CompressionStats
+from .file_compressor import (
+    IO_BACKENDS,
+    STDIO_PATH,
+    FileCompressor,
+    StatsHook,
+    batch_inputs,
+)
 
-from .utils.logging import LOGFILE, get_logger
+from .utils.logging import LOGFILE, configure, get_logger, logfile
+
+if TYPE_CHECKING:
+    from .compression_methods import Huffman, HuffmanDictionary
 
 logger = get_logger(__name__)
 
 
+def load_dictionary[D: (HuffmanDictionary, LZWDictionary)](
+    dictionary_path: str | None, load: Callable[[Path], D]
+) -> D | None:
+    """Loads the dictionary given as a command line argument, if any.
+
+    Args:
+        dictionary_path (str | None): Path to the dictionary file, or None.
+        load (Callable[[Path], D]): Function loading the dictionary file,
+        e.g. `HuffmanDictionary.load`.
+
+    Raises:
+        FileCompressionError: If the dictionary cannot be read.
+    """
+    if dictionary_path is None:
+        return None
+
+    try:
+        return load(Path(dictionary_path))
+    except FileNotFoundError as e:
+        raise FileCompressionError(
+            f"Dictionary file '{dictionary_path}' does not exist"
+        ) from e
+    except CompressionMethodError as e:
+        raise FileCompressionError(e) from e
+
+
+def create_huffman(args: Namespace) -> "Huffman":
+    dictionary = load_dictionary(
+        args.huffman_dictionary, compression_methods.HuffmanDictionary.load
+    )
+    return compression_methods.Huffman(
+        max_code_len=args.huffman_max_code_len,
+        order=args.huffman_order,
+        dictionary=dictionary,
+    )
+
+
+# Method name -> function creating the method from the cli args
+METHODS: dict[str, Callable[[Namespace], CompressionMethod]] = {
+    "huffman": create_huffman,
+    "lzw": lambda args: compression_methods.LZW(
+        variable_width=args.lzw_variable_width,
+        max_code_size=args.lzw_max_code_size,
+        dictionary=load_dictionary(args.lzw_dictionary, LZWDictionary.load),
+    ),
+}
+
+# Function training a dictionary from samples
+Trainer = Callable[[Iterable[bytes]], "HuffmanDictionary | LZWDictionary"]
+
+# Method name -> function creating the dictionary training function from the cli args
+TRAINERS: dict[str, Callable[[Namespace], Trainer]] = {
+    "huffman": lambda args: lambda samples: compression_methods.HuffmanDictionary.train(
+        samples,
+        args.huffman_max_code_len
+        or compression_methods.HuffmanDictionary.DEFAULT_MAX_CODE_LEN,
+    ),
+    "lzw": lambda args: lambda samples: LZWDictionary.train(
+        samples, args.lzw_dictionary_size
+    ),
+}
+
+
+def stats_printer(output_path: Path) -> StatsHook:
+    """Returns a stats hook printing the stats of each file as a line of JSON, to stderr
+    if the output is written to stdout."""
+
+    import json
+
+    def print_stats(stats: CompressionStats) -> None:
+        file = sys.stderr if output_path == STDIO_PATH else sys.stdout
+        print(json.dumps(stats.to_dict()), file=file)
+
+    return print_stats
+
+
+def parse_size(size: str) -> int:
+    """Parse a size in bytes given as a command line argument.
+
+    Args:
+        size (str): Size as a positive integer, optionally followed by K, M or G
+        for kibibytes, mebibytes or gibibytes.
+
+    Raises:
+        ArgumentTypeError: If the size is invalid.
+
+    Returns:
+        int: The size in bytes.
+    """
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    size = size.strip().upper()
+    multiplier = units.get(size[-1:], 1)
+    if multiplier != 1:
+        size = size[:-1]
+
+    if not size.isdigit() or int(size) == 0:
+        raise ArgumentTypeError(f"invalid size: '{size}'")
+    return int(size) * multiplier
+
+
+def parse_count(count: str) -> int:
+    """Parse a positive number given as a command line argument, e.g. of phrases.
+
+    Raises:
+        ArgumentTypeError: If the number is not a positive integer.
+    """
+    if not count.strip().isdigit() or int(count) == 0:
+        raise ArgumentTypeError(f"invalid positive number: '{count}'")
+    return int(count)
+
+
 def get_args(methods: list[str]) -> Namespace:
     """Setup argparser and return Namespace object with the arguments.
 
@@ -20,26 +146,196 @@ def get_args(methods: list[str]) -> Namespace:
         methods (list[str]): List of the compression methods available.
 
     Returns:
-        Namespace: Namespace from argparser containing the args.
+        Namespace: Namespace from argparser containing the args. For compress and
+        decompress, also the method created from the args as `compression_method`,
+        as creating it checks the combination of the method's options.
     """
-    arg_parser = ArgumentParser()
+    # The arguments of the commands, given after the command
+    common = ArgumentParser(add_help=False)
+    common.add_argument(dest="method", type=str, choices=methods)
+    common.add_argument(
+        dest="input_file",
+        type=str,
+        nargs="+",
+        help="Input file, or - for stdin. With --batch, any number of files, "
+        + "directories, glob patterns or @ followed by a file listing inputs",
+    )
+    common.add_argument(
+        dest="output_file",
+        type=str,
+        help="Output file, or - for stdout, or directory with --batch",
+    )
+    common.add_argument(
+        "--stats",
+        default=None,
+        choices=["json"],
+        help="Print the sizes, the time of each stage and the counters of the method "
+        + "for each file as a line of JSON, to stderr if the output is stdout",
+    )
+    common.add_argument(
+        "--log-file",
+        type=Path,
+        nargs="?",
+        default=None,
+        const=LOGFILE,
+        metavar="PATH",
+        help=f"Write a debug log, appending to PATH (default: {LOGFILE}). "
+        + "Nothing is logged without this",
+    )
+
+    huffman_group = common.add_argument_group(
+        "Huffman options",
+        "Used for compression only, decompression reads these from the file. "
+        + "The dictionary is needed for decompression as well",
+    )
+    huffman_group.add_argument(
+        "--huffman-max-code-len",
+        type=int,
+        default=None,
+        choices=range(8, 33),
+        metavar="{8..32}",
+        help="Limit the code length to this many bits, at most 12 with --huffman-order 1 "
+        + "(default: no limit, 12 with --huffman-order 1)",
+    )
+    huffman_group.add_argument(
+        "--huffman-order",
+        type=int,
+        default=0,
+        choices=[0, 1],
+        help="Context model order: 1 codes each byte based on the previous byte, "
+        + "which compresses text better but is slower (default: 0)",
+    )
+    huffman_group.add_argument(
+        "--huffman-dictionary",
+        default=None,
+        metavar="PATH",
+        help="Use the codes of a dictionary made with the train command instead of "
+        + "storing codes in the file, for many small files of similar data. "
+        + "Cannot be used with --huffman-order or --huffman-max-code-len",
+    )
+
+    lzw_group = common.add_argument_group(
+        "LZW options",
+        "Used for compression only, decompression reads these from the file",
+    )
+    lzw_group.add_argument(
+        "--lzw-variable-width",
+        action="store_true",
+        help="Use variable width codes and clear the dictionary when the ratio degrades",
+    )
+    lzw_group.add_argument(
+        "--lzw-max-code-size",
+        type=int,
+        default=16,
+        choices=range(9, 17),
+        metavar="{9..16}",
+        help="Max code size in bits with variable width codes (default: 16)",
+    )
+    lzw_group.add_argument(
+        "--lzw-dictionary",
+        default=None,
+        metavar="PATH",
+        help="Prime the dictionary with the phrases of a dictionary made with the train "
+        + "command, for many small files of similar data. Needed for decompression too",
+    )
+    lzw_group.add_argument(
+        "--lzw-dictionary-size",
+        type=parse_count,
+        default=LZWDictionary.DEFAULT_SIZE,
+        metavar="N",
+        help="Number of phrases in a trained dictionary, at most "
+        + f"{LZWDictionary.MAX_SIZE} (default: {LZWDictionary.DEFAULT_SIZE})",
+    )
+
+    block_group = common.add_argument_group(
+        "Block mode options",
+        "Compress the file as independent blocks in parallel. "
+        + "Block compressed files are detected and decompressed in parallel automatically",
+    )
+    block_group.add_argument(
+        "--block-size",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+        help="Compress in blocks of SIZE bytes, e.g. 1M. K, M and G suffixes are allowed",
+    )
+    block_group.add_argument(
+        "-j",
+        "--workers",
+        type=parse_count,
+        default=None,
+        metavar="N",
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    block_group.add_argument(
+        "--io-backend",
+        default="stream",
+        choices=IO_BACKENDS,
+        help="Read and write block compressed files as streams or memory mapped "
+        + "(default: stream)",
+    )
 
+    batch_group = common.add_argument_group(
+        "Batch mode options",
+        "Compress or decompress many files into an output directory in one run, "
+        + "a file per worker process (--workers)",
+    )
+    batch_group.add_argument(
+        "--batch",
+        action="store_true",
+        help="Process all the input files into the output directory, keeping the paths "
+        + "of files in input directories. Compressed files get the method name as "
+        + "suffix, which is removed when decompressing",
+    )
+
+    arg_parser = ArgumentParser()
     cmd_parser = arg_parser.add_subparsers(
         dest="command", metavar="command", required=True
     )
     cmd_parser.add_parser(
         name="compress",
         help="Compress a file",
+        parents=[common],
     )
     cmd_parser.add_parser(
         name="decompress",
         help="Decompress a file",
+        parents=[common],
+    )
+    cmd_parser.add_parser(
+        name="train",
+        help="Train a dictionary from a sample file or a directory of samples "
+        + "and write it to the output file",
+        parents=[common],
     )
-    arg_parser.add_argument(dest="method", type=str, choices=methods)
-    arg_parser.add_argument(dest="input_file", type=str)
-    arg_parser.add_argument(dest="output_file", type=str)
-
     args = arg_parser.parse_args()
+    if args.batch and args.command == "train":
+        arg_parser.error("--batch is not supported with the train command")
+    if args.huffman_order == 1 and (args.huffman_max_code_len or 0) > 12:
+        arg_parser.error("--huffman-max-code-len must be at most 12 with --huffman-order 1")
+    if args.huffman_dictionary is not None and (
+        args.huffman_order != 0 or args.huffman_max_code_len is not None
+    ):
+        arg_parser.error(
+            "--huffman-dictionary cannot be used with --huffman-order or "
+            + "--huffman-max-code-len, the dictionary's codes are used as is"
+        )
+    if not args.batch and len(args.input_file) > 1:
+        arg_parser.error("multiple input files require --batch")
+    if (args.batch or args.command == "train") and str(STDIO_PATH) in (
+        *args.input_file,
+        args.output_file,
+    ):
+        arg_parser.error("- is not supported with --batch or the train command")
+
+    if args.lzw_dictionary_size > LZWDictionary.MAX_SIZE:
+        arg_parser.error(f"--lzw-dictionary-size must be at most {LZWDictionary.MAX_SIZE}")
+    if args.command != "train":
+        try:
+            args.compression_method = METHODS[args.method](args)
+        except ValueError as e:
+            # E.g. a dictionary too large for the code size
+            arg_parser.error(str(e))
 
     return args
 
@@ -52,16 +348,25 @@ def error_handler(run_func: Callable[[], None]):
             return run_func()
         except FileCompressionError as e:
             logger.error("Compression failed: %s", e)
-            print("Compression failed:", e)
+            print("Compression failed:", e, file=sys.stderr)
             logger.exception(e)
         except KeyboardInterrupt as e:
             logger.error("Compression canceled by user")
-            print("Compression canceled")
+            print("Compression canceled", file=sys.stderr)
             logger.exception(e)
+        except BrokenPipeError:
+            # The reader of the output exited, e.g. `| head`. Stdout is pointed at
+            # devnull so that flushing it at exit does not fail again.
+            logger.error("Output pipe closed")
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
         except Exception as e:
             logger.critical("An unexpected error occured: %s", e)
-            print(f"An unexpected error occured: {e}")
-            print(f"See '{LOGFILE}' for more details.")
+            print(f"An unexpected error occured: {e}", file=sys.stderr)
+            log_path = logfile()
+            if log_path is None:
+                print("Run with --log-file for more details.", file=sys.stderr)
+            else:
+                print(f"See '{log_path}' for more details.", file=sys.stderr)
             logger.exception(e)
 
         sys.exit(1)
@@ -72,17 +377,35 @@ def error_handler(run_func: Callable[[], None]):
 @error_handler
 def run() -> None:
     """Run the command line interface for the compressor."""
-    methods = {"huffman": Huffman(), "lzw": LZW()}
-    args = get_args(list(methods.keys()))
+    args = get_args(list(METHODS.keys()))
+    if args.log_file is not None:
+        configure(args.log_file)
+    input_path = Path(args.input_file[0])
+    output_path = Path(args.output_file)
 
-    method = methods.get(args.method, None)
+    if args.command == "train":
+        FileCompressor().train_dictionary(
+            input_path, output_path, TRAINERS[args.method](args)
+        )
+        return
 
-    if not (method and args.input_file and args.output_file and args.command):
-        raise ValueError("Invalid args")
+    method: CompressionMethod = args.compression_method
 
-    file_compressor = FileCompressor()
-    input_path = Path(args.input_file)
-    output_path = Path(args.output_file)
+    file_compressor = FileCompressor(
+        block_size=args.block_size,
+        workers=args.workers,
+        io_backend=args.io_backend,
+        stats_hook=stats_printer(output_path) if args.stats == "json" else None,
+    )
+
+    if args.batch:
+        inputs = batch_inputs(args.input_file)
+        suffix = f".{args.method}"
+        if args.command == "compress":
+            file_compressor.compress_batch(inputs, output_path, method, suffix)
+        elif args.command == "decompress":
+            file_compressor.decompress_batch(inputs, output_path, method, suffix)
+        return
 
     if args.command == "compress":
         file_compressor.compress(input_path, output_path, method)
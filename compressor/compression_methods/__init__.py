@@ -1,4 +1,44 @@
-from .huffman import Huffman
-from .lzw import LZW
+"""The compression methods. The modules are imported when first accessed, so that
+importing a single module, e.g. `interface`, does not load all the methods and their
+dependencies, which keeps the startup of the cli fast."""
 
-__all__ = ["Huffman", "LZW"]
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .huffman import Huffman
+    from .huffman_dictionary import HuffmanDictionary
+    from .interface import Compressor, Decompressor
+    from .lzw import LZW
+    from .lzw_dictionary import LZWDictionary
+    from .stats import CompressionStats
+
+# Exported name -> module defining it
+_MODULES = {
+    "CompressionStats": ".stats",
+    "Compressor": ".interface",
+    "Decompressor": ".interface",
+    "Huffman": ".huffman",
+    "HuffmanDictionary": ".huffman_dictionary",
+    "LZW": ".lzw",
+    "LZWDictionary": ".lzw_dictionary",
+}
+
+__all__ = [
+    "CompressionStats",
+    "Compressor",
+    "Decompressor",
+    "Huffman",
+    "HuffmanDictionary",
+    "LZW",
+    "LZWDictionary",
+]
+
+
+def __getattr__(name: str) -> Any:
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,201 @@
+"""Canonical Huffman codes and the code length table they are stored as.
+
+In a canonical Huffman code the codes are assigned in order of (code length, symbol), each
+code being the previous one plus one, shifted left when the length grows. So the codes are
+fully determined by the code length of each symbol, and only the lengths need to be stored.
+
+Code length table layout:
+    symbol count - 1 (1 byte)
+    if fewer than 32 symbols: (symbol, code length) pairs (2 bytes each), in symbol order
+    otherwise: a 32-byte bitmap of the symbols used, followed by the code length of each
+    symbol used (1 byte each), in symbol order
+"""
+
+from functools import lru_cache
+from typing import BinaryIO
+
+from bitarray import bitarray, frozenbitarray
+from bitarray.util import ba2int, int2ba
+
+from .interface import CompressionMethodError
+
+SYMBOL_COUNT = 256
+_BITMAP_SIZE = SYMBOL_COUNT // 8
+# From this many symbols on, the bitmap is smaller than storing the symbols
+_BITMAP_MIN_SYMBOLS = _BITMAP_SIZE
+# Codes converted to bitarrays kept in memory. Most inputs use only a few hundred.
+_CODE_CACHE_SIZE = 4096
+
+
+def canonical_codes(code_lengths: dict[int, int]) -> dict[int, bitarray]:
+    """Assigns the canonical Huffman codes for the given code lengths.
+
+    Args:
+        code_lengths (dict[int, int]): Code length of each symbol.
+
+    Returns:
+        dict[int, bitarray]: Code of each symbol. The codes are shared between calls,
+        so they must not be modified.
+    """
+    codes: dict[int, bitarray] = {}
+    code = 0
+    prev_len = 0
+    for symbol, length in sorted(code_lengths.items(), key=lambda item: (item[1], item[0])):
+        code <<= length - prev_len
+        codes[symbol] = _code_bits(code, length)
+        code += 1
+        prev_len = length
+
+    return codes
+
+
+@lru_cache(maxsize=_CODE_CACHE_SIZE)
+def _code_bits(code: int, length: int) -> frozenbitarray:
+    """Returns a code as a bitarray. Converting codes is a notable part of the setup for
+    small inputs, and as canonical codes are assigned the same way for any input, the
+    same codes come up again and again."""
+    return frozenbitarray(int2ba(code, length, endian="big"))
+
+
+def limited_code_lengths(frequencies: dict[int, int], max_len: int) -> dict[int, int]:
+    """Computes optimal code lengths not longer than max_len bits, using the
+    package-merge algorithm.
+
+    Starting from the symbols sorted by frequency, the two lightest items are repeatedly
+    packaged together and merged back with the symbols, once for each allowed bit of
+    length. The 2n - 2 lightest items of the result then contain each symbol as many
+    times as its code length.
+
+    Args:
+        frequencies (dict[int, int]): Frequency of each symbol.
+        max_len (int): Maximum code length in bits.
+
+    Raises:
+        ValueError: If there are more symbols than codes of max_len bits.
+
+    Returns:
+        dict[int, int]: Code length of each symbol.
+    """
+    symbols = sorted(frequencies, key=lambda symbol: (frequencies[symbol], symbol))
+    if len(symbols) > 1 << max_len:
+        raise ValueError(f"{len(symbols)} symbols do not fit in {max_len} bit codes")
+    if len(symbols) == 1:
+        return {symbols[0]: 1}
+
+    # Items are (weight, symbols included), sorted by weight
+    leaves = [(frequencies[symbol], (symbol,)) for symbol in symbols]
+    items = leaves
+    for _ in range(max_len - 1):
+        packages = [
+            (items[i][0] + items[i + 1][0], items[i][1] + items[i + 1][1])
+            for i in range(0, len(items) - 1, 2)
+        ]
+        items = sorted(leaves + packages, key=lambda item: item[0])
+
+    code_lengths = dict.fromkeys(symbols, 0)
+    for _weight, item_symbols in items[: 2 * len(symbols) - 2]:
+        for symbol in item_symbols:
+            code_lengths[symbol] += 1
+    return code_lengths
+
+
+def code_lengths_to_bytes(code_lengths: dict[int, int]) -> bytes:
+    """Serializes the code lengths into a code length table.
+
+    Args:
+        code_lengths (dict[int, int]): Code length of each symbol, 1-255 bits.
+        At least one symbol is required.
+
+    Returns:
+        bytes: The code length table.
+    """
+    symbols = sorted(code_lengths)
+    table = bytearray([len(symbols) - 1])
+
+    if len(symbols) < _BITMAP_MIN_SYMBOLS:
+        for symbol in symbols:
+            table += bytes([symbol, code_lengths[symbol]])
+        return bytes(table)
+
+    bitmap = bitarray(SYMBOL_COUNT, endian="big")
+    bitmap.setall(0)
+    bitmap[symbols] = 1
+    table += bitmap.tobytes()
+    table += bytes(code_lengths[symbol] for symbol in symbols)
+    return bytes(table)
+
+
+def read_code_lengths(bin_in: BinaryIO) -> dict[int, int]:
+    """Reads a code length table written by `code_lengths_to_bytes`.
+
+    Args:
+        bin_in (BinaryIO): Binary input positioned at the start of the table.
+
+    Raises:
+        CompressionMethodError: If the table is truncated or the code lengths
+        do not form a valid prefix code.
+
+    Returns:
+        dict[int, int]: Code length of each symbol.
+    """
+    count = _read_exactly(bin_in, 1)[0] + 1
+
+    if count < _BITMAP_MIN_SYMBOLS:
+        pairs = _read_exactly(bin_in, 2 * count)
+        code_lengths = {pairs[i]: pairs[i + 1] for i in range(0, len(pairs), 2)}
+    else:
+        bitmap = bitarray(endian="big")
+        bitmap.frombytes(_read_exactly(bin_in, _BITMAP_SIZE))
+        symbols = list(bitmap.search(1))
+        lengths = _read_exactly(bin_in, len(symbols))
+        if len(symbols) != count:
+            raise CompressionMethodError(
+                "Invalid header: code length table symbol count mismatch."
+            )
+        code_lengths = dict(zip(symbols, lengths))
+
+    _check_code_lengths(code_lengths, count)
+    return code_lengths
+
+
+def _read_exactly(bin_in: BinaryIO, size: int) -> bytes:
+    data = bin_in.read(size)
+    if len(data) != size:
+        raise CompressionMethodError("Invalid header: code length table is truncated.")
+    return data
+
+
+def _check_code_lengths(code_lengths: dict[int, int], count: int) -> None:
+    """Checks that the code lengths form a prefix code, i.e. satisfy Kraft's inequality."""
+    if len(code_lengths) != count or 0 in code_lengths.values():
+        raise CompressionMethodError("Invalid header: invalid code length table.")
+
+    max_len = max(code_lengths.values())
+    kraft_sum = sum(1 << (max_len - length) for length in code_lengths.values())
+    if kraft_sum > 1 << max_len:
+        raise CompressionMethodError(
+            "Invalid header: code lengths do not form a prefix code."
+        )
+
+
+def decode_table(code_lengths: dict[int, int], width: int) -> list[int]:
+    """Builds a lookup table for decoding canonical codes width bits at a time.
+
+    The table is indexed by the next width bits of the input. Each entry holds the
+    symbol whose code the bits start with and the length of that code, as
+    `symbol << 6 | length`. Entries of bits no code starts with are 0.
+
+    Args:
+        code_lengths (dict[int, int]): Code length of each symbol.
+        width (int): Number of bits to index the table with, at least the longest
+        code length.
+
+    Returns:
+        list[int]: The table, 2^width entries.
+    """
+    table = [0] * (1 << width)
+    for symbol, code in canonical_codes(code_lengths).items():
+        fill_len = width - len(code)
+        start = ba2int(code) << fill_len
+        table[start : start + (1 << fill_len)] = [symbol << 6 | len(code)] * (1 << fill_len)
+    return table
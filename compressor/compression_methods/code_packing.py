@@ -0,0 +1,161 @@
+"""Packing of integer codes into big-endian bit streams and back.
+
+Codes are converted in whole batches: the codes are stored in an `array` of 16 or 64-bit
+lanes, and bitarray's masked indexing drops (or, when unpacking, fills in) the unused high
+bits of every lane. This way no Python-level work is done per code.
+"""
+
+from array import array
+from functools import cache
+from sys import byteorder
+from typing import Iterable
+
+from bitarray import bitarray, frozenbitarray
+from bitarray.util import zeros
+
+
+def _lane_typecode(code_size: int) -> str:
+    """Returns the `array` typecode of the smallest lane that fits code_size bits."""
+    if not 0 < code_size <= 64:
+        raise ValueError(f"Unsupported code size: {code_size}")
+    return "H" if code_size <= 16 else "Q"
+
+
+@cache
+def _lane_mask(code_size: int) -> frozenbitarray:
+    """Returns a mask selecting the low code_size bits of a big-endian lane."""
+    lane_size = array(_lane_typecode(code_size)).itemsize * 8
+    return frozenbitarray("0" * (lane_size - code_size) + "1" * code_size)
+
+
+def _lanes_to_bits(lanes: array) -> bitarray:
+    if byteorder == "little":
+        lanes.byteswap()
+    bits = bitarray(endian="big")
+    bits.frombytes(lanes.tobytes())
+    return bits
+
+
+def pack_codes(codes: Iterable[int], code_size: int) -> bitarray:
+    """Packs codes into a bitarray, using code_size bits for each code.
+
+    Args:
+        codes (Iterable[int]): The codes to pack.
+        code_size (int): Number of bits used per code.
+
+    Raises:
+        ValueError: If a code does not fit in code_size bits.
+
+    Returns:
+        bitarray: The packed codes, most significant bit first.
+    """
+    try:
+        lanes = array(_lane_typecode(code_size), codes)
+    except OverflowError as e:
+        raise ValueError(f"Code does not fit in {code_size} bits") from e
+
+    if lanes and max(lanes) >> code_size:
+        raise ValueError(f"Code {max(lanes)} does not fit in {code_size} bits")
+
+    return _lanes_to_bits(lanes)[_lane_mask(code_size) * len(lanes)]
+
+
+def unpack_codes(bits: bitarray, code_size: int) -> list[int]:
+    """Unpacks code_size-bit codes from a bitarray packed with `pack_codes`.
+
+    Args:
+        bits (bitarray): The packed codes. Trailing bits not forming a whole code are ignored.
+        code_size (int): Number of bits used per code.
+
+    Returns:
+        list[int]: The unpacked codes.
+    """
+    typecode = _lane_typecode(code_size)
+    count = len(bits) // code_size
+
+    mask = _lane_mask(code_size) * count
+    lane_bits = zeros(len(mask), endian="big")
+    lane_bits[mask] = bits[: count * code_size]
+
+    lanes = array(typecode)
+    lanes.frombytes(lane_bits.tobytes())
+    if byteorder == "little":
+        lanes.byteswap()
+    return lanes.tolist()
+
+
+class CodePacker:
+    """Packs codes into bytes over multiple calls, keeping the bits that do not yet
+    fill a whole byte until the next call."""
+
+    def __init__(self) -> None:
+        self._bits = bitarray(endian="big")
+
+    def pack(self, codes: Iterable[int], code_size: int) -> bytes:
+        """Packs codes and returns the bytes completed so far.
+
+        Args:
+            codes (Iterable[int]): The codes to pack.
+            code_size (int): Number of bits used per code.
+
+        Returns:
+            bytes: All whole bytes that are ready to be written.
+        """
+        self._bits += pack_codes(codes, code_size)
+
+        full_len = len(self._bits) - len(self._bits) % 8
+        packed = self._bits[:full_len].tobytes()
+        del self._bits[:full_len]
+        return packed
+
+    def flush(self) -> tuple[bytes, int]:
+        """Returns the remaining bits padded with zeros to a whole byte.
+
+        Returns:
+            tuple[bytes, int]: The remaining bytes and the number of padding bits added.
+        """
+        padding_len = self._bits.padbits
+        remaining = self._bits.tobytes()
+        self._bits.clear()
+        return remaining, padding_len
+
+
+class CodeUnpacker:
+    """Unpacks codes from bytes fed in over multiple calls, keeping incomplete codes
+    until more bytes are fed."""
+
+    def __init__(self) -> None:
+        self._bits = bitarray(endian="big")
+
+    def __len__(self) -> int:
+        """Number of bits fed but not yet unpacked."""
+        return len(self._bits)
+
+    def feed(self, data: bytes) -> None:
+        """Adds packed bytes to be unpacked."""
+        self._bits.frombytes(data)
+
+    def unpack(self, code_size: int, count: int | None = None) -> list[int]:
+        """Unpacks whole codes from the bytes fed so far.
+
+        Args:
+            code_size (int): Number of bits used per code.
+            count (int | None, optional): Maximum number of codes to unpack.
+            Defaults to None, i.e. as many as available.
+
+        Returns:
+            list[int]: The unpacked codes.
+        """
+        available = len(self._bits) // code_size
+        if count is not None:
+            available = min(available, count)
+
+        codes_len = available * code_size
+        codes = unpack_codes(self._bits[:codes_len], code_size)
+        del self._bits[:codes_len]
+        return codes
+
+    def unread(self, codes: list[int], code_size: int) -> None:
+        """Puts unpacked codes back in front of the remaining bits, e.g. if they
+        turn out to use a different code size than they were unpacked with."""
+        self._bits[:0] = pack_codes(codes, code_size)
@@ -0,0 +1,109 @@
+"""Code tables of the order-1 context model of `Huffman`.
+
+Each byte is coded with a table chosen by the previous byte, its context. A context gets
+its own table only if the table pays for itself, i.e. the bits saved by coding the
+context's bytes with it are more than the bits taken by storing it. The bytes of other
+contexts, typically those with only a few bytes, are coded with a shared table built
+from the frequencies of all bytes.
+
+Tables layout:
+    shared code length table
+    32-byte bitmap of the contexts with their own table
+    code length table of each context with its own table, in context order
+See `canonical_huffman` for the code length table layout.
+"""
+
+from typing import BinaryIO
+
+from bitarray import bitarray
+
+from .canonical_huffman import (
+    SYMBOL_COUNT,
+    code_lengths_to_bytes,
+    limited_code_lengths,
+    read_code_lengths,
+)
+from .interface import CompressionMethodError
+
+_BITMAP_SIZE = SYMBOL_COUNT // 8
+
+
+def _encoded_len(frequencies: dict[int, int], code_lengths: dict[int, int]) -> int:
+    return sum(freq * code_lengths[symbol] for symbol, freq in frequencies.items())
+
+
+def select_context_tables(
+    context_frequencies: dict[int, dict[int, int]], max_code_len: int
+) -> tuple[dict[int, int], dict[int, dict[int, int]], int]:
+    """Computes the shared table and chooses the contexts that get their own table.
+
+    Args:
+        context_frequencies (dict[int, dict[int, int]]): Frequency of each byte in each
+        context.
+        max_code_len (int): Maximum code length in bits.
+
+    Returns:
+        tuple[dict[int, int], dict[int, dict[int, int]], int]: The shared code lengths,
+        the code lengths of each context with its own table, and the length of the
+        encoded data in bits.
+    """
+    frequencies: dict[int, int] = {}
+    for context_freqs in context_frequencies.values():
+        for symbol, freq in context_freqs.items():
+            frequencies[symbol] = frequencies.get(symbol, 0) + freq
+    shared_lengths = limited_code_lengths(frequencies, max_code_len)
+
+    context_lengths: dict[int, dict[int, int]] = {}
+    encoded_len = 0
+    for context, context_freqs in sorted(context_frequencies.items()):
+        shared_len = _encoded_len(context_freqs, shared_lengths)
+
+        own_lengths = limited_code_lengths(context_freqs, max_code_len)
+        own_len = _encoded_len(context_freqs, own_lengths)
+        table_len = 8 * len(code_lengths_to_bytes(own_lengths))
+
+        if own_len + table_len < shared_len:
+            context_lengths[context] = own_lengths
+            encoded_len += own_len
+        else:
+            encoded_len += shared_len
+
+    return shared_lengths, context_lengths, encoded_len
+
+
+def context_tables_to_bytes(
+    shared_lengths: dict[int, int], context_lengths: dict[int, dict[int, int]]
+) -> bytes:
+    """Serializes the shared table and the context tables."""
+    bitmap = bitarray(SYMBOL_COUNT, endian="big")
+    bitmap.setall(0)
+    bitmap[list(context_lengths)] = 1
+
+    tables = code_lengths_to_bytes(shared_lengths) + bitmap.tobytes()
+    for context in sorted(context_lengths):
+        tables += code_lengths_to_bytes(context_lengths[context])
+    return tables
+
+
+def read_context_tables(
+    bin_in: BinaryIO,
+) -> tuple[dict[int, int], dict[int, dict[int, int]]]:
+    """Reads tables written by `context_tables_to_bytes`.
+
+    Raises:
+        CompressionMethodError: If the tables are truncated or invalid.
+
+    Returns:
+        tuple[dict[int, int], dict[int, dict[int, int]]]: The shared code lengths and the
+        code lengths of each context with its own table.
+    """
+    shared_lengths = read_code_lengths(bin_in)
+
+    bitmap_bytes = bin_in.read(_BITMAP_SIZE)
+    if len(bitmap_bytes) != _BITMAP_SIZE:
+        raise CompressionMethodError("Invalid header: context bitmap is truncated.")
+    bitmap = bitarray(endian="big")
+    bitmap.frombytes(bitmap_bytes)
+
+    context_lengths = {context: read_code_lengths(bin_in) for context in bitmap.search(1)}
+    return shared_lengths, context_lengths
@@ -1,216 +1,843 @@
-from typing import TextIO, BinaryIO, override
-from bitarray import bitarray
-
+import sys
+from collections import Counter
+from collections.abc import Hashable
+from functools import partial
+from itertools import chain
+from shutil import copyfileobj
+from typing import Any, BinaryIO, Iterable, Iterator, cast, override
+from bitarray import bitarray, decodetree
+
+from .canonical_huffman import (
+    SYMBOL_COUNT,
+    canonical_codes,
+    code_lengths_to_bytes,
+    decode_table,
+    limited_code_lengths,
+    read_code_lengths,
+)
+from .context_huffman import (
+    context_tables_to_bytes,
+    read_context_tables,
+    select_context_tables,
+)
 from .interface import CompressionMethod, CompressionMethodError
-from .huffman_tree import HuffmanTreeNode
+from .huffman_dictionary import HuffmanDictionary
+from .huffman_tree import FlatHuffmanTree
+from .stats import CompressionStats, CountingReader
 
 from ..utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Up to this many distinct bytes, counting each of them with `bytes.count` is faster
+# than counting all bytes with a Counter. A pass of `bytes.count` costs about 1/100 of
+# the Counter per byte of data.
+_MAX_COUNT_PASSES = 64
+# Bytes at the start of the data from which the distinct bytes are guessed
+_SAMPLE_SIZE = 1024
+
+
+def _count_bytes(data: bytes) -> Counter[int]:
+    """Counts the occurrences of each byte value in data, without a Python loop over the
+    bytes.
+
+    The distinct bytes are guessed from the start of data, and each of them is counted
+    with `bytes.count`. The bytes not guessed are counted with a Counter after deleting
+    the guessed ones, so typically only a few bytes are left. With many distinct bytes,
+    all bytes are counted with a Counter.
+    """
+    guessed = bytes(frozenset(data[:_SAMPLE_SIZE]))
+    if len(guessed) > _MAX_COUNT_PASSES:
+        return Counter(data)
+    counts = Counter({c: data.count(c) for c in guessed})
+    counts.update(data.translate(None, guessed))
+    return counts
+
+
+def _byte_pairs(preceding: bytes, data: bytes) -> memoryview:
+    """Returns each byte of data paired with the byte at the same position in
+    preceding, as the integers `preceding_byte << 8 | byte`.
+
+    The pairs are built by interleaving the bytes into an array of 16-bit integers, so
+    that they can be counted or encoded in C without a Python loop.
+    """
+    pairs = bytearray(2 * len(data))
+    # Byte order of the integers of the memoryview is native
+    high, low = (0, 1) if sys.byteorder == "big" else (1, 0)
+    pairs[high::2] = preceding
+    pairs[low::2] = data
+    return memoryview(pairs).cast("H")
+
 
 class Huffman(CompressionMethod):
-    """Implements the Huffman compression algorithm as a CompressionMethod."""
+    """Implements the Huffman compression algorithm as a CompressionMethod.
+
+    The alphabet is the 256 byte values. The Huffman tree is a `FlatHuffmanTree`, whose
+    leaves hold the bytes themselves.
+
+    Canonical Huffman codes are used, so only the code length of each byte is stored in
+    the header, see `canonical_huffman`. Header layout: format byte, padding length byte,
+    max code length byte (only with length-limited codes), code length table. Files in the
+    legacy format, which stores the whole Huffman tree, can still be decompressed.
+
+    With `order=1`, each byte is coded with a code table chosen by the previous byte, see
+    `context_huffman`. Header layout: format byte, padding length byte, max code length
+    byte, context tables. Context tables are always length-limited, so that the decoder
+    can use bounded lookup tables.
+
+    With a `HuffmanDictionary`, the codes of the dictionary are used instead, and only
+    the dictionary id is stored. Header layout: format byte, padding length byte,
+    dictionary id (4 bytes). The same dictionary is needed for decompression.
+    """
+
+    _CHUNK_SIZE = 64 * 1024  # Bytes read from the input at a time
+    # Bytes of non-seekable input or output buffered in memory before spilling over to
+    # a temporary file, see `_spool`
+    _SPOOL_SIZE = 64 * 1024**2
+
+    # The first byte of compressed data tells its format. The legacy format starts with
+    # an 8-byte padding length, which is always less than 8, so its first byte is 0.
+    _LEGACY_FORMAT = 0
+    _CANONICAL_FORMAT = 1
+    _LENGTH_LIMITED_FORMAT = 2
+    _ORDER1_FORMAT = 3
+    _DICTIONARY_FORMAT = 4
+    _LEGACY_HEADER_SIZE = 16
+    _DICT_ID_SIZE = 4
+
+    # Limits for the max code length. Codes for all 256 byte values must fit.
+    _MIN_MAX_CODE_LEN = 8
+    _MAX_MAX_CODE_LEN = 32
+    # Default and largest max code length with order 1 contexts. Limits the decoder's
+    # lookup tables, one per context, to 4096 entries.
+    _ORDER1_MAX_CODE_LEN = 12
+    # Bytes added at a time to the bits being decoded with order 1 contexts
+    _REFILL_SIZE = 8
+
+    def __init__(
+        self,
+        max_code_len: int | None = None,
+        order: int = 0,
+        dictionary: HuffmanDictionary | None = None,
+    ) -> None:
+        """
+        Args:
+            max_code_len (int | None, optional): Maximum code length in bits, e.g. 12 or
+            15, or None for optimal codes of unlimited length. Length-limited codes are
+            computed with the package-merge algorithm. Defaults to None, with order 1
+            12 bits, which is also the largest allowed with order 1.
+            order (int, optional): Order of the context model: 0 codes each byte with the
+            same code table, 1 with a table chosen by the previous byte. Defaults to 0.
+            Decompression detects the order from the header.
+            dictionary (HuffmanDictionary | None, optional): Dictionary to compress with,
+            and to decompress files compressed with it. Defaults to None.
+
+        Raises:
+            ValueError: If max_code_len is not between 8 and 32 (12 with order 1), or
+            order is not 0 or 1, or either is given together with a dictionary.
+        """
+        if max_code_len is not None and not (
+            self._MIN_MAX_CODE_LEN <= max_code_len <= self._MAX_MAX_CODE_LEN
+        ):
+            raise ValueError(
+                f"Max code length must be between {self._MIN_MAX_CODE_LEN} "
+                + f"and {self._MAX_MAX_CODE_LEN}"
+            )
+        if order not in (0, 1):
+            raise ValueError("Context model order must be 0 or 1")
+        if order == 1 and max_code_len is not None and (
+            max_code_len > self._ORDER1_MAX_CODE_LEN
+        ):
+            raise ValueError(
+                "Max code length must be at most "
+                + f"{self._ORDER1_MAX_CODE_LEN} with order 1 contexts"
+            )
+        if dictionary is not None and (max_code_len is not None or order != 0):
+            raise ValueError(
+                "Max code length and order cannot be used with a dictionary, "
+                + "the dictionary's codes are used as is"
+            )
 
-    def _count_frequencies(self, text: TextIO) -> list[tuple[int, str]]:
-        """Count the number of occurences for each character in given input.
+        self.max_code_len = max_code_len
+        self.order = order
+        self.dictionary = dictionary
+
+    def _count_frequencies(self, bin_in: BinaryIO) -> list[tuple[int, str]]:
+        """Count the number of occurences for each byte in given input.
+
+        The input is read from its current position in chunks of `_CHUNK_SIZE` bytes,
+        so the whole input is never held in memory at once. The position is restored
+        afterwards.
 
         Args:
-            text (TextIO): Object containing the text from which to count character frequencies.
+            bin_in (BinaryIO): Seekable object containing the data from which to count
+            byte frequencies.
 
         Returns:
-            list[tuple[int, str]]: Returns a list of tuples, containing each character's
-            frequency and the respective character.
+            list[tuple[int, str]]: Returns a list of tuples, containing each byte's
+            frequency and the respective byte as a char.
         """
-        saved_pointer = text.tell()
-        text.seek(0)
+        saved_pointer = bin_in.tell()
 
-        freq_dict: dict[str, int] = {}
+        freq_dict: Counter[int] = Counter()
+        while chunk := bin_in.read(self._CHUNK_SIZE):
+            freq_dict.update(_count_bytes(chunk))
 
-        for c in text.read():
-            freq_dict[c] = freq_dict.get(c, 0) + 1
+        freq_list = sorted(((f, chr(c)) for c, f in freq_dict.items()), reverse=True)
 
-        freq_list: list[tuple[int, str]] = []
-        for c, f in freq_dict.items():
-            freq_list.append((f, c))
+        bin_in.seek(saved_pointer)
+        return freq_list
 
-        freq_list.sort(reverse=True)
+    def _count_context_frequencies(self, bin_in: BinaryIO) -> dict[int, dict[int, int]]:
+        """Count the number of occurences for each byte following each byte, like
+        `_count_frequencies`. The first byte is counted as following a 0 byte.
 
-        text.seek(saved_pointer)
-        return freq_list
+        Returns:
+            dict[int, dict[int, int]]: Frequency of each byte, by the preceding byte.
+        """
+        saved_pointer = bin_in.tell()
+
+        pair_freqs: Counter[int] = Counter()
+        prev = b"\0"
+        while chunk := bin_in.read(self._CHUNK_SIZE):
+            pair_freqs.update(_byte_pairs(prev + chunk[:-1], chunk))
+            prev = chunk[-1:]
+
+        context_freqs: dict[int, dict[int, int]] = {}
+        for pair, freq in pair_freqs.items():
+            context_freqs.setdefault(pair >> 8, {})[pair & 0xFF] = freq
+
+        bin_in.seek(saved_pointer)
+        return context_freqs
+
+    def _read_chunks(self, bin_in: BinaryIO) -> Iterator[bytes]:
+        """Reads the input from its current position in chunks of `_CHUNK_SIZE` bytes."""
+        return iter(partial(bin_in.read, self._CHUNK_SIZE), b"")
+
+    def _spool(self, bin_in: BinaryIO) -> BinaryIO:
+        """Copies non-seekable input, e.g. a pipe, so that it can be read twice. The copy
+        is kept in memory up to `_SPOOL_SIZE` bytes, and in a temporary file beyond that.
+        The copy is positioned at its start, and should be closed after use."""
+        spooled = self._spool_file()
+        copyfileobj(bin_in, spooled, self._CHUNK_SIZE)
+        spooled.seek(0)
+        return spooled
+
+    def _spool_file(self) -> BinaryIO:
+        """Returns a new file kept in memory up to `_SPOOL_SIZE` bytes. tempfile is only
+        imported for pipes, as it adds to the startup time of every run."""
+        from tempfile import SpooledTemporaryFile
+
+        return cast(BinaryIO, SpooledTemporaryFile(max_size=self._SPOOL_SIZE))
+
+    def _encode_data(
+        self,
+        chunks: Iterable[bytes],
+        huffman_codes: dict[int, bitarray],
+        bin_out: BinaryIO,
+        stats: CompressionStats,
+    ) -> int:
+        """Encodes the input using the given huffman codes and writes it to bin_out.
 
-    def _encode_text(
-        self, text: TextIO, huffman_codes: dict[str, bitarray | None]
-    ) -> bitarray:
-        """Encodes the given string using the given huffman codes.
+        The input is encoded a chunk at a time, each with a single `bitarray.encode`
+        call, which looks up the codes in C. Encoded bits are written out as soon as
+        they fill whole bytes, and the last byte is padded with zeros.
 
         Args:
-            text (TextIO): The text to encode
+            chunks (Iterable[bytes]): The data to encode, e.g. from `_read_chunks`.
+
+            huffman_codes (dict[int, bitarray]):
+            The huffman codes of the bytes to be used for encoding. Preferably the codes that were
+            generated for the same data provided for best compression and no missing codes.
+
+            bin_out (BinaryIO): The binary output to write the encoded data to.
 
-            huffman_codes (dict[str, bitarray  |  None]):
-            The huffman codes to be used for text encoding. Preferably the codes that were
-            generated for the same text provided for best compression and no missing codes.
+            stats (CompressionStats): Where to record the measurements.
 
         Raises:
-            ValueError: If the provided Huffman tree misses characters used in the given text.
+            CompressionMethodError: If the provided Huffman tree misses bytes used in the
+            given data.
 
         Returns:
-            bitarray: Encoded text.
+            int: Length of the encoded data in bits, without padding.
         """
-        saved_pointer = text.tell()
-        logger.debug("_encode_text: pointer was at %s", saved_pointer)
-        text.seek(0)
-
-        result = bitarray()
-        for c in text.read():
-            code = huffman_codes[c]
-            if code is None:
+        encoded_len = 0
+        buffer = bitarray()
+        for chunk in chunks:
+            stats.bytes_in += len(chunk)
+            try:
+                with stats.stage("encode"):
+                    buffer.encode(huffman_codes, chunk)
+            except ValueError as e:
+                missing = next(c for c in chunk if c not in huffman_codes)
                 raise CompressionMethodError(
-                    f"Code for character {c} missing from huffman tree"
-                )
-
-            result.extend(code)
+                    f"Code for byte {missing} missing from huffman tree"
+                ) from e
 
-        logger.debug("_encode_text: read %s characters", text.tell())
-        logger.debug("_encode_text: encoded bitarray len: %s", len(result))
-        text.seek(saved_pointer)
-        return result
+            # Write out all whole bytes, keeping the remaining bits for the next chunk
+            with stats.stage("pack"):
+                full_len = len(buffer) - len(buffer) % 8
+                encoded = buffer[:full_len].tobytes()
+                del buffer[:full_len]
+            stats.write(bin_out, encoded)
+            encoded_len += full_len
 
-    def _decode_text(
-        self, encoded_text: bitarray, huffman_tree: HuffmanTreeNode
-    ) -> str:
-        """Decompres compressed text using the given Huffman tree.
+        encoded_len += len(buffer)
+        stats.write(bin_out, buffer.tobytes())
+        stats.add_count("symbols", stats.bytes_in)
 
-        Args:
-            encoded_text (bitarray): Encoded text to be decoded.
-            huffman_tree (HuffmanTreeNode): Huffman tree to be used for decoding the text.
+        logger.debug("_encode_data: encoded bitarray len: %s", encoded_len)
+        return encoded_len
 
-        Returns:
-            str: The resulting decoded text.
-        """
-        result: list[str] = []
-        current_node: HuffmanTreeNode = huffman_tree
-
-        for bit in encoded_text:
-            # Traverse left/right down the Huffman tree based on bit
-            if bit == 0 and current_node.left is not None:
-                current_node = current_node.left
-            elif bit == 1 and current_node.right is not None:
-                current_node = current_node.right
+    def _encode_context_data(
+        self,
+        bin_in: BinaryIO,
+        tables: bytes,
+        pair_codes: dict[int, bitarray],
+        bin_out: BinaryIO,
+        stats: CompressionStats,
+    ) -> None:
+        """Encodes the input like `_encode_data`, but coding each byte with the codes
+        of its context, the previous byte.
 
-            # If hit a leaf, append that char and reset back to root
-            if current_node.left is None and current_node.right is None:
-                assert current_node.left is None and current_node.right is None
-                result.append(current_node.char)
-                current_node = huffman_tree  # Reset to root for next character
+        The codes are looked up by the pairs of `_byte_pairs`, so that `bitarray.encode`
+        can encode a chunk at a time. The contexts are first translated into the context
+        whose table they use, so that all the contexts using the shared table look up
+        the same codes, which keeps the lookups in a small part of pair_codes.
 
-        return "".join(result)
+        Args:
+            bin_in (BinaryIO): The data to encode
+            tables (bytes): Context whose code table each context uses, 256 bytes.
+            pair_codes (dict[int, bitarray]): The code of each byte in each context of
+            tables, by `context << 8 | byte`.
+            bin_out (BinaryIO): The binary output to write the encoded data to.
+            stats (CompressionStats): Where to record the measurements.
+        """
+        buffer = bitarray()
+        prev = b"\0"
+        while chunk := bin_in.read(self._CHUNK_SIZE):
+            stats.bytes_in += len(chunk)
+            with stats.stage("encode"):
+                contexts = (prev + chunk[:-1]).translate(tables)
+                buffer.encode(pair_codes, _byte_pairs(contexts, chunk))
+            prev = chunk[-1:]
+
+            with stats.stage("pack"):
+                full_len = len(buffer) - len(buffer) % 8
+                encoded = buffer[:full_len].tobytes()
+                del buffer[:full_len]
+            stats.write(bin_out, encoded)
+
+        stats.write(bin_out, buffer.tobytes())
+        stats.add_count("symbols", stats.bytes_in)
+
+    def _decode_data(
+        self,
+        encoded_text: bitarray,
+        decoder: decodetree,
+        code_lens: dict[int, int],
+    ) -> tuple[bytes, bitarray]:
+        """Decompres compressed data using the given decode tree.
 
-    def _decode(self, tree_bytes: bytearray, encoded_text: bitarray) -> str:
-        huffman_tree = HuffmanTreeNode.from_bytes(tree_bytes)
-        logger.debug("Reconstructed Huffman tree: %s", str(huffman_tree))
+        Decoding is done by bitarray's C implementation, which emits a whole byte
+        per code instead of stepping through the tree bit by bit in Python.
 
-        if huffman_tree is None:
-            raise ValueError("Invalid tree string")
+        Args:
+            encoded_text (bitarray): Encoded data to be decoded.
+            decoder (decodetree): Decode tree built from the Huffman codes of the bytes.
+            code_lens (dict[int, int]): Length of the code of each byte.
 
-        decoded_text = self._decode_text(encoded_text, huffman_tree)
-        return decoded_text
+        Raises:
+            CompressionMethodError: If the encoded data contains invalid codes.
 
-    def _read_headers(self, bin_in: BinaryIO) -> tuple[int, int]:
-        """Reads th headers from a BinaryIO object containing compressed text.
+        Returns:
+            tuple[bytes, bitarray]: The resulting decoded data and the bits of an incomplete
+            code at the end of encoded_text, which should be prepended to the next chunk.
+        """
+        result: list[int] = []
+        try:
+            result.extend(encoded_text.decode(decoder))
+            remaining = bitarray()
+        except ValueError as e:
+            # Decoding stopped at a code that is not complete or not valid.
+            # Characters decoded until that point are in the result.
+            decoded_len = sum(map(code_lens.__getitem__, result))
+            remaining = encoded_text[decoded_len:]
+            if len(remaining) >= max(code_lens.values()):
+                raise CompressionMethodError(f"Invalid encoded text: {e}") from e
+
+        return bytes(result), remaining
+
+    def _read_headers(
+        self, bin_in: BinaryIO, data_format: bytes
+    ) -> tuple[int, dict[int, bitarray]]:
+        """Reads the headers from a BinaryIO object containing compressed data.
+
+        Both the canonical format and the legacy format storing the whole Huffman tree
+        can be read. The format is told apart by the first byte.
 
         Args:
-            bin_in (BinaryIO): Object from which to read compressed text.
+            bin_in (BinaryIO): Object from which to read compressed data, positioned
+            after the first byte.
+            data_format (bytes): The first byte.
 
         Raises:
             CompressionMethodError: If compressed content is invalid.
 
         Returns:
-            tuple[int, int]: A tuple containing the length of padding and the tree, in bytes.
+            tuple[int, dict[int, bitarray]]: A tuple containing the length of padding in
+            bits and the code of each byte.
         """
-        # Header is 16 bytes long, see the compress method for how header is formed.
-        header = bin_in.read(16)
+        if data_format == bytes([self._LEGACY_FORMAT]):
+            return self._read_legacy_headers(bin_in)
+        if data_format == bytes([self._DICTIONARY_FORMAT]):
+            return self._read_dictionary_headers(bin_in)
+        if data_format not in (
+            bytes([self._CANONICAL_FORMAT]),
+            bytes([self._LENGTH_LIMITED_FORMAT]),
+        ):
+            raise CompressionMethodError(
+                "Invalid header: unknown format. "
+                + "Make sure the file is a valid compressed file."
+            )
+
+        padding_len = self._read_padding_len(bin_in)
+
+        max_code_len = None
+        if data_format == bytes([self._LENGTH_LIMITED_FORMAT]):
+            max_code_len = self._read_max_code_len(bin_in)
+
+        code_lengths = read_code_lengths(bin_in)
+        logger.debug("Code lengths: %s", code_lengths)
+
+        if max_code_len is not None:
+            self._check_max_code_len(code_lengths, max_code_len)
+        return padding_len, canonical_codes(code_lengths)
+
+    def _read_dictionary_headers(
+        self, bin_in: BinaryIO
+    ) -> tuple[int, dict[int, bitarray]]:
+        """Reads the headers of data compressed with a dictionary, which must be the
+        dictionary of this instance."""
+        padding_len = self._read_padding_len(bin_in)
+
+        dict_id_bytes = bin_in.read(self._DICT_ID_SIZE)
+        if len(dict_id_bytes) != self._DICT_ID_SIZE:
+            raise CompressionMethodError("Invalid header: dictionary id is truncated.")
+        dict_id = int.from_bytes(dict_id_bytes, byteorder="big")
+
+        if self.dictionary is None:
+            raise CompressionMethodError(
+                f"Compressed with Huffman dictionary {dict_id:08x}, "
+                + "which is needed for decompression."
+            )
+        if self.dictionary.dict_id != dict_id:
+            raise CompressionMethodError(
+                f"Compressed with Huffman dictionary {dict_id:08x}, "
+                + f"but dictionary {self.dictionary.dict_id:08x} was given."
+            )
+        return padding_len, self.dictionary.codes
+
+    def _read_padding_len(self, bin_in: BinaryIO) -> int:
+        padding = bin_in.read(1)
+        if len(padding) != 1 or padding[0] >= 8:
+            raise CompressionMethodError("Invalid header: padding_len out of bounds.")
+        return padding[0]
+
+    def _read_max_code_len(
+        self, bin_in: BinaryIO, upper_bound: int = _MAX_MAX_CODE_LEN
+    ) -> int:
+        """Reads the max code length from the header, rejecting lengths above
+        upper_bound, e.g. ones whose decode tables would not fit in memory."""
+        limit = bin_in.read(1)
+        if len(limit) != 1 or not self._MIN_MAX_CODE_LEN <= limit[0] <= upper_bound:
+            raise CompressionMethodError("Invalid header: max code length out of bounds.")
+        return limit[0]
+
+    def _check_max_code_len(self, code_lengths: dict[int, int], max_code_len: int) -> None:
+        if max(code_lengths.values()) > max_code_len:
+            raise CompressionMethodError(
+                f"Invalid header: code longer than the max code length {max_code_len}."
+            )
+
+    def _read_legacy_headers(
+        self, bin_in: BinaryIO
+    ) -> tuple[int, dict[int, bitarray]]:
+        """Reads the headers of the legacy format, following the first byte.
+        See `_read_headers`."""
+        # Header is 16 bytes long: 8-byte padding length and 8-byte tree length.
+        # The first byte of the padding length has already been read.
+        header = bytes([self._LEGACY_FORMAT]) + bin_in.read(self._LEGACY_HEADER_SIZE - 1)
         padding_len = int.from_bytes(bytes=header[:8], byteorder="big", signed=False)
         tree_len = int.from_bytes(bytes=header[8:], byteorder="big", signed=False)
 
         # Check that values are sensible
-        # Tree length should be less than remaining length.
         # Padding is to make the length a multiple of 8 so it should be less than 8.
+        # Tree length should be less than remaining length.
+        tree_bytes = bytearray(bin_in.read(tree_len))
         if (
-            padding_len < 0
-            or tree_len < 0
+            len(header) != self._LEGACY_HEADER_SIZE
             or padding_len >= 8
-            or tree_len > len(bin_in.read())
+            or len(tree_bytes) != tree_len
         ):
             raise CompressionMethodError(
                 "Invalid header: padding_len or tree_len out of bounds. "
                 + "Make sure the file is a valid compressed file."
             )
 
-        # Move pointer back to the start of the tree
-        bin_in.seek(16, 0)
+        huffman_tree = FlatHuffmanTree.from_bytes(tree_bytes)
+        logger.debug("Reconstructed Huffman tree: %s nodes", len(huffman_tree))
+        return padding_len, huffman_tree.codes()
+
+    def _create_header(self, code_lengths: dict[int, int], padding_len: int) -> bytes:
+        """Creates the header: the format byte, padding length byte, max code length byte
+        if the code lengths are limited, and the code length table."""
+        if self.max_code_len is None:
+            header = bytes([self._CANONICAL_FORMAT, padding_len])
+        else:
+            header = bytes([self._LENGTH_LIMITED_FORMAT, padding_len, self.max_code_len])
+        return header + code_lengths_to_bytes(code_lengths)
+
+    def _code_lengths(self, freq_list: list[tuple[int, str]]) -> dict[int, int]:
+        """Computes the code length of each byte from the byte frequencies, limited to
+        `max_code_len` if it is set."""
+        if self.max_code_len is not None:
+            frequencies = {ord(c): freq for freq, c in freq_list}
+            return limited_code_lengths(frequencies, self.max_code_len)
+
+        tree = FlatHuffmanTree.build(freq_list)
+        assert tree is not None
+        return tree.code_lengths()
+
+    def _padding_len(
+        self,
+        freq_list: list[tuple[int, str]],
+        huffman_codes: dict[int, bitarray],
+    ) -> int:
+        """Computes the padding needed after the encoded text from the character frequencies.
 
-        return padding_len, tree_len
+        As the frequencies are counted before encoding, the length of the encoded text
+        and thus the padding is known before any of the text is encoded. This way the
+        header can be written before the encoded text.
 
-    def _create_header(self, encoded_tree: bytearray, encoded_text: bitarray):
-        # Prepare the header
-        # Info fields are eight byte unsigned integers. The header is therefore 16 bytes long.
-        # Also tree length is limited to 2^64, probably sufficient though.
-        # Note: consider defining the header params in some constants
-        tree_len = len(encoded_tree)
-        tree_len_info = tree_len.to_bytes(length=8, byteorder="big", signed=False)
+        Args:
+            freq_list (list[tuple[int, str]]): The character frequencies of the text.
+            huffman_codes (dict[int, bitarray]): The codes the text is encoded with.
 
-        padding_len_info = encoded_text.padbits.to_bytes(
-            length=8, byteorder="big", signed=False
-        )
+        Returns:
+            int: The number of padding bits after the encoded text.
+        """
+        encoded_len = 0
+        for freq, c in freq_list:
+            encoded_len += freq * len(huffman_codes[ord(c)])
 
-        header = padding_len_info + tree_len_info
+        return (8 - encoded_len % 8) % 8
 
-        return header
+    @override
+    def compress_stream(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats | None = None
+    ) -> CompressionStats:
+        """Compresses the input and writes the result to bin_out.
 
-    def _write(
-        self,
-        tree: HuffmanTreeNode,
-        encoded_text: bitarray,
-        bin_out: BinaryIO,
-    ):
-        saved_pointer = bin_out.tell()
-        bin_out.seek(0)
+        The input is read twice, first to count the byte frequencies and then to encode
+        it. Non-seekable input, e.g. a pipe, is copied first, see `_spool`; with a
+        dictionary, it is read only once. The output is only written to, except with a
+        dictionary, where non-seekable output is buffered, see
+        `_compress_with_dictionary`.
 
-        tree_bytes = tree.to_bytes()
-        header = self._create_header(tree_bytes, encoded_text)
-        bin_out.write(header)
-        bin_out.write(tree_bytes)
-        bin_out.write(encoded_text.tobytes())
+        Args:
+            bin_in (BinaryIO): The binary input to compress.
+            bin_out (BinaryIO): The binary output to write the compressed data.
+            stats (CompressionStats | None, optional): Where to record the measurements.
+            Defaults to None, i.e. new ones.
 
-        bin_out.seek(saved_pointer)
+        Returns:
+            CompressionStats: The measurements of the call.
+        """
+        stats = self.new_stats("compress", stats)
+        if self.dictionary is not None:
+            self._compress_with_dictionary(bin_in, bin_out, self.dictionary, stats)
+            return stats
+        if not bin_in.seekable():
+            with self._spool(bin_in) as spooled:
+                return self.compress_stream(spooled, bin_out, stats)
+        if self.order == 1:
+            self._compress_order1(bin_in, bin_out, stats)
+            return stats
+
+        with stats.stage("count"):
+            freq_list = self._count_frequencies(bin_in)
+        if not freq_list:
+            return stats
+        with stats.stage("tree"):
+            code_lengths = self._code_lengths(freq_list)
+        with stats.stage("codes"):
+            codes = canonical_codes(code_lengths)
+            padding_len = self._padding_len(freq_list, codes)
+        self._count_codes(stats, code_lengths)
+
+        stats.write(bin_out, self._create_header(code_lengths, padding_len))
+        self._encode_data(self._read_chunks(bin_in), codes, bin_out, stats)
+        return stats
+
+    def _count_codes(self, stats: CompressionStats, code_lengths: dict[int, int]) -> None:
+        """Records the number of bytes with a code and the longest code in stats."""
+        stats.set_max("distinct_symbols", len(code_lengths))
+        stats.set_max("max_code_len", max(code_lengths.values(), default=0))
 
     @override
-    def compress(self, text_in: TextIO, bin_out: BinaryIO) -> None:
-        try:
-            freq_list = self._count_frequencies(text_in)
-            tree = HuffmanTreeNode.build_huffman_tree(freq_list)
-            if tree is None:
-                return
-            codes = tree.get_codes()
-            encoded_text = self._encode_text(text_in, codes)
-            self._write(tree, encoded_text, bin_out)
-
-        except UnicodeDecodeError as e:
-            raise CompressionMethodError(
-                f"Invalid file format. Must be {e.encoding} encoded."
-            ) from e
+    def decompress_stream(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats | None = None
+    ) -> CompressionStats:
+        """Decompresses the compressed binary input and writes the result to bin_out.
+
+        Args:
+            bin_in (BinaryIO): The binary input containing compressed data.
+            bin_out (BinaryIO): The binary output to write the decompressed data.
+            stats (CompressionStats | None, optional): Where to record the measurements.
+            Defaults to None, i.e. new ones.
+
+        Returns:
+            CompressionStats: The measurements of the call.
+        """
+        stats = self.new_stats("decompress", stats)
+        self.decompress_cached(bin_in, bin_out, {}, stats)
+        return stats
 
     @override
-    def decompress(self, bin_in: BinaryIO, text_out: TextIO) -> None:
-        padding_len, tree_len = self._read_headers(bin_in)
-        tree_bytes = bytearray(bin_in.read(tree_len))
-        encoded_text_bytes = bin_in.read()
-        encoded_text_bits = bitarray()
-        encoded_text_bits.frombytes(encoded_text_bytes)
-
-        # Remove padding
-        if padding_len > 0:
-            encoded_text_bits = encoded_text_bits[:-padding_len]
-        decoded_text = self._decode(tree_bytes, encoded_text_bits)
-        text_out.write(decoded_text)
+    def decompress_cached(
+        self,
+        bin_in: BinaryIO,
+        bin_out: BinaryIO,
+        cache: dict[Hashable, Any],
+        stats: CompressionStats,
+    ) -> None:
+        """Decompresses like `decompress_stream`. With a dictionary, the decode tree of
+        the dictionary's codes is kept in cache."""
+        bin_in = cast(BinaryIO, CountingReader(bin_in, stats))
+        data_format = bin_in.read(1)
+        if data_format == bytes([self._ORDER1_FORMAT]):
+            self._decompress_order1(bin_in, bin_out, stats)
+            return
+
+        with stats.stage("header"):
+            padding_len, codes = self._read_headers(bin_in, data_format)
+        with stats.stage("codes"):
+            if data_format == bytes([self._DICTIONARY_FORMAT]):
+                assert self.dictionary is not None
+                cache_key = ("huffman_decoder", self.dictionary.dict_id)
+                if cache_key not in cache:
+                    cache[cache_key] = self._decoder(codes)
+                decoder, code_lens = cache[cache_key]
+            else:
+                decoder, code_lens = self._decoder(codes)
+        self._count_codes(stats, code_lens)
+        remaining = bitarray()
+
+        # Read one chunk ahead, so that the padding can be removed from the last chunk.
+        encoded_text_bytes = bin_in.read(self._CHUNK_SIZE)
+        while encoded_text_bytes:
+            next_encoded_text_bytes = bin_in.read(self._CHUNK_SIZE)
+
+            with stats.stage("decode"):
+                encoded_text_bits = remaining
+                encoded_text_bits.frombytes(encoded_text_bytes)
+
+                # Remove padding
+                if not next_encoded_text_bytes and padding_len > 0:
+                    del encoded_text_bits[-padding_len:]
+
+                decoded_data, remaining = self._decode_data(
+                    encoded_text_bits, decoder, code_lens
+                )
+            stats.write(bin_out, decoded_data)
+            stats.add_count("symbols", len(decoded_data))
+
+            encoded_text_bytes = next_encoded_text_bytes
+
+        if remaining:
+            raise CompressionMethodError("Invalid encoded text: incomplete last code")
+
+    def _decoder(
+        self, codes: dict[int, bitarray]
+    ) -> tuple[decodetree, dict[int, int]]:
+        """Returns the decode tree of the codes and the code length of each byte."""
+        return decodetree(codes), {c: len(code) for c, code in codes.items()}
+
+    def _compress_with_dictionary(
+        self,
+        bin_in: BinaryIO,
+        bin_out: BinaryIO,
+        dictionary: HuffmanDictionary,
+        stats: CompressionStats,
+    ) -> None:
+        """Compresses the input with the codes of a dictionary.
+
+        The frequencies are not needed, so the input is read only once. As the padding
+        length is only known once all data has been encoded, a placeholder is written
+        and filled in at the end. If bin_out is not seekable, e.g. a pipe, the output is
+        buffered like non-seekable input in `_spool`, and copied to bin_out at the end.
+        """
+        first_chunk = bin_in.read(self._CHUNK_SIZE)
+        if not first_chunk:
+            return
+        chunks = chain([first_chunk], self._read_chunks(bin_in))
+        self._count_codes(stats, dictionary.code_lengths)
+
+        if not bin_out.seekable():
+            with self._spool_file() as spooled:
+                self._encode_with_dictionary(chunks, spooled, dictionary, stats)
+                spooled.seek(0)
+                with stats.stage("write"):
+                    copyfileobj(spooled, bin_out, self._CHUNK_SIZE)
+            return
+        self._encode_with_dictionary(chunks, bin_out, dictionary, stats)
+
+    def _encode_with_dictionary(
+        self,
+        chunks: Iterable[bytes],
+        bin_out: BinaryIO,
+        dictionary: HuffmanDictionary,
+        stats: CompressionStats,
+    ) -> None:
+        """Writes the header and the encoded data of `_compress_with_dictionary` to
+        seekable bin_out."""
+        header_pos = bin_out.tell()
+        stats.write(bin_out, bytes([self._DICTIONARY_FORMAT, 0]))
+        stats.write(
+            bin_out, dictionary.dict_id.to_bytes(self._DICT_ID_SIZE, byteorder="big")
+        )
+        encoded_len = self._encode_data(chunks, dictionary.codes, bin_out, stats)
+
+        end_pos = bin_out.tell()
+        bin_out.seek(header_pos + 1)
+        bin_out.write(bytes([(8 - encoded_len % 8) % 8]))
+        bin_out.seek(end_pos)
+
+    def _compress_order1(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats
+    ) -> None:
+        """Compresses the input with the order 1 context model."""
+        with stats.stage("count"):
+            context_freqs = self._count_context_frequencies(bin_in)
+        if not context_freqs:
+            return
+
+        max_code_len = self.max_code_len or self._ORDER1_MAX_CODE_LEN
+        with stats.stage("tree"):
+            shared_lengths, context_lengths, encoded_len = select_context_tables(
+                context_freqs, max_code_len
+            )
+        logger.debug(
+            "Order 1: %s contexts, %s with their own table",
+            len(context_freqs),
+            len(context_lengths),
+        )
+
+        self._count_context_codes(stats, shared_lengths, context_lengths)
+
+        # The contexts using the shared table are coded as the first of them
+        shared_context = next(
+            (c for c in range(SYMBOL_COUNT) if c not in context_lengths), 0
+        )
+        tables = bytes(
+            c if c in context_lengths else shared_context for c in range(SYMBOL_COUNT)
+        )
+        pair_codes: dict[int, bitarray] = {}
+        with stats.stage("codes"):
+            for context, lengths in [
+                (shared_context, shared_lengths),
+                *context_lengths.items(),
+            ]:
+                for c, code in canonical_codes(lengths).items():
+                    pair_codes[context << 8 | c] = code
+
+        padding_len = (8 - encoded_len % 8) % 8
+        stats.write(bin_out, bytes([self._ORDER1_FORMAT, padding_len, max_code_len]))
+        stats.write(bin_out, context_tables_to_bytes(shared_lengths, context_lengths))
+        self._encode_context_data(bin_in, tables, pair_codes, bin_out, stats)
+
+    def _count_context_codes(
+        self,
+        stats: CompressionStats,
+        shared_lengths: dict[int, int],
+        context_lengths: dict[int, dict[int, int]],
+    ) -> None:
+        """Records the number of bytes with a code in the shared table, the longest code
+        of all the tables and the number of contexts with their own table in stats."""
+        self._count_codes(stats, shared_lengths)
+        for lengths in context_lengths.values():
+            stats.set_max("max_code_len", max(lengths.values()))
+        stats.set_max("context_tables", len(context_lengths))
+
+    def _decompress_order1(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats
+    ) -> None:
+        """Decompresses input compressed with the order 1 context model, positioned
+        after the format byte.
+
+        Each code is decoded with a lookup table of the context, indexed by the next
+        `width` bits. The bits are kept in an integer, which is refilled a few bytes at
+        a time.
+        """
+        with stats.stage("header"):
+            padding_len = self._read_padding_len(bin_in)
+            max_code_len = self._read_max_code_len(bin_in, self._ORDER1_MAX_CODE_LEN)
+            shared_lengths, context_lengths = read_context_tables(bin_in)
+            all_lengths = [shared_lengths, *context_lengths.values()]
+            for lengths in all_lengths:
+                self._check_max_code_len(lengths, max_code_len)
+        self._count_context_codes(stats, shared_lengths, context_lengths)
+
+        with stats.stage("codes"):
+            width = max(max(lengths.values()) for lengths in all_lengths)
+            shared_table = decode_table(shared_lengths, width)
+            tables = [shared_table] * SYMBOL_COUNT
+            for context, lengths in context_lengths.items():
+                tables[context] = decode_table(lengths, width)
+
+        mask = (1 << width) - 1
+        bits = 0  # Bits not yet decoded, the next bit being the highest
+        bits_len = 0
+        prev = 0
+
+        # Read one chunk ahead, so that the padding can be removed from the last chunk.
+        data = bin_in.read(self._CHUNK_SIZE)
+        while data:
+            next_data = bin_in.read(self._CHUNK_SIZE)
+            output = bytearray()
+
+            with stats.stage("decode"):
+                for pos in range(0, len(data), self._REFILL_SIZE):
+                    refill = data[pos : pos + self._REFILL_SIZE]
+                    bits = bits << 8 * len(refill) | int.from_bytes(refill, "big")
+                    bits_len += 8 * len(refill)
+                    if not next_data and pos + self._REFILL_SIZE >= len(data):
+                        bits >>= padding_len
+                        bits_len -= padding_len
+
+                    # Each table entry's code is at most width bits, so no bounds check
+                    while bits_len >= width:
+                        entry = tables[prev][bits >> (bits_len - width) & mask]
+                        if not entry:
+                            raise CompressionMethodError(
+                                "Invalid encoded text: invalid code"
+                            )
+                        bits_len -= entry & 0x3F
+                        prev = entry >> 6
+                        output.append(prev)
+                    bits &= (1 << bits_len) - 1
+
+                # Last codes, fewer bits left than the table width
+                while not next_data and bits_len > 0:
+                    entry = tables[prev][bits << (width - bits_len) & mask]
+                    if not entry or entry & 0x3F > bits_len:
+                        raise CompressionMethodError("Invalid encoded text: invalid code")
+                    bits_len -= entry & 0x3F
+                    bits &= (1 << bits_len) - 1
+                    prev = entry >> 6
+                    output.append(prev)
+
+            stats.write(bin_out, output)
+            stats.add_count("symbols", len(output))
+            data = next_data
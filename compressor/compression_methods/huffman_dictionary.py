@@ -0,0 +1,128 @@
+"""Static Huffman dictionaries, i.e. Huffman codes trained from sample data and shared by
+many compressed files.
+
+Small files compress poorly with their own codes, as the code length table takes a notable
+part of the output. Files compressed with a dictionary store only the dictionary's id
+instead, and compression skips counting the frequencies and building the codes.
+
+Dictionary file layout:
+    magic (4 bytes) | format version (1 byte)
+    code length table, see `canonical_huffman`
+
+The id of a dictionary is the CRC-32 of its code length table.
+"""
+
+from collections import Counter
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable
+from zlib import crc32
+
+from bitarray import bitarray
+
+from .canonical_huffman import (
+    SYMBOL_COUNT,
+    canonical_codes,
+    code_lengths_to_bytes,
+    limited_code_lengths,
+    read_code_lengths,
+)
+from .interface import CompressionMethodError
+
+MAGIC = b"CMPD"
+VERSION = 1
+
+_HEADER_SIZE = len(MAGIC) + 1
+
+
+class HuffmanDictionary:
+    """Huffman codes for all 256 byte values, trained from sample data.
+
+    Attributes:
+        code_lengths (dict[int, int]): Code length of each byte.
+        codes (dict[int, bitarray]): Canonical code of each byte.
+        dict_id (int): Id stored in the files compressed with the dictionary, 4 bytes.
+    """
+
+    # Bytes missing from the samples get long codes, which the limit keeps in check
+    DEFAULT_MAX_CODE_LEN = 15
+
+    def __init__(self, code_lengths: dict[int, int]) -> None:
+        """
+        Args:
+            code_lengths (dict[int, int]): Code length of each byte. Bytes without a
+            code cannot be compressed with the dictionary.
+        """
+        self.code_lengths = code_lengths
+        self.codes: dict[int, bitarray] = canonical_codes(code_lengths)
+        self.dict_id = crc32(code_lengths_to_bytes(code_lengths))
+
+    def __repr__(self) -> str:
+        return f"HuffmanDictionary(dict_id={self.dict_id:08x})"
+
+    @staticmethod
+    def train(
+        samples: Iterable[bytes], max_code_len: int = DEFAULT_MAX_CODE_LEN
+    ) -> "HuffmanDictionary":
+        """Trains a dictionary from sample data, e.g. typical files to be compressed.
+
+        Every byte value gets a code, also the ones missing from the samples, so any
+        data can be compressed with the dictionary.
+
+        Args:
+            samples (Iterable[bytes]): The sample data.
+            max_code_len (int, optional): Maximum code length in bits, 8-32.
+            Defaults to 15.
+
+        Raises:
+            ValueError: If max_code_len is not between 8 and 32.
+
+        Returns:
+            HuffmanDictionary: The trained dictionary.
+        """
+        if not 8 <= max_code_len <= 32:
+            raise ValueError("Max code length must be between 8 and 32")
+
+        frequencies = Counter(range(SYMBOL_COUNT))
+        for sample in samples:
+            frequencies.update(sample)
+
+        return HuffmanDictionary(limited_code_lengths(frequencies, max_code_len))
+
+    def to_bytes(self) -> bytes:
+        """Serializes the dictionary into the dictionary file format."""
+        return MAGIC + bytes([VERSION]) + code_lengths_to_bytes(self.code_lengths)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "HuffmanDictionary":
+        """Reads a dictionary serialized with `to_bytes`.
+
+        Raises:
+            CompressionMethodError: If the data is not a valid dictionary.
+        """
+        if data[: len(MAGIC)] != MAGIC:
+            raise CompressionMethodError("Not a Huffman dictionary: invalid header")
+        if data[len(MAGIC) : _HEADER_SIZE] != bytes([VERSION]):
+            raise CompressionMethodError(
+                "Unsupported Huffman dictionary version: "
+                + data[len(MAGIC) : _HEADER_SIZE].hex()
+            )
+
+        table = BytesIO(data[_HEADER_SIZE:])
+        code_lengths = read_code_lengths(table)
+        if table.read(1):
+            raise CompressionMethodError("Invalid Huffman dictionary: trailing data")
+        return HuffmanDictionary(code_lengths)
+
+    def save(self, path: Path) -> None:
+        """Writes the dictionary to a file."""
+        path.write_bytes(self.to_bytes())
+
+    @staticmethod
+    def load(path: Path) -> "HuffmanDictionary":
+        """Reads a dictionary from a file written by `save`.
+
+        Raises:
+            CompressionMethodError: If the file is not a valid dictionary.
+        """
+        return HuffmanDictionary.from_bytes(path.read_bytes())
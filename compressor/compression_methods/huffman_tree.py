@@ -1,6 +1,8 @@
+from array import array
 from heapq import heappop, heappush
 from typing import override, Literal
 from bitarray import bitarray
+from bitarray.util import int2ba
 
 from .interface import CompressionMethodError
 
@@ -9,15 +11,18 @@ from ..utils.logging import get_logger
 logger = get_logger(__name__)
 
 
-# Note: for a more efficient implementation, should just skip this
-# abstract representation of a Huffman tree and build the tree
-# direclty as bytes. But this is maybe more verbose/explicit, maybe
-# readable, though it is a lot longer.
-# Could perhaps implement separately a "FastHuffman" CompressionMethod.
+# Note: this abstract representation of a Huffman tree is maybe more
+# verbose/explicit, maybe readable, though it is a lot longer. `Huffman`
+# uses the compact `FlatHuffmanTree` below instead, which skips the node
+# objects.
 class HuffmanTreeNode:
-    """Represents a node in a huffman tree"""
+    """Represents a node in a huffman tree
 
-    TREE_TEXT_ENCODING: Literal["ascii"] = "ascii"
+    The chars of the tree are byte values, each represented by the char with the same
+    code point (0-255). This way each char takes a single byte in the tree's byte format.
+    """
+
+    TREE_TEXT_ENCODING: Literal["latin-1"] = "latin-1"
 
     def __init__(
         self,
@@ -64,7 +69,7 @@ class HuffmanTreeNode:
         if len(self.code) == 0 and self.left is None and self.right is None:
             self.code = bitarray([1])
 
-    # Byte representation currently implemented by just using unicode chars.
+    # Byte representation currently implemented by just using the chars as bytes.
     # Could be more efficient with just bits, but in large files the tree's
     # size is often insignificant.
     def to_bytes(self) -> bytearray:
@@ -113,29 +118,29 @@ class HuffmanTreeNode:
             if the tree does not exist.
         """
 
-        def reconstruct_tree(
-            tree_bytes: bytearray,
-        ) -> tuple[HuffmanTreeNode | None, bytearray]:
-            if not tree_bytes:
-                return None, tree_bytes
+        # Positions are passed around instead of slicing off the bytes read,
+        # so that the bytes are not copied at every node.
+        def reconstruct_tree(pos: int) -> tuple[HuffmanTreeNode | None, int]:
+            if pos >= len(tree_bytes):
+                return None, pos
 
             cur_char = str(
-                tree_bytes[0].to_bytes(), encoding=HuffmanTreeNode.TREE_TEXT_ENCODING
+                tree_bytes[pos].to_bytes(), encoding=HuffmanTreeNode.TREE_TEXT_ENCODING
             )
 
             if cur_char == "1":
                 next_char = str(
-                    tree_bytes[1].to_bytes(),
+                    tree_bytes[pos + 1].to_bytes(),
                     encoding=HuffmanTreeNode.TREE_TEXT_ENCODING,
                 )
-                return HuffmanTreeNode(next_char, 0), tree_bytes[2:]
+                return HuffmanTreeNode(next_char, 0), pos + 2
 
-            left, tree_bytes = reconstruct_tree(tree_bytes[1:])
-            right, tree_bytes = reconstruct_tree(tree_bytes)
-            return HuffmanTreeNode("", 0, left, right), tree_bytes
+            left, pos = reconstruct_tree(pos + 1)
+            right, pos = reconstruct_tree(pos)
+            return HuffmanTreeNode("", 0, left, right), pos
 
         try:
-            tree, _remaining = reconstruct_tree(tree_bytes)
+            tree, _pos = reconstruct_tree(0)
         except UnicodeDecodeError as e:
             raise CompressionMethodError(
                 f"Error reading Huffman tree: invalid format, should be {e.encoding}"
@@ -223,3 +228,175 @@ class HuffmanTreeNode:
             output += "\n" + self.right.__str__(indent)
 
         return output
+
+
+class FlatHuffmanTree:
+    """A Huffman tree stored in parallel arrays instead of `HuffmanTreeNode` objects.
+
+    Node i is a leaf with the byte `symbol[i]`, or an internal node with the children
+    `left[i]` and `right[i]`; the missing fields are -1. `parent[i]` is -1 for the root.
+    Children always come before their parent, so the root is the last node, and the
+    nodes can be coded from the root down by going through them backwards.
+
+    The byte format is the same as of `HuffmanTreeNode.to_bytes`: the nodes in preorder,
+    a leaf as "1" followed by its byte, an internal node as "0".
+    """
+
+    _LEAF = ord("1")
+    _INTERNAL = ord("0")
+    # A leaf per byte value at most, which also keeps the node indices within the
+    # 16-bit arrays
+    _MAX_LEAVES = 256
+
+    def __init__(self) -> None:
+        self.left = array("h")
+        self.right = array("h")
+        self.symbol = array("h")
+        self.parent = array("h")
+        self.freq = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def _add_node(self, symbol: int, freq: int, left: int = -1, right: int = -1) -> int:
+        node = len(self.symbol)
+        self.left.append(left)
+        self.right.append(right)
+        self.symbol.append(symbol)
+        self.parent.append(-1)
+        self.freq.append(freq)
+        if left >= 0:
+            self.parent[left] = self.parent[right] = node
+        return node
+
+    @staticmethod
+    def build(freq_list: list[tuple[int, str]]) -> "FlatHuffmanTree | None":
+        """Builds a Huffman tree from byte frequencies in linear time.
+
+        As the frequencies are sorted, the tree is built with two queues instead of a
+        heap: the leaves in ascending order of frequency, and the internal nodes, which
+        are created in ascending order of frequency too. The two smallest nodes are
+        always at the front of the queues.
+
+        Args:
+            freq_list (list[tuple[int, str]]): Tuples of a frequency and a byte as a
+            char, in descending order of frequency, like from
+            `Huffman._count_frequencies`.
+
+        Returns:
+            FlatHuffmanTree | None: The tree, or None if freq_list is empty.
+        """
+        if not freq_list:
+            return None
+
+        tree = FlatHuffmanTree()
+        for freq, char in reversed(freq_list):
+            tree._add_node(ord(char), freq)
+
+        leaf_count = len(freq_list)
+        next_leaf = 0
+        next_internal = leaf_count
+
+        def pop_smallest() -> int:
+            nonlocal next_leaf, next_internal
+            # Ties go to the leaves, which keeps the longest code shorter
+            if next_leaf < leaf_count and (
+                next_internal == len(tree)
+                or tree.freq[next_leaf] <= tree.freq[next_internal]
+            ):
+                next_leaf += 1
+                return next_leaf - 1
+            next_internal += 1
+            return next_internal - 1
+
+        for _ in range(leaf_count - 1):
+            left = pop_smallest()
+            right = pop_smallest()
+            tree._add_node(-1, tree.freq[left] + tree.freq[right], left, right)
+
+        return tree
+
+    @staticmethod
+    def from_bytes(tree_bytes: bytes | bytearray) -> "FlatHuffmanTree":
+        """Reads a tree in the byte format of `HuffmanTreeNode.to_bytes`. Bytes after the
+        tree are ignored.
+
+        Raises:
+            CompressionMethodError: If the tree is truncated or has more leaves than
+            there are byte values.
+        """
+        tree = FlatHuffmanTree()
+        # Children read so far of each internal node whose subtree is not complete
+        pending: list[list[int]] = []
+        leaf_count = 0
+        pos = 0
+        while True:
+            if pos >= len(tree_bytes) or (
+                tree_bytes[pos] == FlatHuffmanTree._LEAF and pos + 1 >= len(tree_bytes)
+            ):
+                raise CompressionMethodError("Invalid header: Huffman tree is truncated.")
+            if tree_bytes[pos] != FlatHuffmanTree._LEAF:
+                pending.append([])
+                pos += 1
+                continue
+
+            leaf_count += 1
+            if leaf_count > FlatHuffmanTree._MAX_LEAVES:
+                raise CompressionMethodError(
+                    "Invalid header: Huffman tree has too many leaves."
+                )
+            node = tree._add_node(tree_bytes[pos + 1], 0)
+            pos += 2
+            # Complete the internal nodes whose right subtree this node completed
+            while pending and len(pending[-1]) == 1:
+                (left,) = pending.pop()
+                node = tree._add_node(-1, 0, left, node)
+            if not pending:
+                return tree
+            pending[-1].append(node)
+
+    def to_bytes(self) -> bytearray:
+        """Serializes the tree into the byte format of `HuffmanTreeNode.to_bytes`."""
+        result = bytearray()
+        stack = [len(self) - 1]
+        while stack:
+            node = stack.pop()
+            if self.symbol[node] >= 0:
+                result += bytes([self._LEAF, self.symbol[node]])
+            else:
+                result.append(self._INTERNAL)
+                stack += (self.right[node], self.left[node])
+        return result
+
+    def _codes(self) -> tuple[list[int], list[int]]:
+        """Computes the code of every node as an integer, and its length, going from
+        the root down. The left child appends a 0 to the code, the right child a 1."""
+        codes = [0] * len(self)
+        lengths = [0] * len(self)
+        for node in range(len(self) - 2, -1, -1):
+            parent = self.parent[node]
+            codes[node] = codes[parent] << 1 | (self.right[parent] == node)
+            lengths[node] = lengths[parent] + 1
+        return codes, lengths
+
+    def code_lengths(self) -> dict[int, int]:
+        """Returns the code length of each byte. A tree of a single leaf gets a code of
+        one bit."""
+        _codes, lengths = self._codes()
+        return {
+            self.symbol[node]: lengths[node] or 1
+            for node in range(len(self))
+            if self.symbol[node] >= 0
+        }
+
+    def codes(self) -> dict[int, bitarray]:
+        """Returns the code of each byte. A tree of a single leaf gets the code 1, like
+        with `HuffmanTreeNode.get_codes`."""
+        if len(self) == 1:
+            return {self.symbol[0]: bitarray("1")}
+        codes, lengths = self._codes()
+        return {
+            self.symbol[node]: int2ba(codes[node], lengths[node])
+            for node in range(len(self))
+            if self.symbol[node] >= 0
+        }
@@ -1,5 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import TextIO, BinaryIO
+from codecs import getincrementaldecoder
+from collections.abc import Hashable
+from io import BytesIO, RawIOBase, UnsupportedOperation
+from typing import Any, TextIO, BinaryIO, cast, override
+
+from .stats import CompressionStats, Operation
 
 
 class CompressionMethodError(Exception):
@@ -7,28 +12,374 @@ class CompressionMethodError(Exception):
 
 
 class CompressionMethod(ABC):
-    """ABC defining an interface for different text compression methods."""
+    """ABC defining an interface for different compression methods.
+
+    Methods compress bytes, i.e. data over an alphabet of the 256 byte values, so any
+    binary data can be compressed. Text is compressed as its UTF-8 encoding.
+    """
+
+    # Whether the method can compress data fed to it a piece at a time, see `compressobj`.
+    # Methods making multiple passes over their input cannot.
+    incremental = False
 
     @abstractmethod
-    def compress(self, text_in: TextIO, bin_out: BinaryIO) -> None:
-        """Compresses text from text_in into bin_out.
+    def compress_stream(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats | None = None
+    ) -> CompressionStats:
+        """Compresses bytes from bin_in into bin_out.
 
         Args:
-            text_in (TextIO): TextIO object from which compressable text data is read.
+            bin_in (BinaryIO): BinaryIO object from which the data to compress is read.
+            It does not need to be seekable, but methods making multiple passes over
+            the input buffer it if it is not.
             bin_out (BinaryIO): BinaryIO object to which compressed output is written to.
+            stats (CompressionStats | None, optional): Where to record the measurements,
+            e.g. untimed ones. Defaults to None, i.e. new timed ones.
 
         Raises:
             CompressionMethodError: Raises this error if unable to perform the compression method.
+
+        Returns:
+            CompressionStats: The measurements of the call.
         """
 
     @abstractmethod
-    def decompress(self, bin_in: BinaryIO, text_out: TextIO) -> None:
+    def decompress_stream(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats | None = None
+    ) -> CompressionStats:
+        """Decompresses compressed data from bin_in into bin_out.
+
+        Args:
+            bin_in (BinaryIO): BinaryIO object from which compressed data is read.
+            bin_out (BinaryIO): BinaryIO object to which decompressed output is written to.
+            stats (CompressionStats | None, optional): Where to record the measurements,
+            like in `compress_stream`. Defaults to None.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+
+        Returns:
+            CompressionStats: The measurements of the call.
+        """
+
+    def compress(self, text_in: TextIO, bin_out: BinaryIO) -> CompressionStats:
+        """Compresses text from text_in into bin_out, as UTF-8 encoded bytes.
+
+        Args:
+            text_in (TextIO): TextIO object from which compressable text data is read.
+            bin_out (BinaryIO): BinaryIO object to which compressed output is written to.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+
+        Returns:
+            CompressionStats: The measurements of the call, see `compress_stream`.
+        """
+        return self.compress_stream(cast(BinaryIO, _EncodedTextReader(text_in)), bin_out)
+
+    def decompress(self, bin_in: BinaryIO, text_out: TextIO) -> CompressionStats:
         """Compresses compressed text from bin_in into text_out.
 
         Args:
             bin_in (BinaryIO): BinaryIO object from which compressed data is read.
             text_out (TextIO): TextIO object to which decompressed text output is written to.
 
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression
+            method, or if the decompressed data is not UTF-8 text.
+
+        Returns:
+            CompressionStats: The measurements of the call, see `decompress_stream`.
+        """
+        writer = _DecodedTextWriter(text_out)
+        stats = self.decompress_stream(bin_in, cast(BinaryIO, writer))
+        writer.finish()
+        return stats
+
+    def compress_bytes(self, data: bytes) -> bytes:
+        """Compresses data in memory. The stages are not timed, as the measurements are
+        not returned.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+        bin_out = BytesIO()
+        self.compress_stream(BytesIO(data), bin_out, self.untimed_stats("compress"))
+        return bin_out.getvalue()
+
+    def decompress_bytes(self, data: bytes) -> bytes:
+        """Decompresses data in memory, like `compress_bytes`.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+        bin_out = BytesIO()
+        self.decompress_stream(BytesIO(data), bin_out, self.untimed_stats("decompress"))
+        return bin_out.getvalue()
+
+    def new_stats(
+        self, operation: Operation, stats: CompressionStats | None
+    ) -> CompressionStats:
+        """Returns stats if given, or new timed stats for this method."""
+        if stats is not None:
+            return stats
+        return CompressionStats(type(self).__name__, operation)
+
+    def untimed_stats(self, operation: Operation) -> CompressionStats:
+        """Returns new stats for this method, not timing the stages."""
+        return CompressionStats(type(self).__name__, operation, timed=False)
+
+    def compressor(self) -> "Compressor":
+        """Returns an object for compressing many independent inputs with this method,
+        reusing tables across calls, see `Compressor`."""
+        return Compressor(self)
+
+    def decompressor(self) -> "Decompressor":
+        """Returns an object for decompressing many independent inputs with this method,
+        reusing tables across calls, see `Decompressor`."""
+        return Decompressor(self)
+
+    def compressobj(self) -> "CompressObj":
+        """Returns an object compressing data fed to it a piece at a time into a single
+        stream, in the same format as `compress_stream`. See `compressor.streaming` for
+        methods that are not incremental.
+
+        Raises:
+            CompressionMethodError: If the method cannot compress incrementally.
+        """
+        raise CompressionMethodError(
+            f"{type(self).__name__} cannot compress incrementally, use block mode"
+        )
+
+    def decompressobj(self) -> "DecompressObj":
+        """Returns an object decompressing a stream fed to it a piece at a time.
+
+        Raises:
+            CompressionMethodError: If the method cannot decompress incrementally.
+        """
+        raise CompressionMethodError(
+            f"{type(self).__name__} cannot decompress incrementally, use block mode"
+        )
+
+    def compress_cached(
+        self,
+        bin_in: BinaryIO,
+        bin_out: BinaryIO,
+        cache: dict[Hashable, Any],
+        stats: CompressionStats,
+    ) -> None:
+        """Like `compress_stream`, but tables that do not depend on the input may be
+        kept in cache for the next call, see `Compressor`. Overridden by methods
+        with such tables."""
+        del cache  # No tables to keep
+        self.compress_stream(bin_in, bin_out, stats)
+
+    def decompress_cached(
+        self,
+        bin_in: BinaryIO,
+        bin_out: BinaryIO,
+        cache: dict[Hashable, Any],
+        stats: CompressionStats,
+    ) -> None:
+        """Like `decompress_stream`, but tables that do not depend on the input may be
+        kept in cache for the next call, see `Decompressor`. Overridden by methods
+        with such tables."""
+        del cache  # No tables to keep
+        self.decompress_stream(bin_in, bin_out, stats)
+
+
+class Compressor:
+    """Compresses many independent inputs, e.g. messages, with the same method.
+
+    Setup that does not depend on the input, like allocating the dictionaries and
+    lookup tables of the method, is done once and reused across calls, so compressing
+    many small inputs does not pay it every time. Each call produces the same output as
+    `CompressionMethod.compress_bytes`. Not thread-safe, use one object per thread.
+    """
+
+    def __init__(self, method: CompressionMethod) -> None:
+        self.method = method
+        self._cache: dict[Hashable, Any] = {}
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a complete input.
+
         Raises:
             CompressionMethodError: Raises this error if unable to perform the compression method.
         """
+        bin_out = BytesIO()
+        self.method.compress_cached(
+            BytesIO(data), bin_out, self._cache, self.method.untimed_stats("compress")
+        )
+        return bin_out.getvalue()
+
+    def reset(self) -> None:
+        """Frees the tables kept between calls, returning to the initial state.
+        They are rebuilt by the next call."""
+        self._cache.clear()
+
+
+class Decompressor:
+    """Decompresses many independent inputs with the same method, reusing tables
+    across calls like `Compressor`. Not thread-safe, use one object per thread."""
+
+    def __init__(self, method: CompressionMethod) -> None:
+        self.method = method
+        self._cache: dict[Hashable, Any] = {}
+
+    def decompress(self, data: bytes) -> bytes:
+        """Decompresses a complete compressed input.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+        bin_out = BytesIO()
+        self.method.decompress_cached(
+            BytesIO(data), bin_out, self._cache, self.method.untimed_stats("decompress")
+        )
+        return bin_out.getvalue()
+
+    def reset(self) -> None:
+        """Frees the tables kept between calls, returning to the initial state.
+        They are rebuilt by the next call."""
+        self._cache.clear()
+
+
+class CompressObj(ABC):
+    """Compresses data fed to it a piece at a time, like `zlib.compressobj`, e.g. data
+    received from a socket in arbitrary fragments. Not thread-safe."""
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a piece of data. Returns the compressed data completed so far,
+        the rest is held back until later calls or `flush`.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+
+    @abstractmethod
+    def flush(self) -> bytes:
+        """Finishes the stream, returning the rest of the compressed data.
+        No more data can be compressed afterwards.
+
+        Raises:
+            CompressionMethodError: Raises this error if unable to perform the compression method.
+        """
+
+
+class DecompressObj(ABC):
+    """Decompresses a stream fed to it a piece at a time, like `zlib.decompressobj`.
+    Not thread-safe."""
+
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        """Decompresses a piece of the compressed stream. Returns the data decoded so
+        far, which may be empty if the piece does not complete anything.
+
+        Raises:
+            CompressionMethodError: If the compressed data is invalid.
+        """
+
+    @abstractmethod
+    def flush(self) -> bytes:
+        """Finishes the stream, returning the rest of the data, and checks that the
+        stream was complete. No more data can be decompressed afterwards.
+
+        Raises:
+            CompressionMethodError: If the compressed data is invalid or truncated.
+        """
+
+
+_TEXT_ENCODING = "utf-8"
+_TEXT_CHUNK_SIZE = 64 * 1024  # Chars read from text input at a time
+
+
+class _EncodedTextReader(RawIOBase):
+    """Reads a text stream as UTF-8 encoded bytes, a chunk at a time.
+
+    Seeking is supported only back to the start of the text or to the current position,
+    which is enough for methods making multiple passes over their input, and only if the
+    text stream itself is seekable. Other methods buffer non-seekable input themselves.
+    """
+
+    def __init__(self, text_in: TextIO) -> None:
+        self._text_in = text_in
+        self._seekable = text_in.seekable()
+        self._start = text_in.tell() if self._seekable else 0
+        self._pending = b""
+        self._pos = 0
+
+    @override
+    def readable(self) -> bool:
+        return True
+
+    @override
+    def seekable(self) -> bool:
+        return self._seekable
+
+    @override
+    def readinto(self, buffer: bytearray | memoryview) -> int:  # type: ignore[override]
+        try:
+            while len(self._pending) < len(buffer):
+                chunk = self._text_in.read(_TEXT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._pending += chunk.encode(_TEXT_ENCODING)
+        except UnicodeDecodeError as e:
+            raise CompressionMethodError(
+                f"Invalid file format. Must be {e.encoding} encoded."
+            ) from e
+
+        read_len = min(len(buffer), len(self._pending))
+        buffer[:read_len] = self._pending[:read_len]
+        self._pending = self._pending[read_len:]
+        self._pos += read_len
+        return read_len
+
+    @override
+    def tell(self) -> int:
+        return self._pos
+
+    @override
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if not self._seekable:
+            raise UnsupportedOperation("seek")
+        if whence != 0 or offset not in (0, self._pos):
+            raise UnsupportedOperation("Encoded text can only be rewound to the start")
+
+        if offset == 0:
+            self._text_in.seek(self._start)
+            self._pending = b""
+            self._pos = 0
+        return self._pos
+
+
+class _DecodedTextWriter(RawIOBase):
+    """Writes UTF-8 encoded bytes to a text stream as text. Chars may be split across
+    writes, `finish` checks that the bytes did not end in the middle of a char."""
+
+    def __init__(self, text_out: TextIO) -> None:
+        self._text_out = text_out
+        self._decoder = getincrementaldecoder(_TEXT_ENCODING)()
+
+    @override
+    def writable(self) -> bool:
+        return True
+
+    @override
+    def write(self, data: bytes | bytearray | memoryview) -> int:  # type: ignore[override]
+        self._decode(data)
+        return len(data)
+
+    def finish(self) -> None:
+        self._decode(b"", final=True)
+
+    def _decode(self, data: bytes | bytearray | memoryview, final: bool = False) -> None:
+        try:
+            self._text_out.write(self._decoder.decode(data, final))
+        except UnicodeDecodeError as e:
+            raise CompressionMethodError(
+                f"Decompressed data is not {e.encoding} text. "
+                + "Binary data must be decompressed as bytes."
+            ) from e
@@ -1,134 +1,662 @@
-from typing import TextIO, BinaryIO, override
-from bitarray import bitarray
-
-from .interface import CompressionMethod, CompressionMethodError
+from collections.abc import Hashable
+from io import BytesIO
+from typing import Any, BinaryIO, override
+
+from .code_packing import CodePacker, CodeUnpacker
+from .interface import (
+    CompressionMethod,
+    CompressionMethodError,
+    CompressObj,
+    DecompressObj,
+)
+from .lzw_dictionary import LZWDictionary
+from .stats import CompressionStats
+
+# Fixed width mode
+_CODE_SIZE = 12  # Size in bits
+_INITIAL_DICT_SIZE = 256
+
+# Variable width mode. The header byte of a variable width file has this flag set,
+# and the max code size in the lower bits. In fixed width files the header byte is
+# the padding length, which is always less than 8.
+_VARIABLE_WIDTH_FLAG = 0x80
+_MIN_CODE_SIZE = 9
+_MAX_CODE_SIZE = 16
+_CLEAR_CODE = 256
+# Input bytes between checks of the compression ratio once the dictionary is full
+_RATIO_CHECK_SIZE = 64 * 1024
+
+# Primed dictionary. Set in the header byte of both modes, followed by the id.
+_PRIMED_FLAG = 0x40
+_DICT_ID_SIZE = 4
+
+
+def _code_sizes(variable_width: bool, max_code_size: int) -> tuple[int, int]:
+    """Returns the initial and maximum code size for the given mode."""
+    if variable_width:
+        return _MIN_CODE_SIZE, max_code_size
+    return _CODE_SIZE, _CODE_SIZE
+
+
+def _first_free_code(variable_width: bool) -> int:
+    """Returns the first code assigned to a multi-char sequence for the given mode."""
+    if variable_width:
+        return _CLEAR_CODE + 1
+    return _INITIAL_DICT_SIZE
+
+
+def _primed_size_fits(
+    dictionary: LZWDictionary, variable_width: bool, max_code_size: int
+) -> bool:
+    """Whether the dictionary leaves room for new entries in the given mode."""
+    return _first_free_code(variable_width) + len(dictionary) < 1 << max_code_size
+
+
+def _initial_code_size(dict_size: int) -> int:
+    """Returns the code size of a fresh variable width dictionary of dict_size codes."""
+    return max(_MIN_CODE_SIZE, (dict_size - 1).bit_length())
+
+
+def _read_header(
+    bin_in: BinaryIO, dictionary: LZWDictionary | None
+) -> tuple[bool, int, LZWDictionary | None]:
+    """Reads the header and returns the mode the input was compressed with.
+
+    Args:
+        bin_in (BinaryIO): The binary input containing compressed data.
+        dictionary (LZWDictionary | None): The dictionary of the method decompressing.
+
+    Raises:
+        CompressionMethodError: If the header is missing or invalid, or the input was
+        compressed with a dictionary other than the given one.
+
+    Returns:
+        tuple[bool, int, LZWDictionary | None]: Whether variable width codes are used,
+        the max code size, and the dictionary the input was primed with.
+    """
+    header = bin_in.read(1)
+    if len(header) != 1:
+        raise CompressionMethodError(
+            "Invalid input file header: missing padding length byte."
+        )
+
+    primed = None
+    if header[0] & _PRIMED_FLAG:
+        primed = _read_dictionary_id(bin_in, dictionary)
+    value = header[0] & ~(_VARIABLE_WIDTH_FLAG | _PRIMED_FLAG)
+
+    if not header[0] & _VARIABLE_WIDTH_FLAG:
+        if value >= 8:
+            raise CompressionMethodError(
+                f"Invalid input file header: bad padding length {value}."
+            )
+        return False, _CODE_SIZE, primed
+
+    if not _MIN_CODE_SIZE <= value <= _MAX_CODE_SIZE:
+        raise CompressionMethodError(
+            f"Invalid input file header: bad max code size {value}."
+        )
+    if primed is not None and not _primed_size_fits(primed, True, value):
+        raise CompressionMethodError(
+            f"Invalid input file header: dictionary does not fit in {value} bit codes."
+        )
+    return True, value, primed
+
+
+def _read_dictionary_id(
+    bin_in: BinaryIO, dictionary: LZWDictionary | None
+) -> LZWDictionary:
+    """Reads the id of the dictionary the input was primed with, which must be the
+    given dictionary."""
+    dict_id_bytes = bin_in.read(_DICT_ID_SIZE)
+    if len(dict_id_bytes) != _DICT_ID_SIZE:
+        raise CompressionMethodError(
+            "Invalid input file header: dictionary id is truncated."
+        )
+    dict_id = int.from_bytes(dict_id_bytes, byteorder="big")
+
+    if dictionary is None:
+        raise CompressionMethodError(
+            f"Compressed with LZW dictionary {dict_id:08x}, "
+            + "which is needed for decompression."
+        )
+    if dictionary.dict_id != dict_id:
+        raise CompressionMethodError(
+            f"Compressed with LZW dictionary {dict_id:08x}, "
+            + f"but dictionary {dictionary.dict_id:08x} was given."
+        )
+    return dictionary
 
 
 class LZW(CompressionMethod):
-    """Implements the LZW compression algorithm as a CompressionMethod."""
+    """Implements the LZW compression algorithm as a CompressionMethod.
 
-    _MAX_DICT_SIZE = 4096
-    _CODE_SIZE = 12  # Size in bits
-    _INITIAL_DICT_SIZE = 256
+    By default codes are a fixed 12 bits long and the dictionary is frozen once it has
+    4096 entries. In variable width mode codes start at 9 bits and grow up to
+    `max_code_size` bits as the dictionary fills, and once the dictionary is full it is
+    cleared whenever the compression ratio starts to degrade, like compress(1) does.
 
-    @override
-    def compress(self, text_in: TextIO, bin_out: BinaryIO) -> None:
-        """Compresses the input text and writes the result to binary output.
+    With an `LZWDictionary`, the dictionary starts with the dictionary's phrases in
+    addition to the single bytes, and is reset to them when cleared. The header byte has
+    the primed flag set and is followed by the dictionary id (4 bytes). The same
+    dictionary is needed for decompression.
+    """
 
+    incremental = True
+
+    _CHUNK_SIZE = 64 * 1024  # Bytes read from the input at a time
+
+    def __init__(
+        self,
+        variable_width: bool = False,
+        max_code_size: int = _MAX_CODE_SIZE,
+        dictionary: LZWDictionary | None = None,
+    ) -> None:
+        """
         Args:
-            text_in (TextIO): The text input to compress.
-            bin_out (BinaryIO): The binary output to write the compressed data.
+            variable_width (bool, optional): Whether to compress using variable width codes.
+            Defaults to False. Decompression detects the mode from the file header.
+            max_code_size (int, optional): Maximum code size in bits in variable width mode.
+            Defaults to 16.
+            dictionary (LZWDictionary | None, optional): Dictionary to prime the LZW
+            dictionary with when compressing, and to decompress files compressed with it.
+            Defaults to None.
+
+        Raises:
+            ValueError: If max_code_size is not between 9 and 16, or the dictionary does
+            not leave room for new entries with the max code size.
         """
-        data = text_in.read()
-        if not data:
-            return
-
-        # Initialize the dictionary of char sequence codes with single char ASCII
-        # Char seq -> code
-        dictionary = {chr(i): i for i in range(self._INITIAL_DICT_SIZE)}
-        cur_dict_size = self._INITIAL_DICT_SIZE
+        if not _MIN_CODE_SIZE <= max_code_size <= _MAX_CODE_SIZE:
+            raise ValueError(
+                f"Max code size must be between {_MIN_CODE_SIZE} and {_MAX_CODE_SIZE}"
+            )
 
-        cur_char_seq = ""
-        output_codes: list[int] = []
+        self.variable_width = variable_width
+        self.max_code_size = max_code_size
+        self.dictionary = dictionary
 
-        for c in data:
-            new_char_seq = cur_char_seq + c
+        if dictionary is not None:
+            _, max_size = _code_sizes(variable_width, max_code_size)
+            if not _primed_size_fits(dictionary, variable_width, max_size):
+                raise ValueError(
+                    f"Dictionary of {len(dictionary)} phrases does not fit in "
+                    + f"{max_size} bit codes"
+                )
 
-            if new_char_seq not in dictionary:
-                # Write this code to output
-                output_codes.append(dictionary[cur_char_seq])
+    @override
+    def compress_stream(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats | None = None
+    ) -> CompressionStats:
+        """Compresses the input and writes the result to binary output.
 
-                # If room in dict, add the new one, which did not yet exist
-                if cur_dict_size < self._MAX_DICT_SIZE:
-                    dictionary[new_char_seq] = cur_dict_size
-                    cur_dict_size += 1
+        The input is consumed in chunks of `_CHUNK_SIZE` bytes and the packed codes
+        are written to the output as soon as they fill whole bytes, so memory use does
+        not depend on the size of the input. Neither the input nor the output needs to
+        be seekable, so pipes work too.
 
-                # Continue with the new char only
-                cur_char_seq = c
-            else:
-                cur_char_seq += c
-
-        if cur_char_seq:
-            output_codes.append(dictionary[cur_char_seq])
+        Args:
+            bin_in (BinaryIO): The binary input to compress.
+            bin_out (BinaryIO): The binary output to write the compressed data.
+            stats (CompressionStats | None, optional): Where to record the measurements.
+            Defaults to None, i.e. new ones.
 
-        # Pack the codes into bits
-        bits = bitarray(endian="big")
-        for code in output_codes:
-            bits.extend(bin(code)[2:].zfill(self._CODE_SIZE))
+        Returns:
+            CompressionStats: The measurements of the call.
+        """
+        seekable = bin_out.seekable()
+        header_pos = bin_out.tell() if seekable else 0
+        compressobj = LZWCompressObj(self, stats)
+        stats = compressobj.stats
+        while data := bin_in.read(self._CHUNK_SIZE):
+            compressed = compressobj.compress(data)
+            with stats.stage("write"):
+                bin_out.write(compressed)
+        compressed = compressobj.flush()
+        with stats.stage("write"):
+            bin_out.write(compressed)
+
+        # Fill in the padding length of fixed width mode, now that it is known. It is
+        # not needed for decompression, so it is left 0 if the output is not seekable.
+        if compressobj.padding_len and seekable:
+            end_pos = bin_out.tell()
+            bin_out.seek(header_pos)
+            bin_out.write(bytes([compressobj.header_flags | compressobj.padding_len]))
+            bin_out.seek(end_pos)
+        return stats
 
-        # Calculate required padding
-        padding_len = (8 - (len(bits) % 8)) % 8
-        bits.extend("0" * padding_len)
+    @override
+    def compressobj(self) -> "LZWCompressObj":
+        """Returns an object compressing data fed to it a piece at a time, see
+        `LZWCompressObj`."""
+        return LZWCompressObj(self)
 
-        # Write padding header (1 byte) and the compressed data
-        bin_out.write(bytes([padding_len]))
-        bin_out.write(bits.tobytes())
+    @override
+    def decompressobj(self) -> "LZWDecompressObj":
+        """Returns an object decompressing a stream fed to it a piece at a time."""
+        return LZWDecompressObj(self, {})
 
     @override
-    def decompress(self, bin_in: BinaryIO, text_out: TextIO) -> None:
-        """Decompresses the compressed binary input and writes the text to text_out.
+    def decompress_stream(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, stats: CompressionStats | None = None
+    ) -> CompressionStats:
+        """Decompresses the compressed binary input and writes the result to bin_out.
+
+        The input is read in chunks of `_CHUNK_SIZE` bytes and the data decoded from
+        each chunk is written out before the next chunk is read.
 
         Args:
             bin_in (BinaryIO): The binary input containing compressed data.
-            text_out (TextIO): The text output to write the decompressed data.
+            bin_out (BinaryIO): The binary output to write the decompressed data.
+            stats (CompressionStats | None, optional): Where to record the measurements.
+            Defaults to None, i.e. new ones.
+
+        Returns:
+            CompressionStats: The measurements of the call.
         """
-        # Read the padding header (1 byte)
-        padding_len_byte = bin_in.read(1)
-        if len(padding_len_byte) != 1:
-            raise CompressionMethodError(
-                "Invalid input file header: missing padding length byte."
-            )
+        stats = self.new_stats("decompress", stats)
+        self.decompress_cached(bin_in, bin_out, {}, stats)
+        return stats
 
-        padding_len = padding_len_byte[0]
+    @override
+    def decompress_cached(
+        self,
+        bin_in: BinaryIO,
+        bin_out: BinaryIO,
+        cache: dict[Hashable, Any],
+        stats: CompressionStats,
+    ) -> None:
+        """Decompresses like `decompress_stream`, keeping the dictionary list in cache.
+
+        The dictionary can be reused as is: entries are only read below the current
+        dictionary size, and every slot above the initial size is written before it is
+        read, so entries left over from earlier inputs are never used.
+        """
+        decompressobj = LZWDecompressObj(self, cache, stats)
+        while compressed_data := bin_in.read(self._CHUNK_SIZE):
+            decompressed = decompressobj.decompress(compressed_data)
+            with stats.stage("write"):
+                bin_out.write(decompressed)
+        decompressed = decompressobj.flush()
+        with stats.stage("write"):
+            bin_out.write(decompressed)
+
+
+class LZWCompressObj(CompressObj):
+    """Compresses data fed to it a piece at a time into a single LZW stream.
+
+    The compression ratio is checked every `_RATIO_CHECK_SIZE` bytes of input however
+    the data is split, so the codes are the same as with `LZW.compress_stream`. Only the
+    header differs in fixed width mode: it is written before the padding length is known,
+    so it stores 0 instead. Decompression does not need the padding length.
+
+    Attributes:
+        header_flags (int): The header byte without the padding length.
+        padding_len (int): Padding length of fixed width mode, known once flushed.
+        stats (CompressionStats): The measurements of the stream so far.
+    """
+
+    def __init__(self, method: LZW, stats: CompressionStats | None = None) -> None:
+        """
+        Args:
+            method (LZW): The method to compress with.
+            stats (CompressionStats | None, optional): Where to record the measurements.
+            Defaults to None, i.e. new ones.
+        """
+        self.stats = method.new_stats("compress", stats)
+        self._variable_width = method.variable_width
+        self._code_size, max_code_size = _code_sizes(
+            method.variable_width, method.max_code_size
+        )
+        self._max_dict_size = 1 << max_code_size
+        first_free_code = _first_free_code(method.variable_width)
+
+        # Dictionary of multi-char sequences as a trie: each sequence is identified by
+        # the code of its prefix and its last char, (prefix_code << 8 | char) -> code.
+        # Single bytes are not stored, their code is the byte value itself. A primed
+        # dictionary starts with the phrases of the LZWDictionary.
+        self._primed: dict[int, int] = {}
+        self.header_flags = 0
+        header_dict_id = b""
+        if method.dictionary is not None:
+            self._primed = method.dictionary.trie(first_free_code)
+            self.header_flags = _PRIMED_FLAG
+            header_dict_id = method.dictionary.dict_id.to_bytes(_DICT_ID_SIZE, "big")
+        self._dictionary = dict(self._primed)
+        self._initial_dict_size = first_free_code + len(self._primed)
+        self._cur_dict_size = self._initial_dict_size
+        self.stats.set_max("dictionary_capacity", self._max_dict_size)
+        if self._variable_width:
+            self._code_size = _initial_code_size(self._initial_dict_size)
+            self.header_flags |= _VARIABLE_WIDTH_FLAG | max_code_size
+        # Written with the first data, so that empty input compresses to nothing
+        self._header: bytes | None = bytes([self.header_flags]) + header_dict_id
+        self.padding_len = 0
+
+        # Code of the current char sequence, or -1 if there is none
+        self._cur_code = -1
+        self._packer = CodePacker()
+        self._finished = False
+
+        # For monitoring the compression ratio once the dictionary is full
+        self._in_len = 0
+        self._out_len = 0
+        self._best_ratio = 0.0
+        self._chunk_left = _RATIO_CHECK_SIZE  # Input bytes until the next check
 
-        # Read compressed data
-        compressed_data = bin_in.read()
-        if not compressed_data:
-            return
+    @override
+    def compress(self, data: bytes) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+        if not data:
+            return b""
+
+        output: list[bytes] = []
+        if self._header is not None:
+            output.append(self._header)
+            self._header = None
+
+        stats = self.stats
+        start = 0
+        while start < len(data):
+            chunk = data[start : start + self._chunk_left]
+            with stats.stage("encode"):
+                codes = self._compress_chunk(chunk, output)
+            with stats.stage("pack"):
+                output.append(self._packer.pack(codes, self._code_size))
+            start += len(chunk)
+            self._chunk_left -= len(chunk)
+            if self._chunk_left == 0:
+                self._check_ratio(output)
+                self._chunk_left = _RATIO_CHECK_SIZE
+
+        compressed = b"".join(output)
+        stats.bytes_in += len(data)
+        stats.bytes_out += len(compressed)
+        return compressed
+
+    def _compress_chunk(self, data: bytes, output: list[bytes]) -> list[int]:
+        """Compresses a chunk of input, appending the codes packed when the code size
+        grows to output, and returning the rest of the codes, which are of the current
+        code size, to be packed."""
+        # State in locals for the loop
+        dictionary = self._dictionary
+        cur_dict_size = self._cur_dict_size
+        max_dict_size = self._max_dict_size
+        code_size = self._code_size
+        packer = self._packer
+        out_len = self._out_len
+        symbols = 0
 
-        bits = bitarray(endian="big")
-        bits.frombytes(compressed_data)
+        output_codes: list[int] = []
+        chars = iter(data)
+        cur_code = self._cur_code
+        if cur_code < 0:
+            cur_code = next(chars)
+
+        for c in chars:
+            key = cur_code << 8 | c
+            code = dictionary.get(key)
+
+            if code is None:
+                # Codes grow by a bit once the next code would no longer fit
+                if cur_dict_size > 1 << code_size:
+                    output.append(packer.pack(output_codes, code_size))
+                    out_len += len(output_codes) * code_size
+                    symbols += len(output_codes)
+                    output_codes = []
+                    code_size += 1
 
-        if padding_len > 0:
-            bits = bits[:-padding_len]
+                # Write this code to output
+                output_codes.append(cur_code)
 
-        # Extract self._CODE_SIZE -bit codes from bits
-        result_codes: list[int] = []
-        i = 0
-        total_bits = len(bits)
-        while i + self._CODE_SIZE <= total_bits:
-            code_bits = bits[i : i + self._CODE_SIZE]
-            code = int(code_bits.to01(), 2)
-            result_codes.append(code)
-            i += self._CODE_SIZE
+                # If room in dict, add the new one, which did not yet exist
+                if cur_dict_size < max_dict_size:
+                    dictionary[key] = cur_dict_size
+                    cur_dict_size += 1
 
-        if not result_codes:
+                # Continue with the new char only
+                cur_code = c
+            else:
+                cur_code = code
+
+        self._in_len += len(data)
+        self._out_len = out_len + len(output_codes) * code_size
+        self._cur_dict_size = cur_dict_size
+        self._code_size = code_size
+        self._cur_code = cur_code
+        self.stats.add_count("symbols", symbols + len(output_codes))
+        self.stats.set_max("dictionary_size", cur_dict_size)
+        return output_codes
+
+    def _check_ratio(self, output: list[bytes]) -> None:
+        """Once the dictionary is full, checks the compression ratio of the input so far.
+        If it has gotten worse, the dictionary no longer fits the input well, so it is
+        cleared."""
+        if not self._variable_width or self._cur_dict_size < self._max_dict_size:
             return
 
-        # Start decompressing
-
-        # Code -> char seq
-        dictionary = {i: chr(i) for i in range(self._INITIAL_DICT_SIZE)}
-        dict_size = self._INITIAL_DICT_SIZE
-
-        char_seq = dictionary[result_codes[0]]
+        ratio = self._in_len / self._out_len
+        if ratio > self._best_ratio:
+            self._best_ratio = ratio
+            return
 
-        output_chars: list[str] = [char_seq]
+        output.append(
+            self._packer.pack([self._cur_code, _CLEAR_CODE], self._code_size)
+        )
+        self._out_len += 2 * self._code_size
+        self._best_ratio = 0.0
+        self.stats.add_count("symbols", 2)
+        self.stats.add_count("clears", 1)
 
-        for code in result_codes[1:]:
-            if code in dictionary:
-                entry = dictionary[code]
-            elif code == dict_size:
-                entry = char_seq + char_seq[:1]
-            else:
-                raise CompressionMethodError(f"Bad code: {code}")
+        self._code_size = _initial_code_size(self._initial_dict_size)
+        self._dictionary = dict(self._primed)
+        self._cur_dict_size = self._initial_dict_size
+        self._cur_code = -1
 
-            output_chars.append(entry)
+    @override
+    def flush(self) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+        self._finished = True
+        if self._header is not None:
+            return b""
+
+        output: list[bytes] = []
+        with self.stats.stage("pack"):
+            if self._cur_code >= 0:
+                code_size = self._code_size
+                if self._cur_dict_size > 1 << code_size:
+                    code_size += 1
+                output.append(self._packer.pack([self._cur_code], code_size))
+                self.stats.add_count("symbols", 1)
+
+            remaining, padding_len = self._packer.flush()
+            output.append(remaining)
+        # In variable width mode the padding is never stored, as it is always shorter
+        # than the smallest code.
+        if not self._variable_width:
+            self.padding_len = padding_len
+        compressed = b"".join(output)
+        self.stats.bytes_out += len(compressed)
+        return compressed
+
+
+class LZWDecompressObj(DecompressObj):
+    """Decompresses an LZW stream fed to it a piece at a time. The codes are decoded as
+    soon as they have been received in full."""
+
+    def __init__(
+        self,
+        method: LZW,
+        cache: dict[Hashable, Any],
+        stats: CompressionStats | None = None,
+    ) -> None:
+        """
+        Args:
+            method (LZW): The method to decompress with, for its dictionary.
+            cache (dict[Hashable, Any]): Where to keep the dictionary list for reuse,
+            see `LZW.decompress_stream`.
+            stats (CompressionStats | None, optional): Where to record the measurements,
+            see `stats`. Defaults to None, i.e. new ones.
+        """
+        self._method = method
+        self._cache = cache
+        self.stats = method.new_stats("decompress", stats)
+        # Header bytes received so far, until the whole header has been received
+        self._header: bytes | None = b""
+        self._finished = False
+
+        # Decoding state, set up by `_start` for the mode read from the header
+        self._variable_width = False
+        self._code_size = 0
+        self._max_code_size = 0
+        self._max_dict_size = 0
+        self._initial_dict_size = 0
+        # Code -> char seq, as a list indexed by code. Slots of codes not yet in use
+        # (and the CLEAR code) are empty. Primed phrases follow the single bytes.
+        self._dictionary: list[bytes] = []
+        self._dict_size = 0
+        self._char_seq = b""
+        self._unpacker = CodeUnpacker()
+
+    def _start(self, header: bytes) -> None:
+        """Sets up decoding for the mode read from the header."""
+        variable_width, max_code_size, primed = _read_header(
+            BytesIO(header), self._method.dictionary
+        )
+        self._variable_width = variable_width
+        self._code_size, self._max_code_size = _code_sizes(variable_width, max_code_size)
+        self._max_dict_size = 1 << self._max_code_size
+        first_free_code = _first_free_code(variable_width)
+        self._initial_dict_size = first_free_code + (
+            len(primed) if primed is not None else 0
+        )
+
+        # The list of a previous input can be reused as is, see `LZW.decompress_cached`
+        cache_key = (
+            "lzw_dictionary",
+            self._max_dict_size,
+            first_free_code,
+            primed is not None,
+        )
+        dictionary: list[bytes] | None = self._cache.get(cache_key)
+        if dictionary is None:
+            dictionary = [bytes([i]) for i in range(_INITIAL_DICT_SIZE)]
+            dictionary += [b""] * (self._max_dict_size - _INITIAL_DICT_SIZE)
+            if primed is not None:
+                dictionary[first_free_code : self._initial_dict_size] = primed.phrases
+            self._cache[cache_key] = dictionary
+        self._dictionary = dictionary
+        self._dict_size = self._initial_dict_size
+        if variable_width:
+            self._code_size = _initial_code_size(self._initial_dict_size)
+
+        self.stats.set_max("dictionary_capacity", self._max_dict_size)
+        self.stats.set_max("dictionary_size", self._dict_size)
 
-            if dict_size < self._MAX_DICT_SIZE:
-                dictionary[dict_size] = char_seq + entry[:1]
-                dict_size += 1
-            char_seq = entry
+    @override
+    def decompress(self, data: bytes) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+        self.stats.bytes_in += len(data)
+
+        if self._header is not None:
+            self._header += data
+            if not self._header:
+                return b""
+            header_len = 1
+            if self._header[0] & _PRIMED_FLAG:
+                header_len += _DICT_ID_SIZE
+            if len(self._header) < header_len:
+                return b""
+            data = self._header[header_len:]
+            with self.stats.stage("header"):
+                self._start(self._header[:header_len])
+            self._header = None
+
+        # The padding is always shorter than a code, so the bits left over after
+        # extracting all whole codes are exactly the padding and can be ignored.
+        self._unpacker.feed(data)
+        decompressed = self._decode()
+        self.stats.bytes_out += len(decompressed)
+        return decompressed
+
+    def _decode(self) -> bytes:
+        """Decodes all the whole codes received so far."""
+        # State in locals for the loop
+        variable_width = self._variable_width
+        max_code_size = self._max_code_size
+        max_dict_size = self._max_dict_size
+        dictionary = self._dictionary
+        unpacker = self._unpacker
+        code_size = self._code_size
+        dict_size = self._dict_size
+        char_seq = self._char_seq
+        clear_code = _CLEAR_CODE
+        stats = self.stats
+
+        output_seqs: list[bytes] = []
+        while True:
+            # The decoder adds each entry one code later than the encoder, so
+            # the encoder's dict size is one larger if there is a previous code.
+            encoder_dict_size = min(dict_size + bool(char_seq), max_dict_size)
+            if encoder_dict_size > 1 << code_size:
+                code_size += 1
+
+            # Unpack only as many codes as will have the current size
+            count = None
+            if code_size < max_code_size:
+                count = (1 << code_size) - encoder_dict_size + 1
+
+            with stats.stage("pack"):
+                codes = unpacker.unpack(code_size, count)
+            if not codes:
+                break
+
+            clear = variable_width and clear_code in codes
+            if clear:
+                clear_index = codes.index(clear_code)
+                unpacker.unread(codes[clear_index + 1 :], code_size)
+                codes = codes[:clear_index]
+            stats.add_count("symbols", len(codes) + clear)
+
+            with stats.stage("decode"):
+                for code in codes:
+                    if code < dict_size:
+                        entry = dictionary[code]
+                    elif code == dict_size and char_seq:
+                        entry = char_seq + char_seq[:1]
+                    else:
+                        raise CompressionMethodError(f"Bad code: {code}")
+
+                    output_seqs.append(entry)
+
+                    # No new entry for the very first code, as there is no previous
+                    # sequence
+                    if char_seq and dict_size < max_dict_size:
+                        dictionary[dict_size] = char_seq + entry[:1]
+                        dict_size += 1
+                    char_seq = entry
+
+            if clear:
+                stats.set_max("dictionary_size", dict_size)
+                stats.add_count("clears", 1)
+                dict_size = self._initial_dict_size
+                code_size = _initial_code_size(dict_size)
+                char_seq = b""
+
+        self._code_size = code_size
+        self._dict_size = dict_size
+        self._char_seq = char_seq
+        stats.set_max("dictionary_size", dict_size)
+        return b"".join(output_seqs)
 
-        output_str = "".join(output_chars)
-        text_out.write(output_str)
+    @override
+    def flush(self) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+        self._finished = True
+        if self._header is not None:
+            # Raises, as the header is missing or truncated
+            _read_header(BytesIO(self._header), self._method.dictionary)
+        return b""
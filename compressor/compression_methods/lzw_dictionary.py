@@ -0,0 +1,211 @@
+"""Pre-trained phrases for priming the dictionary of `LZW`.
+
+On short inputs LZW spends most of its output relearning the same phrases every time. A
+primed dictionary starts with phrases learned from sample data instead, so common phrases
+get a code right from the start.
+
+The phrases are prefix-closed: the prefix of each phrase (without its last byte) is either
+a single byte or an earlier phrase. So the phrases extend the dictionary just like the
+entries LZW adds itself, and the compressor's trie can be built from them directly.
+
+Dictionary file layout:
+    magic (4 bytes) | format version (1 byte) | phrase count (2 bytes)
+    for each phrase: prefix (2 bytes) | last byte (1 byte)
+The prefix is a byte value (0-255) or 256 + the index of an earlier phrase.
+
+The id of a dictionary is the CRC-32 of its phrase table.
+"""
+
+from pathlib import Path
+from typing import Iterable
+from zlib import crc32
+
+from .interface import CompressionMethodError
+
+MAGIC = b"CMPL"
+VERSION = 1
+
+_HEADER_SIZE = len(MAGIC) + 1
+_COUNT_SIZE = 2
+_PHRASE_SIZE = 3
+_BYTE_COUNT = 256
+
+
+class LZWDictionary:
+    """Phrases trained from sample data, to prime the dictionary of `LZW` with.
+
+    Attributes:
+        phrases (list[bytes]): The phrases, each one's prefix coming before it.
+        dict_id (int): Id stored in the files compressed with the dictionary, 4 bytes.
+    """
+
+    DEFAULT_SIZE = 1024
+    # Most phrases usable with `LZW`: with 16-bit codes, the single bytes, the CLEAR
+    # code and the phrases must leave room for at least one new entry
+    MAX_SIZE = (1 << 16) - _BYTE_COUNT - 2
+    # Max number of phrases learned while training, before picking the most used ones
+    _MAX_TRAINING_PHRASES = 1 << 16
+
+    def __init__(self, phrases: list[bytes]) -> None:
+        """
+        Args:
+            phrases (list[bytes]): The phrases, at least 2 bytes long. The prefix of each
+            phrase must be a single byte or an earlier phrase.
+
+        Raises:
+            ValueError: If the phrases are not prefix-closed or there are too many.
+        """
+        if len(phrases) >= 1 << (8 * _COUNT_SIZE):
+            raise ValueError(f"Too many phrases: {len(phrases)}")
+
+        self.phrases = phrases
+        self._prefixes: list[int] = []
+        indexes: dict[bytes, int] = {}
+        for i, phrase in enumerate(phrases):
+            if len(phrase) < 2:
+                raise ValueError("Phrases must be at least 2 bytes long")
+            prefix = phrase[:-1]
+            if len(prefix) == 1:
+                self._prefixes.append(prefix[0])
+            elif prefix in indexes:
+                self._prefixes.append(_BYTE_COUNT + indexes[prefix])
+            else:
+                raise ValueError(f"Prefix of phrase {phrase!r} is not an earlier phrase")
+            indexes[phrase] = i
+
+        self.dict_id = crc32(self._phrase_table())
+        # Compressor tries, by the code of the first phrase
+        self._tries: dict[int, dict[int, int]] = {}
+
+    def __repr__(self) -> str:
+        return f"LZWDictionary(dict_id={self.dict_id:08x}, size={len(self.phrases)})"
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def trie(self, first_code: int) -> dict[int, int]:
+        """Returns the phrases as a compressor trie, `(prefix_code << 8 | byte) -> code`,
+        with codes assigned from first_code on. The trie is built once and cached,
+        so callers must copy it before adding entries.
+        """
+        trie = self._tries.get(first_code)
+        if trie is None:
+            trie = {}
+            for i, (prefix, phrase) in enumerate(zip(self._prefixes, self.phrases)):
+                if prefix >= _BYTE_COUNT:
+                    prefix += first_code - _BYTE_COUNT
+                trie[prefix << 8 | phrase[-1]] = first_code + i
+            self._tries[first_code] = trie
+        return trie
+
+    @staticmethod
+    def train(samples: Iterable[bytes], size: int = DEFAULT_SIZE) -> "LZWDictionary":
+        """Trains a dictionary from sample data, e.g. typical messages to be compressed.
+
+        The samples are parsed like LZW does, learning up to 65536 phrases, and the
+        phrases matched most often are kept. A phrase is matched at most as often as
+        its prefix, so the kept phrases are prefix-closed.
+
+        Args:
+            samples (Iterable[bytes]): The sample data.
+            size (int, optional): Number of phrases to keep. Defaults to 1024.
+
+        Raises:
+            ValueError: If size is not between 1 and `MAX_SIZE`.
+
+        Returns:
+            LZWDictionary: The trained dictionary.
+        """
+        if not 0 < size <= LZWDictionary.MAX_SIZE:
+            raise ValueError(
+                f"Dictionary size must be between 1 and {LZWDictionary.MAX_SIZE}"
+            )
+
+        # Trie of the phrases learned, like in `LZW.compress_stream`
+        trie: dict[int, int] = {}
+        prefixes: list[int] = []  # Key of each learned phrase in the trie
+        counts: list[int] = []  # Times each learned phrase was matched
+
+        for sample in samples:
+            if not sample:
+                continue
+            cur_code = sample[0]
+            for c in sample[1:]:
+                key = cur_code << 8 | c
+                code = trie.get(key)
+                if code is None:
+                    if len(counts) < LZWDictionary._MAX_TRAINING_PHRASES:
+                        trie[key] = _BYTE_COUNT + len(counts)
+                        prefixes.append(key)
+                        counts.append(0)
+                    cur_code = c
+                else:
+                    counts[code - _BYTE_COUNT] += 1
+                    cur_code = code
+
+        # Most matched first; on ties the shorter phrase, i.e. the prefix, comes first
+        # as it was learned earlier
+        order = sorted(range(len(counts)), key=lambda i: (-counts[i], i))[:size]
+        order.sort()
+
+        phrases: dict[int, bytes] = {}
+        for i in order:
+            prefix = prefixes[i] >> 8
+            prefix_phrase = bytes([prefix]) if prefix < _BYTE_COUNT else phrases[prefix]
+            phrases[_BYTE_COUNT + i] = prefix_phrase + bytes([prefixes[i] & 0xFF])
+
+        return LZWDictionary(list(phrases.values()))
+
+    def _phrase_table(self) -> bytes:
+        table = bytearray(len(self.phrases).to_bytes(_COUNT_SIZE, byteorder="big"))
+        for prefix, phrase in zip(self._prefixes, self.phrases):
+            table += prefix.to_bytes(2, byteorder="big") + phrase[-1:]
+        return bytes(table)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the dictionary into the dictionary file format."""
+        return MAGIC + bytes([VERSION]) + self._phrase_table()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "LZWDictionary":
+        """Reads a dictionary serialized with `to_bytes`.
+
+        Raises:
+            CompressionMethodError: If the data is not a valid dictionary.
+        """
+        if data[: len(MAGIC)] != MAGIC:
+            raise CompressionMethodError("Not an LZW dictionary: invalid header")
+        if data[len(MAGIC) : _HEADER_SIZE] != bytes([VERSION]):
+            raise CompressionMethodError(
+                "Unsupported LZW dictionary version: "
+                + data[len(MAGIC) : _HEADER_SIZE].hex()
+            )
+
+        table = data[_HEADER_SIZE:]
+        count = int.from_bytes(table[:_COUNT_SIZE], byteorder="big")
+        if len(table) != _COUNT_SIZE + count * _PHRASE_SIZE:
+            raise CompressionMethodError("Invalid LZW dictionary: size mismatch")
+
+        phrases: list[bytes] = []
+        for i in range(_COUNT_SIZE, len(table), _PHRASE_SIZE):
+            prefix = int.from_bytes(table[i : i + 2], byteorder="big")
+            if prefix < _BYTE_COUNT:
+                phrases.append(bytes([prefix, table[i + 2]]))
+            elif prefix - _BYTE_COUNT < len(phrases):
+                phrases.append(phrases[prefix - _BYTE_COUNT] + table[i + 2 : i + 3])
+            else:
+                raise CompressionMethodError("Invalid LZW dictionary: invalid prefix")
+        return LZWDictionary(phrases)
+
+    def save(self, path: Path) -> None:
+        """Writes the dictionary to a file."""
+        path.write_bytes(self.to_bytes())
+
+    @staticmethod
+    def load(path: Path) -> "LZWDictionary":
+        """Reads a dictionary from a file written by `save`.
+
+        Raises:
+            CompressionMethodError: If the file is not a valid dictionary.
+        """
+        return LZWDictionary.from_bytes(path.read_bytes())
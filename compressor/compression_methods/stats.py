@@ -0,0 +1,181 @@
+"""Measurements of compression and decompression calls, see `CompressionStats`."""
+
+from time import perf_counter, thread_time
+from typing import Any, BinaryIO, Literal
+
+Operation = Literal["compress", "decompress"]
+Stage = Literal["count", "tree", "codes", "encode", "pack", "write", "header", "decode"]
+STAGES: tuple[Stage, ...] = (
+    "count",
+    "tree",
+    "codes",
+    "encode",
+    "pack",
+    "write",
+    "header",
+    "decode",
+)
+
+# Counters merged by taking the largest value instead of the sum, see `merge`
+_MAX_COUNTERS = frozenset(
+    {"distinct_symbols", "max_code_len", "dictionary_size", "dictionary_capacity"}
+)
+
+
+class _StageTimer:
+    """Adds the wall and CPU time spent in a `with` block to a stage."""
+
+    __slots__ = ("_stats", "_stage", "_wall", "_cpu")
+
+    def __init__(self, stats: "CompressionStats", stage: Stage) -> None:
+        self._stats = stats
+        self._stage = stage
+        # Times at the start of the block
+        self._wall = 0.0
+        self._cpu = 0.0
+
+    def __enter__(self) -> None:
+        self._wall = perf_counter()
+        self._cpu = thread_time()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stats.add_time(
+            self._stage, perf_counter() - self._wall, thread_time() - self._cpu
+        )
+
+
+class _NoTimer:
+    """Stands in for `_StageTimer` when the stages are not timed."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+class CompressionStats:
+    """Measurements of a compression or decompression call: the time spent in each
+    stage, the sizes of the input and output and counters specific to the method.
+
+    The stages are `count` (counting the byte frequencies), `tree` (building the
+    Huffman tree or computing the code lengths), `codes` (generating the codes or the
+    decode tables), `encode`, `pack` (packing codes into bytes, or unpacking them),
+    `write`, `header` (reading the header) and `decode`. A method only has some of them.
+    CPU time is that of the calling thread, so that it is not mixed up with other
+    threads compressing at the same time.
+
+    The counters are `symbols` (bytes coded by Huffman, codes by LZW), and for Huffman
+    `distinct_symbols` (bytes with a code), `max_code_len` and with order 1
+    `context_tables` (contexts with their own table), and for LZW `dictionary_size`
+    (the largest size the dictionary reached), `dictionary_capacity` and `clears`.
+    Files compressed in block mode also count their `blocks`.
+
+    Attributes:
+        method (str): Name of the method, e.g. "Huffman".
+        operation (Operation): "compress" or "decompress".
+        timed (bool): Whether the stages are timed.
+        bytes_in (int): Bytes read.
+        bytes_out (int): Bytes written.
+        wall_time (dict[Stage, float]): Wall time of each stage in seconds.
+        cpu_time (dict[Stage, float]): CPU time of each stage in seconds.
+        counters (dict[str, int]): The counters of the method.
+        total_wall_time (float | None): Wall time of the whole call, if measured by
+        the caller, e.g. `FileCompressor`.
+        total_cpu_time (float | None): CPU time of the whole call, likewise.
+    """
+
+    def __init__(self, method: str, operation: Operation, timed: bool = True) -> None:
+        """
+        Args:
+            method (str): Name of the method.
+            operation (Operation): "compress" or "decompress".
+            timed (bool, optional): Whether to time the stages, which costs around a
+            microsecond per stage. Defaults to True.
+        """
+        self.method = method
+        self.operation = operation
+        self.timed = timed
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.wall_time: dict[Stage, float] = {}
+        self.cpu_time: dict[Stage, float] = {}
+        self.counters: dict[str, int] = {}
+        self.total_wall_time: float | None = None
+        self.total_cpu_time: float | None = None
+
+    def __repr__(self) -> str:
+        return f"CompressionStats({self.to_dict()})"
+
+    def stage(self, stage: Stage) -> _StageTimer | _NoTimer:
+        """Returns a context manager adding the time spent in it to the stage."""
+        return _StageTimer(self, stage) if self.timed else _NO_TIMER
+
+    def add_time(self, stage: Stage, wall_time: float, cpu_time: float) -> None:
+        """Adds time in seconds to a stage."""
+        self.wall_time[stage] = self.wall_time.get(stage, 0.0) + wall_time
+        self.cpu_time[stage] = self.cpu_time.get(stage, 0.0) + cpu_time
+
+    def write(self, bin_out: BinaryIO, data: bytes | bytearray) -> None:
+        """Writes data to bin_out as a part of the `write` stage."""
+        with self.stage("write"):
+            bin_out.write(data)
+        self.bytes_out += len(data)
+
+    def add_count(self, counter: str, value: int) -> None:
+        """Adds to a counter."""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def set_max(self, counter: str, value: int) -> None:
+        """Sets a counter to value, if it is larger than the current value."""
+        self.counters[counter] = max(self.counters.get(counter, value), value)
+
+    def merge(self, other: "CompressionStats") -> None:
+        """Adds the measurements of another call, e.g. of a block of the same file.
+        Times, sizes and counters are summed, except for the counters of largest
+        values, such as `max_code_len`."""
+        for stage, wall_time in other.wall_time.items():
+            self.add_time(stage, wall_time, other.cpu_time[stage])
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        for counter, value in other.counters.items():
+            if counter in _MAX_COUNTERS:
+                self.set_max(counter, value)
+            else:
+                self.add_count(counter, value)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns the measurements as a dict that can be serialized as JSON, with the
+        stages in the order of `STAGES`."""
+        return {
+            "method": self.method,
+            "operation": self.operation,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "wall_s": self.total_wall_time,
+            "cpu_s": self.total_cpu_time,
+            "stages": {
+                stage: {"wall_s": self.wall_time[stage], "cpu_s": self.cpu_time[stage]}
+                for stage in STAGES
+                if stage in self.wall_time
+            },
+            "counters": dict(self.counters),
+        }
+
+
+class CountingReader:
+    """Reads a binary input, counting the bytes read into the `bytes_in` of stats."""
+
+    def __init__(self, bin_in: BinaryIO, stats: CompressionStats) -> None:
+        self._bin_in = bin_in
+        self._stats = stats
+
+    def read(self, size: int | None = -1) -> bytes:
+        data = self._bin_in.read(size)
+        self._stats.bytes_in += len(data)
+        return data
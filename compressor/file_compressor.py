@@ -1,113 +1,971 @@
-from typing import Any, Callable, TextIO, BinaryIO
-from os import path
-from time import process_time
+import sys
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from io import BufferedIOBase, BytesIO
+from mmap import mmap, ACCESS_READ, ACCESS_WRITE
+from glob import glob
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    BinaryIO,
+    NamedTuple,
+    TextIO,
+    cast,
+)
+from zlib import crc32
+from os import cpu_count, path
+from time import perf_counter, process_time
 from functools import wraps
 from pathlib import Path
 
+from .block_container import (
+    MAGIC,
+    BlockContainerError,
+    BlockInfo,
+    block_method,
+    find_blocks,
+    is_block_container,
+    method_id,
+    read_index,
+    write_block,
+    write_header,
+    write_index,
+)
 from .compression_methods.interface import CompressionMethodError
 from .compression_methods.interface import CompressionMethod
+from .compression_methods.stats import CompressionStats
+from .streaming import BlockReader
 from .utils.logging import get_logger
 
+if TYPE_CHECKING:
+    from .compression_methods import HuffmanDictionary, LZWDictionary
 
 logger = get_logger(__name__)
 
+IOBackend = Literal["stream", "mmap"]
+IO_BACKENDS: tuple[IOBackend, ...] = ("stream", "mmap")
+
+BatchCommand = Literal["compress", "decompress"]
+
+# Called with the stats of each file compressed or decompressed
+StatsHook = Callable[[CompressionStats], None]
+
+# Input or output path standing for stdin or stdout
+STDIO_PATH = Path("-")
+
+# Size of the reads from non-seekable block compressed input
+_PIPE_READ_SIZE = 64 * 1024
+
 
 class FileCompressionError(Exception):
     """Error in file compression."""
 
 
+@contextmanager
+def _translate_errors() -> Iterator[None]:
+    """Turns errors from file handling and compression into FileCompressionErrors."""
+    try:
+        yield
+    except FileNotFoundError as e:
+        raise FileCompressionError(f"Input file '{e.filename}' does not exist") from e
+    except PermissionError as e:
+        raise FileCompressionError(f"Permission denied: '{e.filename}'") from e
+    except (CompressionMethodError, BlockContainerError) as e:
+        raise FileCompressionError(e) from e
+
+
 def _command_wrapper(
-    func: Callable[[Any, Path, Path, CompressionMethod], None]
-) -> Callable[[Any, Path, Path, CompressionMethod], None]:
+    func: Callable[[Any, Path, Path, CompressionMethod], CompressionStats]
+) -> Callable[[Any, Path, Path, CompressionMethod], CompressionStats]:
     """Returns a wrapper for use with both the compression and decompression methods.
-    Checks whether output file exists and handles errors.
+    Checks whether output file exists and handles errors. Measures the time of the
+    whole call into the stats, and passes them to the stats hook.
 
     Args:
-        func (Callable[[Any, Path, Path, CompressionMethod], None]):
+        func (Callable[[Any, Path, Path, CompressionMethod], CompressionStats]):
         Either the `compress` or `decompress` method.
 
     Returns:
-        Callable[[Any, Path, Path, CompressionMethod], None]: the wrapper
+        Callable[[Any, Path, Path, CompressionMethod], CompressionStats]: the wrapper
     """
 
     @wraps(func)
     def wrapper(
         self: Any, input_path: Path, output_path: Path, method: CompressionMethod
-    ) -> None:
-        logger.debug("Compression method: '%s'", repr(method))
+    ) -> CompressionStats:
+        logger.debug("Compression method: '%r'", method)
         logger.debug("Input path: '%s'", input_path)
         logger.debug("Output path: '%s'", output_path)
 
         # Make sure output file does not exist.
-        if path.exists(output_path):
+        if output_path != STDIO_PATH and path.exists(output_path):
             raise FileCompressionError(f"Path '{output_path}' already exists")
 
-        try:
-            start = process_time()
-            func(self, input_path, output_path, method)
-            end = process_time()
-            print(f"Compression took {end-start:.2f}s")
-        except FileNotFoundError as e:
-            raise FileCompressionError(
-                f"Input file '{e.filename}' does not exist"
-            ) from e
-        except PermissionError as e:
-            raise FileCompressionError(f"Permission denied: '{e.filename}'") from e
-        except CompressionMethodError as e:
-            raise FileCompressionError(e) from e
+        with _translate_errors():
+            start = perf_counter()
+            start_cpu = process_time()
+            stats = func(self, input_path, output_path, method)
+            stats.total_wall_time = perf_counter() - start
+            stats.total_cpu_time = process_time() - start_cpu
+            print(
+                f"Compression took {stats.total_wall_time:.2f}s",
+                file=_status_file(output_path),
+            )
+
+        self.report_stats(stats)
+        return stats
 
     return wrapper
 
 
+def _status_file(output_path: Path) -> TextIO:
+    """Returns where to print the status, stderr if the output goes to stdout."""
+    return sys.stderr if output_path == STDIO_PATH else sys.stdout
+
+
+class _PipeReader(BufferedIOBase):
+    """Reads a non-seekable stream, e.g. stdin or a named pipe.
+
+    `tell` returns the number of bytes read, so that the size of the input can be
+    reported, and `peek` returns the next bytes without consuming them, so that the
+    format of the input can be detected.
+    """
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+        self._peeked = b""
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int | None = -1) -> bytes:
+        if size is None or size < 0:
+            data, self._peeked = self._peeked + self._raw.read(), b""
+        elif len(self._peeked) >= size:
+            data, self._peeked = self._peeked[:size], self._peeked[size:]
+        else:
+            data = self._peeked + self._raw.read(size - len(self._peeked))
+            self._peeked = b""
+        self._pos += len(data)
+        return data
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def peek(self, size: int = 1) -> bytes:
+        while len(self._peeked) < size:
+            data = self._raw.read(size - len(self._peeked))
+            if not data:
+                break
+            self._peeked += data
+        return self._peeked[:size]
+
+    def tell(self) -> int:
+        return self._pos
+
+
+class _PipeWriter(BufferedIOBase):
+    """Writes a non-seekable stream, e.g. stdout or a named pipe.
+
+    `tell` returns the number of bytes written, which is all the block container
+    writer and the size report need.
+    """
+
+    def __init__(self, raw: BinaryIO) -> None:
+        self._raw = raw
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        size = self._raw.write(data)
+        self._pos += size
+        return size
+
+    def flush(self) -> None:
+        self._raw.flush()
+
+    def tell(self) -> int:
+        return self._pos
+
+
+@contextmanager
+def _open_input(input_path: Path) -> Iterator[BinaryIO]:
+    """Opens the input file for reading, or stdin if the path is `STDIO_PATH`.
+    Non-seekable input is wrapped in a `_PipeReader`."""
+    if input_path == STDIO_PATH:
+        yield cast(BinaryIO, _PipeReader(sys.stdin.buffer))
+        return
+
+    with open(input_path, "rb") as file:
+        yield file if file.seekable() else cast(BinaryIO, _PipeReader(file))
+
+
+@contextmanager
+def _open_output(output_path: Path, mode: str = "wb") -> Iterator[BinaryIO]:
+    """Opens the output file for writing, or stdout if the path is `STDIO_PATH`.
+    Non-seekable output is wrapped in a `_PipeWriter`."""
+    if output_path == STDIO_PATH:
+        writer = _PipeWriter(sys.stdout.buffer)
+        yield cast(BinaryIO, writer)
+        writer.flush()
+        return
+
+    with open(output_path, mode) as file:
+        yield file if file.seekable() else cast(BinaryIO, _PipeWriter(file))
+
+
+@contextmanager
+def _map_file(file: BinaryIO, writable: bool = False) -> Iterator[memoryview]:
+    """Memory maps the whole file, yielding a view of the mapped data.
+
+    Args:
+        file (BinaryIO): The file to map. Must not be empty.
+        writable (bool, optional): Whether to map the file for writing.
+        Defaults to False.
+    """
+    access = ACCESS_WRITE if writable else ACCESS_READ
+    with mmap(file.fileno(), 0, access=access) as mapped:
+        with memoryview(mapped) as view:
+            yield view
+
+
+def _compress_block(
+    method: CompressionMethod, block: bytes | memoryview
+) -> tuple[int, int, bytes, CompressionStats]:
+    """Compresses a single block. Run in the worker processes in block mode.
+    The block is copied into a stream for the method, also if it is a view.
+
+    Returns:
+        tuple[int, int, bytes, CompressionStats]: The uncompressed size and checksum of
+        the block, the compressed block and the stats of compressing it.
+    """
+    bin_out = BytesIO()
+    stats = method.compress_stream(BytesIO(block), bin_out)
+    return len(block), crc32(block), bin_out.getvalue(), stats
+
+
+def _decompress_block(
+    method: CompressionMethod, block: BlockInfo, compressed: bytes | memoryview
+) -> tuple[bytes, CompressionStats]:
+    """Decompresses a single block and verifies it against its index entry.
+    Run in the worker processes in block mode.
+
+    Raises:
+        BlockContainerError: If the decompressed block does not match its index entry.
+
+    Returns:
+        tuple[bytes, CompressionStats]: The decompressed block and the stats of
+        decompressing it.
+    """
+    bin_out = BytesIO()
+    stats = method.decompress_stream(BytesIO(compressed), bin_out)
+    decompressed = bin_out.getvalue()
+
+    if (
+        len(decompressed) != block.uncompressed_size
+        or crc32(decompressed) != block.checksum
+    ):
+        raise BlockContainerError(
+            "Invalid block container: checksum mismatch in block at offset "
+            + f"{block.uncompressed_offset}"
+        )
+    return decompressed, stats
+
+
+def _decompress_data(
+    method: CompressionMethod, compressed: bytes
+) -> tuple[bytes, CompressionStats]:
+    """Decompresses a single block read without the index, which is checked
+    afterwards. Run in the worker processes in block mode."""
+    bin_out = BytesIO()
+    stats = method.decompress_stream(BytesIO(compressed), bin_out)
+    return bin_out.getvalue(), stats
+
+
+class BatchResult(NamedTuple):
+    """Result of compressing or decompressing a single file of a batch."""
+
+    input_path: Path
+    output_path: Path
+    input_size: int
+    output_size: int
+    seconds: float
+    error: str | None = None  # None if the file succeeded
+    stats: CompressionStats | None = None  # None if the file failed
+
+
+def batch_inputs(specs: Iterable[str]) -> list[tuple[Path, Path]]:
+    """Expands the inputs of a batch into files.
+
+    Each input is a directory, whose files (including subdirectories) keep their paths
+    relative to it, a file, a glob pattern (`**` matches any subdirectories), or `@`
+    followed by the path of a file listing inputs, one per line.
+
+    Args:
+        specs (Iterable[str]): The inputs.
+
+    Raises:
+        FileCompressionError: If an input matches no files, or two files would be
+        written to the same output path.
+
+    Returns:
+        list[tuple[Path, Path]]: Each file and the path of its output relative to the
+        output directory, without a suffix.
+    """
+    files: dict[Path, Path] = {}  # Relative output path -> file
+
+    def add(spec: str, listed: bool = False) -> None:
+        if spec.startswith("@") and not listed:
+            with _translate_errors():
+                lines = Path(spec[1:]).read_text(encoding="utf-8").splitlines()
+            for line in lines:
+                if line.strip():
+                    add(line.strip(), listed=True)
+            return
+
+        if path.exists(spec):
+            matches = [Path(spec)]
+        else:
+            matches = sorted(Path(match) for match in glob(spec, recursive=True))
+        if not matches:
+            raise FileCompressionError(f"No input files match '{spec}'")
+        for match in matches:
+            if match.is_dir():
+                for file in sorted(p for p in match.rglob("*") if p.is_file()):
+                    add_file(file, file.relative_to(match))
+            else:
+                add_file(match, Path(match.name))
+
+    def add_file(file: Path, relative: Path) -> None:
+        if files.setdefault(relative, file) != file:
+            raise FileCompressionError(
+                f"'{file}' and '{files[relative]}' would have the same output path"
+            )
+
+    for spec in specs:
+        add(spec)
+    return [(file, relative) for relative, file in files.items()]
+
+
+def _batch_file(
+    file_compressor: "FileCompressor",
+    command: BatchCommand,
+    method: CompressionMethod,
+    input_path: Path,
+    output_path: Path,
+) -> BatchResult:
+    """Compresses or decompresses a single file of a batch. Run in the worker processes.
+    Errors are returned in the result, so that the rest of the batch carries on."""
+    start = perf_counter()
+    start_cpu = process_time()
+    try:
+        if path.exists(output_path):
+            raise FileCompressionError(f"Path '{output_path}' already exists")
+
+        with _translate_errors():
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                if command == "compress":
+                    stats = file_compressor._compress_file(input_path, output_path, method)
+                else:
+                    stats = file_compressor._decompress_file(
+                        input_path, output_path, method
+                    )
+            except BaseException:
+                output_path.unlink(missing_ok=True)
+                raise
+    except FileCompressionError as e:
+        return BatchResult(input_path, output_path, 0, 0, perf_counter() - start, str(e))
+
+    stats.total_wall_time = perf_counter() - start
+    stats.total_cpu_time = process_time() - start_cpu
+    return BatchResult(
+        input_path,
+        output_path,
+        stats.bytes_in,
+        stats.bytes_out,
+        stats.total_wall_time,
+        stats=stats,
+    )
+
+
 class FileCompressor:
-    """A wrapper around CompressionMethods with added functionality."""
+    """A wrapper around CompressionMethods with added functionality.
+
+    By default files are compressed as a single stream. If a block size is given, files
+    are instead split into blocks which are compressed independently of each other in
+    parallel worker processes, and written into a block container. Decompression detects
+    block containers and decompresses their blocks in parallel as well.
+
+    Block containers are read and written either with regular file reads and writes
+    (the "stream" I/O backend) or by memory mapping the files ("mmap"). With mmap, the
+    blocks are sliced straight from the mapped input instead of being read into buffers,
+    and as the original size is known from the index, the decompressed output file is
+    sized up front and the blocks are copied into place in the mapped output. The
+    methods read streams, so each input block is still copied once when it is
+    compressed or decompressed, as with the stream backend.
+
+    Either path can be `STDIO_PATH`, i.e. "-", for stdin or stdout, and named pipes
+    work as well. Non-seekable block compressed input is decompressed a block at a time
+    and checked against the index at the end, and the mmap backend falls back to streams
+    for non-seekable files.
+
+    Each compression and decompression returns a `CompressionStats` of the file, with
+    the stats of the blocks merged in block mode. They are also passed to the stats hook,
+    if any, e.g. to send them to a metrics system. Its errors are logged and ignored.
+    """
+
+    def __init__(
+        self,
+        block_size: int | None = None,
+        workers: int | None = None,
+        io_backend: IOBackend = "stream",
+        stats_hook: StatsHook | None = None,
+    ) -> None:
+        """
+        Args:
+            block_size (int | None, optional): Size of the blocks in bytes, or None to
+            compress files as a single stream. Defaults to None.
+            workers (int | None, optional): Number of worker processes used in block mode.
+            Defaults to None, i.e. the number of CPUs.
+            io_backend (IOBackend, optional): How block containers are read and written,
+            "stream" or "mmap". Both copy each input block once for the method to read
+            it as a stream. Single stream files are always read and written as
+            streams. Defaults to "stream".
+            stats_hook (StatsHook | None, optional): Function called with the stats of
+            each file compressed or decompressed, also in batch mode. Defaults to None.
+
+        Raises:
+            ValueError: If block_size or workers is not positive, or io_backend is unknown.
+        """
+        if block_size is not None and block_size <= 0:
+            raise ValueError("Block size must be positive")
+        if workers is not None and workers <= 0:
+            raise ValueError("Number of workers must be positive")
+        if io_backend not in IO_BACKENDS:
+            raise ValueError(f"Unknown I/O backend: '{io_backend}'")
+
+        self.block_size = block_size
+        self.workers = workers or cpu_count() or 1
+        self.io_backend = io_backend
+        self.stats_hook = stats_hook
 
     @_command_wrapper
     def compress(
         self, input_path: Path, output_path: Path, method: CompressionMethod
-    ) -> None:
+    ) -> CompressionStats:
         """Compresses the input file using provided method.
 
         Args:
             input_path (str): path to the file to be compressed
             output_path (str): path to the file to which compressed data is written to
             method (CompressionMethod): method to be used for compression
+
+        Returns:
+            CompressionStats: The stats of compressing the file.
         """
-        with open(input_path, "r", encoding="utf-8") as i_file:
-            with open(output_path, mode="wb") as o_file:
-                method.compress(i_file, o_file)
-                self._compare_sizes(i_file, o_file)
+        stats = self._compress_file(input_path, output_path, method)
+        self._compare_sizes(stats.bytes_in, stats.bytes_out, _status_file(output_path))
+        return stats
+
+    def _compress_file(
+        self, input_path: Path, output_path: Path, method: CompressionMethod
+    ) -> CompressionStats:
+        """Compresses the input file, returning the stats with the uncompressed and
+        compressed sizes of the whole files."""
+        with _open_input(input_path) as i_file, _open_output(output_path) as o_file:
+            if self.block_size is None:
+                stats = method.compress_stream(i_file, o_file)
+            elif (
+                self.io_backend == "mmap"
+                and i_file.seekable()
+                and path.getsize(input_path) > 0
+            ):
+                with _map_file(i_file) as data:
+                    stats = self._compress_blocks(self._slice_blocks(data), o_file, method)
+                i_file.seek(0, 2)
+            else:
+                stats = self._compress_blocks(self._read_blocks(i_file), o_file, method)
+            stats.bytes_in, stats.bytes_out = i_file.tell(), o_file.tell()
+            return stats
 
     @_command_wrapper
     def decompress(
         self, input_path: Path, output_path: Path, method: CompressionMethod
-    ) -> None:
+    ) -> CompressionStats:
         """Decompresses the input file using provided method.
 
         Args:
             input_path (str): path to the file to be decompressed
             output_path (str): path to the file to which decompressed data is written to
             method (CompressionMethod): method to be used for decompression
+
+        Returns:
+            CompressionStats: The stats of decompressing the file.
         """
-        with open(input_path, "rb") as i_file:
-            with open(output_path, mode="w", encoding="utf-8") as o_file:
-                method.decompress(i_file, o_file)
-                self._compare_sizes(o_file, i_file)
+        stats = self._decompress_file(input_path, output_path, method)
+        self._compare_sizes(stats.bytes_out, stats.bytes_in, _status_file(output_path))
+        return stats
+
+    def _decompress_file(
+        self, input_path: Path, output_path: Path, method: CompressionMethod
+    ) -> CompressionStats:
+        """Decompresses the input file, returning the stats with the compressed and
+        decompressed sizes of the whole files."""
+        with _open_input(input_path) as i_file:
+            if not i_file.seekable():
+                with _open_output(output_path) as o_file:
+                    stats = self._decompress_pipe(
+                        cast(_PipeReader, i_file), o_file, method
+                    )
+                    stats.bytes_out = o_file.tell()
+            elif is_block_container(i_file):
+                mode = "w+b" if self.io_backend == "mmap" else "wb"
+                with _open_output(output_path, mode) as o_file:
+                    if self.io_backend == "mmap" and o_file.seekable():
+                        stats = self._decompress_blocks_mmap(i_file, o_file, method)
+                    else:
+                        stats = self._decompress_blocks(i_file, o_file, method)
+                    stats.bytes_out = o_file.tell()
+            else:
+                with _open_output(output_path) as o_file:
+                    stats = method.decompress_stream(i_file, o_file)
+                    stats.bytes_out = o_file.tell()
+
+            stats.bytes_in = i_file.tell()
+            return stats
+
+    def compress_batch(
+        self,
+        inputs: list[tuple[Path, Path]],
+        output_dir: Path,
+        method: CompressionMethod,
+        suffix: str,
+    ) -> list[BatchResult]:
+        """Compresses many files in parallel worker processes, a file per worker.
+        The result of each file is printed as soon as it is done, followed by a summary.
+
+        Args:
+            inputs (list[tuple[Path, Path]]): Each file and the path of its output
+            relative to output_dir, see `batch_inputs`.
+            output_dir (Path): Directory to write the compressed files to.
+            method (CompressionMethod): method to be used for compression
+            suffix (str): Suffix added to the names of the compressed files.
+
+        Raises:
+            FileCompressionError: If any of the files failed, once all are done.
+
+        Returns:
+            list[BatchResult]: The result of each file, in order.
+        """
+        jobs = [
+            (input_path, output_dir / relative.with_name(relative.name + suffix))
+            for input_path, relative in inputs
+        ]
+        return self._run_batch("compress", jobs, method)
+
+    def decompress_batch(
+        self,
+        inputs: list[tuple[Path, Path]],
+        output_dir: Path,
+        method: CompressionMethod,
+        suffix: str,
+    ) -> list[BatchResult]:
+        """Decompresses many files in parallel worker processes, like `compress_batch`.
+
+        Args:
+            inputs (list[tuple[Path, Path]]): Each file and the path of its output
+            relative to output_dir, see `batch_inputs`.
+            output_dir (Path): Directory to write the decompressed files to.
+            method (CompressionMethod): method to be used for decompression
+            suffix (str): Suffix removed from the names of the files, if they have it.
+
+        Raises:
+            FileCompressionError: If any of the files failed, once all are done.
+
+        Returns:
+            list[BatchResult]: The result of each file, in order.
+        """
+        jobs = [
+            (
+                input_path,
+                output_dir
+                / relative.with_name(relative.name.removesuffix(suffix) or relative.name),
+            )
+            for input_path, relative in inputs
+        ]
+        return self._run_batch("decompress", jobs, method)
+
+    def _run_batch(
+        self,
+        command: BatchCommand,
+        jobs: list[tuple[Path, Path]],
+        method: CompressionMethod,
+    ) -> list[BatchResult]:
+        logger.debug("Batch %s of %s files", command, len(jobs))
+        # The files are processed in parallel, so each file is compressed with a single
+        # worker, in blocks if a block size is given.
+        file_compressor = FileCompressor(
+            block_size=self.block_size, workers=1, io_backend=self.io_backend
+        )
+
+        start = perf_counter()
+        results: list[BatchResult] = []
+        for result in self._map_blocks(
+            _batch_file,
+            (
+                (file_compressor, command, method, input_path, output_path)
+                for input_path, output_path in jobs
+            ),
+            parallel=len(jobs) > 1,
+        ):
+            results.append(result)
+            if result.stats is not None:
+                self.report_stats(result.stats)
+            if result.error is None:
+                print(
+                    f"{result.input_path} -> {result.output_path}: "
+                    + f"{result.input_size/1024:.2f} KB -> "
+                    + f"{result.output_size/1024:.2f} KB in {result.seconds:.2f}s"
+                )
+            else:
+                print(f"{result.input_path}: {result.error}")
+        seconds = max(perf_counter() - start, 1e-9)
+
+        failed = sum(result.error is not None for result in results)
+        input_size = sum(result.input_size for result in results)
+        output_size = sum(result.output_size for result in results)
+        uncompressed_size = input_size if command == "compress" else output_size
+        print(f"Processed {len(results) - failed} files in {seconds:.2f}s")
+        print(f"Throughput: {uncompressed_size / 1024**2 / seconds:.2f} MB/s")
+        if command == "compress":
+            self._compare_sizes(input_size, output_size)
+        else:
+            self._compare_sizes(output_size, input_size)
+
+        if failed:
+            raise FileCompressionError(f"{failed} of {len(results)} files failed")
+        return results
+
+    def train_dictionary[D: (HuffmanDictionary, LZWDictionary)](
+        self,
+        input_path: Path,
+        output_path: Path,
+        train: Callable[[Iterable[bytes]], D] | None = None,
+    ) -> D:
+        """Trains a dictionary from sample files and writes it to a file.
+
+        Args:
+            input_path (Path): path to a sample file, or to a directory whose files
+            (including subdirectories) are used as samples
+            output_path (Path): path to the dictionary file to write
+            train (Callable[[Iterable[bytes]], D] | None, optional): function training
+            the dictionary from the samples, e.g. `LZWDictionary.train`. Defaults to
+            None, i.e. `HuffmanDictionary.train`.
+
+        Raises:
+            FileCompressionError: If the output file exists or the samples cannot be read.
+
+        Returns:
+            HuffmanDictionary: The trained dictionary.
+        """
+        if path.exists(output_path):
+            raise FileCompressionError(f"Path '{output_path}' already exists")
+        if train is None:
+            from .compression_methods import HuffmanDictionary
+
+            train = cast(Callable[[Iterable[bytes]], D], HuffmanDictionary.train)
+
+        with _translate_errors():
+            if input_path.is_dir():
+                sample_paths = sorted(p for p in input_path.rglob("*") if p.is_file())
+            else:
+                sample_paths = [input_path]
+            logger.debug("Training dictionary from %s files", len(sample_paths))
+
+            dictionary = train(sample_path.read_bytes() for sample_path in sample_paths)
+            dictionary.save(output_path)
+
+        print(f"Dictionary id: {dictionary.dict_id:08x}")
+        return dictionary
+
+    def _read_blocks(self, bin_in: BinaryIO) -> Iterator[bytes]:
+        """Reads the input in blocks of `block_size` bytes."""
+        assert self.block_size is not None
+
+        while block := bin_in.read(self.block_size):
+            yield block
+
+    def _slice_blocks(self, data: memoryview) -> Iterator[bytes | memoryview]:
+        """Slices mapped input into blocks of `block_size` bytes.
+
+        The blocks are views of the mapped data, unless they are sent to worker processes,
+        which requires them to be copied. Either way `_compress_block` copies them once
+        more into a stream for the method.
+        """
+        assert self.block_size is not None
+
+        for start in range(0, len(data), self.block_size):
+            block = data[start : start + self.block_size]
+            yield block if self.workers == 1 else block.tobytes()
+
+    def read_range(
+        self,
+        input_path: Path,
+        start: int,
+        length: int,
+        method: CompressionMethod | None = None,
+    ) -> bytes:
+        """Reads a range of the original data from a block compressed file.
+        Only the blocks overlapping the range are read and decompressed.
+
+        Args:
+            input_path (Path): path to the block compressed file
+            start (int): offset of the range in the original data, in bytes
+            length (int): length of the range in bytes
+            method (CompressionMethod | None, optional): method to use for blocks
+            compressed with the same method. Defaults to None, i.e. a new instance
+            of each block's method.
+
+        Raises:
+            ValueError: If start or length is negative.
+            FileCompressionError: If the file is not a valid block compressed file.
+
+        Returns:
+            bytes: The data in the range. Shorter than length if the range goes
+            past the end of the data.
+        """
+        if start < 0 or length < 0:
+            raise ValueError("Range start and length must not be negative")
+
+        with _translate_errors():
+            with open(input_path, "rb") as i_file:
+                if not is_block_container(i_file):
+                    raise FileCompressionError(
+                        f"'{input_path}' is not block compressed, "
+                        + "random access requires a block size to be used in compression"
+                    )
+
+                blocks = find_blocks(read_index(i_file), start, length)
+                logger.debug("Reading range from %s blocks", len(blocks))
+                decompressed = b"".join(
+                    decompressed
+                    for decompressed, _ in self._map_blocks(
+                        _decompress_block,
+                        self._decompress_block_args(i_file, blocks, method),
+                        parallel=len(blocks) > 1,
+                    )
+                )
+
+        if not blocks:
+            return b""
+
+        offset = start - blocks[0].uncompressed_offset
+        return decompressed[offset : offset + length]
+
+    def _map_blocks[R](
+        self,
+        func: Callable[..., R],
+        args: Iterable[tuple[Any, ...]],
+        parallel: bool = True,
+    ) -> Iterator[R]:
+        """Calls func with each tuple of args in the worker processes,
+        yielding results in order.
+
+        At most two blocks per worker are submitted ahead of the one being yielded,
+        so that memory use stays bounded even if the blocks are read faster
+        than they are processed.
+        """
+        if self.workers == 1 or not parallel:
+            for func_args in args:
+                yield func(*func_args)
+            return
+
+        # Imported here, as multiprocessing makes up much of the startup time of the cli
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending: deque[Future[R]] = deque()
+            for func_args in args:
+                pending.append(executor.submit(func, *func_args))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def _compress_blocks(
+        self,
+        blocks_in: Iterable[bytes | memoryview],
+        bin_out: BinaryIO,
+        method: CompressionMethod,
+    ) -> CompressionStats:
+        """Compresses the blocks into a block container, returning the merged stats of
+        the blocks, with the time of writing the container added."""
+        method_id_ = method_id(method)
+        stats = CompressionStats(type(method).__name__, "compress")
+        with stats.stage("write"):
+            write_header(bin_out)
+
+        blocks: list[BlockInfo] = []
+        uncompressed_offset = 0
+        for uncompressed_size, checksum, compressed, block_stats in self._map_blocks(
+            _compress_block, ((method, block) for block in blocks_in)
+        ):
+            stats.merge(block_stats)
+            with stats.stage("write"):
+                compressed_offset = write_block(bin_out, compressed, method_id_)
+            blocks.append(
+                BlockInfo(
+                    uncompressed_offset=uncompressed_offset,
+                    uncompressed_size=uncompressed_size,
+                    compressed_offset=compressed_offset,
+                    compressed_size=len(compressed),
+                    method_id=method_id_,
+                    checksum=checksum,
+                )
+            )
+            uncompressed_offset += uncompressed_size
+
+        logger.debug("Compressed %s blocks", len(blocks))
+        with stats.stage("write"):
+            write_index(bin_out, blocks)
+        stats.add_count("blocks", len(blocks))
+        return stats
+
+    def _decompress_block_args(
+        self,
+        bin_in: BinaryIO,
+        blocks: list[BlockInfo],
+        method: CompressionMethod | None,
+    ) -> Iterator[tuple[CompressionMethod, BlockInfo, bytes]]:
+        """Reads the given blocks, yielding the arguments for `_decompress_block`."""
+        for block in blocks:
+            bin_in.seek(block.compressed_offset)
+            compressed = bin_in.read(block.compressed_size)
+            yield block_method(block, method), block, compressed
+
+    def _decompress_blocks(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, method: CompressionMethod
+    ) -> CompressionStats:
+        stats = CompressionStats(type(method).__name__, "decompress")
+        with stats.stage("header"):
+            blocks = read_index(bin_in)
+        logger.debug("Decompressing %s blocks", len(blocks))
+
+        for decompressed, block_stats in self._map_blocks(
+            _decompress_block, self._decompress_block_args(bin_in, blocks, method)
+        ):
+            stats.merge(block_stats)
+            with stats.stage("write"):
+                bin_out.write(decompressed)
+
+        # Move past the index, so that the size of the whole file is reported
+        bin_in.seek(0, 2)
+        stats.add_count("blocks", len(blocks))
+        return stats
+
+    def _decompress_blocks_mmap(
+        self, bin_in: BinaryIO, bin_out: BinaryIO, method: CompressionMethod
+    ) -> CompressionStats:
+        stats = CompressionStats(type(method).__name__, "decompress")
+        with stats.stage("header"):
+            blocks = read_index(bin_in)
+        size = sum(block.uncompressed_size for block in blocks)
+        logger.debug("Decompressing %s blocks into %s bytes", len(blocks), size)
+
+        # Mapping an empty file is not possible, and there would be nothing to write
+        if size > 0:
+            bin_out.truncate(size)
+            with _map_file(bin_in) as data, _map_file(bin_out, writable=True) as out:
+                args = (
+                    (
+                        block_method(block, method),
+                        block,
+                        self._mapped_block(data, block),
+                    )
+                    for block in blocks
+                )
+                for block, (decompressed, block_stats) in zip(
+                    blocks, self._map_blocks(_decompress_block, args)
+                ):
+                    stats.merge(block_stats)
+                    start = block.uncompressed_offset
+                    with stats.stage("write"):
+                        out[start : start + block.uncompressed_size] = decompressed
+
+        # Move to the ends, so that the sizes of the whole files are reported
+        bin_in.seek(0, 2)
+        bin_out.seek(0, 2)
+        stats.add_count("blocks", len(blocks))
+        return stats
+
+    def _decompress_pipe(
+        self, bin_in: _PipeReader, bin_out: BinaryIO, method: CompressionMethod
+    ) -> CompressionStats:
+        """Decompresses non-seekable input. The blocks of a block container are
+        decompressed as they are read, each with the method stored before it like the
+        index gives it for seekable input, and checked against the index at the end."""
+        if bin_in.peek(len(MAGIC)) != MAGIC:
+            return method.decompress_stream(cast(BinaryIO, bin_in), bin_out)
+
+        stats = CompressionStats(type(method).__name__, "decompress")
+        reader = BlockReader(method)
+
+        def blocks() -> Iterator[tuple[CompressionMethod, bytes]]:
+            while data := bin_in.read(_PIPE_READ_SIZE):
+                yield from reader.feed(data)
+
+        for decompressed, block_stats in self._map_blocks(_decompress_data, blocks()):
+            stats.merge(block_stats)
+            stats.add_count("blocks", 1)
+            reader.decompressed(decompressed)
+            with stats.stage("write"):
+                bin_out.write(decompressed)
+        with stats.stage("header"):
+            reader.finish()
+        return stats
+
+    def _mapped_block(self, data: memoryview, block: BlockInfo) -> bytes | memoryview:
+        """Returns the compressed data of a block from the mapped input, copied if
+        it is sent to a worker process."""
+        compressed = data[
+            block.compressed_offset : block.compressed_offset + block.compressed_size
+        ]
+        return compressed if self.workers == 1 else compressed.tobytes()
+
+    def report_stats(self, stats: CompressionStats) -> None:
+        """Passes the stats of a file to the stats hook, if any."""
+        if self.stats_hook is None:
+            return
+        try:
+            self.stats_hook(stats)
+        except Exception:
+            logger.exception("Stats hook failed")
 
-    def _compare_sizes(self, decompressed: TextIO, compressed: BinaryIO):
+    def _compare_sizes(
+        self, decomp_size: int, comp_size: int, file: TextIO | None = None
+    ):
         """Compares the sizes of the compressed and uncompressed data and prints to the terminal.
 
         Args:
-            decompressed (TextIO): The object containing the uncompressed data
-            compressed (BinaryIO): The object containing the compressed data
+            decomp_size (int): Size of the uncompressed data
+            comp_size (int): Size of the compressed data
+            file (TextIO | None, optional): Where to print. Defaults to None, i.e. stdout.
         """
-        decomp_size = decompressed.tell()
-        comp_size = compressed.tell()
 
-        logger.debug("Size (decompressed): %s KB", f"{decomp_size/1024:.2f}")
-        logger.debug("Size (compressed): %s KB", f"{comp_size/1024:.2f}")
+        logger.debug("Size (decompressed): %.2f KB", decomp_size / 1024)
+        logger.debug("Size (compressed): %.2f KB", comp_size / 1024)
 
-        print(f"Size (decompressed): {decomp_size/1024:.2f} KB")
-        print(f"Size (compressed): {comp_size/1024:.2f} KB")
+        print(f"Size (decompressed): {decomp_size/1024:.2f} KB", file=file)
+        print(f"Size (compressed): {comp_size/1024:.2f} KB", file=file)
         if decomp_size != 0:
-            print(f"Compression ratio: {(comp_size / decomp_size):.3f}")
+            print(f"Compression ratio: {(comp_size / decomp_size):.3f}", file=file)
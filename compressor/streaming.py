@@ -0,0 +1,367 @@
+"""Incremental compression of data fed a piece at a time, like `zlib.compressobj` and
+`zlib.decompressobj`, e.g. for data received from a socket in arbitrary fragments.
+
+Methods compressing in a single pass, like `LZW`, compress into a single stream, the same
+format as `CompressionMethod.compress_stream`. Methods making multiple passes over their
+input, like `Huffman`, compress in block mode instead: the data is collected into blocks,
+and each block is compressed and output as a part of a block container as soon as it is
+full. Decompression detects block containers from their magic, and decompresses each
+block as soon as it has been received.
+
+Example:
+    compressobj = streaming.compressobj(Huffman())
+    for fragment in fragments:
+        send(compressobj.compress(fragment))
+    send(compressobj.flush())
+"""
+
+from collections import deque
+from zlib import crc32
+from typing import override
+
+from .block_container import (
+    BLOCK_HEADER_SIZE,
+    HEADER_SIZE,
+    MAGIC,
+    BlockContainerError,
+    BlockInfo,
+    block_bytes,
+    block_header_size,
+    header_bytes,
+    index_bytes,
+    method_for_id,
+    method_id,
+    read_block_header,
+    read_header,
+    read_index_tail,
+)
+from .compression_methods.interface import (
+    CompressionMethod,
+    CompressionMethodError,
+    CompressObj,
+    DecompressObj,
+)
+
+
+# Default size of the blocks of block mode. Each block is output once it is full, so
+# smaller blocks give lower latency, larger ones a better compression ratio.
+DEFAULT_BLOCK_SIZE = 256 * 1024
+
+
+def compressobj(
+    method: CompressionMethod, block_size: int | None = None
+) -> CompressObj:
+    """Returns an object compressing data fed to it a piece at a time.
+
+    Args:
+        method (CompressionMethod): The method to compress with.
+        block_size (int | None, optional): Size of the blocks in bytes to compress in
+        block mode, or None to compress into a single stream if the method is
+        incremental. Methods that are not incremental always use block mode, by default
+        with blocks of `DEFAULT_BLOCK_SIZE` bytes.
+
+    Raises:
+        ValueError: If block_size is not positive.
+        BlockContainerError: If the method cannot be used in block mode.
+
+    Returns:
+        CompressObj: The compress object.
+    """
+    if block_size is not None and block_size <= 0:
+        raise ValueError("Block size must be positive")
+    if block_size is None and method.incremental:
+        return method.compressobj()
+    return BlockCompressObj(method, block_size or DEFAULT_BLOCK_SIZE)
+
+
+def decompressobj(method: CompressionMethod) -> DecompressObj:
+    """Returns an object decompressing a stream fed to it a piece at a time, either a
+    block container or a single stream of an incremental method.
+
+    Args:
+        method (CompressionMethod): The method the data was compressed with.
+
+    Returns:
+        DecompressObj: The decompress object.
+    """
+    return _DetectingDecompressObj(method)
+
+
+class BlockWriter:
+    """Writes compressed blocks into a block container as they are compressed.
+    The container is returned a piece at a time, to be output in order."""
+
+    def __init__(self, method: CompressionMethod) -> None:
+        """
+        Raises:
+            BlockContainerError: If the method cannot be used in block mode.
+        """
+        self._method_id = method_id(method)
+        self._blocks: list[BlockInfo] = []
+        self._uncompressed_offset = 0
+        self._offset = 0  # Bytes returned so far
+
+    def header(self) -> bytes:
+        """Returns the container header if it has not been returned yet."""
+        if self._offset > 0:
+            return b""
+        return self._output(header_bytes())
+
+    def block(self, uncompressed_size: int, checksum: int, compressed: bytes) -> bytes:
+        """Returns the next block, given the size and CRC-32 checksum of the
+        uncompressed data for the index."""
+        output = self.header()
+        self._blocks.append(
+            BlockInfo(
+                uncompressed_offset=self._uncompressed_offset,
+                uncompressed_size=uncompressed_size,
+                compressed_offset=self._offset + BLOCK_HEADER_SIZE,
+                compressed_size=len(compressed),
+                method_id=self._method_id,
+                checksum=checksum,
+            )
+        )
+        self._uncompressed_offset += uncompressed_size
+        return output + self._output(block_bytes(compressed, self._method_id))
+
+    def end(self) -> bytes:
+        """Returns the rest of the container after the last block."""
+        output = self.header()
+        return output + self._output(index_bytes(self._blocks, self._offset))
+
+    def _output(self, data: bytes) -> bytes:
+        self._offset += len(data)
+        return data
+
+
+class BlockReader:
+    """Reads the compressed blocks of a block container fed to it a piece at a time.
+
+    Each block is returned with the method to decompress it with, read from the header
+    preceding the block, like the index gives it when a container is read from a file.
+    The blocks are checked against the index, which comes at the end, by `finish`.
+    Version 3 containers do not store the method before the blocks, so all their blocks
+    are expected to be compressed with the given method.
+    """
+
+    def __init__(self, method: CompressionMethod) -> None:
+        """
+        Raises:
+            BlockContainerError: If the method cannot be used in block mode.
+        """
+        self._method = method
+        self._method_id = method_id(method)
+        self._pending = bytearray()
+        self._offset = 0  # Offset in the container of the start of pending
+        self._block_header_size: int | None = None  # Set once the header is read
+        self._block_size: int | None = None  # Size of the next block, once read
+        self._block_method_id = self._method_id  # Method id of the next block
+        self._index_offset: int | None = None  # Set at the end of blocks
+        # Compressed offset, size and method id of the blocks returned but not yet
+        # decompressed
+        self._returned: deque[tuple[int, int, int]] = deque()
+        self._blocks: list[BlockInfo] = []
+        self._uncompressed_offset = 0
+
+    def feed(self, data: bytes) -> list[tuple[CompressionMethod, bytes]]:
+        """Returns the compressed blocks completed by data, in order, each with the
+        method to decompress it with.
+
+        Raises:
+            BlockContainerError: If the container header is invalid, or the method id
+            of a block is unknown.
+        """
+        self._pending += data
+        blocks: list[tuple[CompressionMethod, bytes]] = []
+        # The index and the footer are kept pending until finish
+        while self._index_offset is None:
+            if self._block_header_size is None:
+                if len(self._pending) < HEADER_SIZE:
+                    break
+                self._block_header_size = block_header_size(
+                    read_header(self._consume(HEADER_SIZE))
+                )
+                if self._block_header_size == 0:
+                    raise BlockContainerError(
+                        "Block containers of version 2 cannot be decompressed "
+                        + "incrementally"
+                    )
+            elif self._block_size is None:
+                if len(self._pending) < self._block_header_size:
+                    break
+                self._block_size, block_method_id = read_block_header(
+                    self._consume(self._block_header_size)
+                )
+                if self._block_size == 0:
+                    self._index_offset = self._offset
+                elif block_method_id is not None:
+                    self._block_method_id = block_method_id
+            else:
+                if len(self._pending) < self._block_size:
+                    break
+                method = method_for_id(self._block_method_id, self._method)
+                self._returned.append(
+                    (self._offset, self._block_size, self._block_method_id)
+                )
+                blocks.append((method, self._consume(self._block_size)))
+                self._block_size = None
+        return blocks
+
+    def decompressed(self, block: bytes) -> None:
+        """Records the decompressed data of the next block returned by `feed`,
+        for checking against the index."""
+        compressed_offset, compressed_size, block_method_id = self._returned.popleft()
+        self._blocks.append(
+            BlockInfo(
+                uncompressed_offset=self._uncompressed_offset,
+                uncompressed_size=len(block),
+                compressed_offset=compressed_offset,
+                compressed_size=compressed_size,
+                method_id=block_method_id,
+                checksum=crc32(block),
+            )
+        )
+        self._uncompressed_offset += len(block)
+
+    def finish(self) -> None:
+        """Checks the decompressed blocks against the index, once the whole container
+        has been fed.
+
+        Raises:
+            BlockContainerError: If the container is truncated, or the blocks do not
+            match the index.
+        """
+        if self._index_offset is None:
+            raise BlockContainerError("Invalid block container: truncated")
+        if read_index_tail(bytes(self._pending), self._index_offset) != self._blocks:
+            raise BlockContainerError(
+                "Invalid block container: blocks do not match the index"
+            )
+
+    def _consume(self, size: int) -> bytes:
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        self._offset += size
+        return data
+
+
+class BlockCompressObj(CompressObj):
+    """Compresses data fed to it a piece at a time into a block container.
+
+    Full blocks are compressed and output right away, the last partial block by `flush`,
+    followed by the index. The blocks are compressed with `CompressionMethod.compressor`,
+    so the tables of the method are reused from block to block.
+    """
+
+    def __init__(self, method: CompressionMethod, block_size: int) -> None:
+        """
+        Args:
+            method (CompressionMethod): The method to compress the blocks with.
+            block_size (int): Size of the blocks in bytes.
+
+        Raises:
+            BlockContainerError: If the method cannot be used in block mode.
+        """
+        self._writer = BlockWriter(method)
+        self._compressor = method.compressor()
+        self._block_size = block_size
+        self._pending = bytearray()
+        self._finished = False
+
+    @override
+    def compress(self, data: bytes) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+
+        output = [self._writer.header()]
+        self._pending += data
+        while len(self._pending) >= self._block_size:
+            output.append(self._compress_block(bytes(self._pending[: self._block_size])))
+            del self._pending[: self._block_size]
+        return b"".join(output)
+
+    @override
+    def flush(self) -> bytes:
+        output = [self.compress(b"")]
+        if self._pending:
+            output.append(self._compress_block(bytes(self._pending)))
+            self._pending.clear()
+        output.append(self._writer.end())
+        self._finished = True
+        return b"".join(output)
+
+    def _compress_block(self, block: bytes) -> bytes:
+        compressed = self._compressor.compress(block)
+        return self._writer.block(len(block), crc32(block), compressed)
+
+
+class BlockDecompressObj(DecompressObj):
+    """Decompresses a block container fed to it a piece at a time. Each block is
+    decompressed as soon as it has been received in full, see `BlockReader`."""
+
+    def __init__(self, method: CompressionMethod) -> None:
+        self._reader = BlockReader(method)
+        self._decompressor = method.decompressor()
+        self._finished = False
+
+    @override
+    def decompress(self, data: bytes) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+
+        output: list[bytes] = []
+        for method, compressed in self._reader.feed(data):
+            if method is self._decompressor.method:
+                block = self._decompressor.decompress(compressed)
+            else:
+                block = method.decompress_bytes(compressed)
+            self._reader.decompressed(block)
+            output.append(block)
+        return b"".join(output)
+
+    @override
+    def flush(self) -> bytes:
+        if self._finished:
+            raise CompressionMethodError("Compressed stream is already flushed")
+        self._finished = True
+        self._reader.finish()
+        return b""
+
+
+class _DetectingDecompressObj(DecompressObj):
+    """Decompresses either a block container or a single stream, detected from the
+    first bytes received."""
+
+    def __init__(self, method: CompressionMethod) -> None:
+        self._method = method
+        self._pending = b""
+        self._decompressobj: DecompressObj | None = None
+
+    @override
+    def decompress(self, data: bytes) -> bytes:
+        if self._decompressobj is None:
+            self._pending += data
+            if len(self._pending) < len(MAGIC):
+                return b""
+            self._decompressobj = self._detect()
+            data, self._pending = self._pending, b""
+        return self._decompressobj.decompress(data)
+
+    @override
+    def flush(self) -> bytes:
+        if self._decompressobj is None:
+            # Input shorter than the magic, so not a block container
+            self._decompressobj = self._detect()
+            data, self._pending = self._pending, b""
+            return self._decompressobj.decompress(data) + self._decompressobj.flush()
+        return self._decompressobj.flush()
+
+    def _detect(self) -> DecompressObj:
+        if self._pending.startswith(MAGIC):
+            return BlockDecompressObj(self._method)
+        if self._method.incremental:
+            return self._method.decompressobj()
+        raise CompressionMethodError(
+            f"Not a block container: {type(self._method).__name__} can only be "
+            + "decompressed incrementally in block mode"
+        )
@@ -3,19 +3,38 @@ from pathlib import Path
 
 
 LOGFILE = Path("compressor.log")
+_PACKAGE = "compressor"
 
+# Nothing is logged until `configure` is called. Without a handler of its own, the
+# errors logged by the package would be printed to stderr by logging's last resort.
+logging.getLogger(_PACKAGE).addHandler(logging.NullHandler())
 
-def configure():
-    logging.basicConfig(
-        filename=LOGFILE,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        filemode="w",
-        level=logging.DEBUG,
+
+def configure(logfile: Path = LOGFILE, level: int = logging.DEBUG) -> None:
+    """Logs the messages of the package to logfile. The file is appended to, so that
+    runs at the same time, e.g. batches, do not truncate each other's logs, and each
+    line has the id of the process that logged it.
+
+    Args:
+        logfile (Path, optional): File to log to. Defaults to LOGFILE.
+        level (int, optional): Lowest level logged. Defaults to logging.DEBUG.
+    """
+    handler = logging.FileHandler(logfile, encoding="utf-8")
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(process)d [%(levelname)s] %(name)s: %(message)s")
     )
+    logger = logging.getLogger(_PACKAGE)
+    logger.addHandler(handler)
+    logger.setLevel(level)
 
 
-def get_logger(name: str):
-    return logging.getLogger(name)
+def logfile() -> Path | None:
+    """Returns the file logged to, or None if logging has not been configured."""
+    for handler in logging.getLogger(_PACKAGE).handlers:
+        if isinstance(handler, logging.FileHandler):
+            return Path(handler.baseFilename)
+    return None
 
 
-configure()
+def get_logger(name: str):
+    return logging.getLogger(name)
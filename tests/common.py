@@ -2,13 +2,19 @@
 """
 
 from filecmp import cmp
+from io import BytesIO, UnsupportedOperation
 
 from pathlib import Path
+from random import Random
 
 from compressor.compression_methods import Huffman, LZW
 
 
 SHORT_TEXT = "The quick brown fox jumps over the lazy dog."
+# Chars taking 1-4 bytes in UTF-8
+NON_ASCII_TEXT = "Tämä on ääkkönen, € on euro, 日本語, 😀\r\n" * 20
+# All byte values, both repetitive and random
+BINARY_DATA = bytes(range(256)) * 20 + Random(0).randbytes(5000)
 LONG_TEXT_FILE = Path("tests/large_ascii_eng.txt")
 REPETITIVE_SENTENCE_TEXT_FILE = Path("tests/repetitive_ascii.txt")
 REPETITIVE_SINGLE_CHAR_TEXT_FILE = Path("tests/single_char_ascii.txt")
@@ -19,6 +25,19 @@ SHORT_SIZE = 500
 MEDIUM_SIZE = SHORT_SIZE * 1000
 
 
+class PipeIO(BytesIO):
+    """In-memory stream that cannot seek or tell, like a pipe."""
+
+    def seekable(self) -> bool:
+        return False
+
+    def seek(self, *args, **kwargs) -> int:
+        raise UnsupportedOperation("seek")
+
+    def tell(self) -> int:
+        raise UnsupportedOperation("tell")
+
+
 def check_compression_ratio(
     method: Huffman | LZW,
     tmp_path: Path,
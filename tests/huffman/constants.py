@@ -1,6 +1,6 @@
 from bitarray import bitarray
 
-from compressor.compression_methods.huffman import HuffmanTreeNode
+from compressor.compression_methods.huffman_tree import HuffmanTreeNode
 
 TEST_STRING_SHORT = "Hello, world!"
 
@@ -32,7 +32,40 @@ TEST_STRING_SHORT_ENCODED_TEXT = bitarray(
     + "1011"
 ).tobytes()
 
-TEST_STRING_SHORT_COMPRESSED = b"\x00\x00\x00\x00\x00\x00\x00\x06\x00\x00\x00\x00\x00\x00\x00\x1d0001H1 1l0001e1,01!1r001w1d1o\x10\xbeN{v\x80"
+# Legacy format, storing the whole Huffman tree
+TEST_STRING_SHORT_COMPRESSED_LEGACY = b"\x00\x00\x00\x00\x00\x00\x00\x06\x00\x00\x00\x00\x00\x00\x00\x1d0001H1 1l0001e1,01!1r001w1d1o\x10\xbeN{v\x80"
+
+# Canonical codes, assigned in order of (code length, byte). The code lengths depend on
+# how ties in the frequencies are broken, see `FlatHuffmanTree.build`.
+TEST_STRING_SHORT_CANONICAL_CODES = {
+    ord("l"): bitarray("00"),
+    ord("o"): bitarray("010"),
+    ord("r"): bitarray("011"),
+    ord("w"): bitarray("100"),
+    ord(" "): bitarray("1010"),
+    ord("!"): bitarray("1011"),
+    ord(","): bitarray("1100"),
+    ord("H"): bitarray("1101"),
+    ord("d"): bitarray("1110"),
+    ord("e"): bitarray("1111"),
+}
+
+TEST_STRING_SHORT_CODE_LENGTHS = {
+    c: len(code) for c, code in TEST_STRING_SHORT_CANONICAL_CODES.items()
+}
+
+_CODES = TEST_STRING_SHORT_CANONICAL_CODES
+TEST_STRING_SHORT_COMPRESSED = (
+    # Format, padding length, symbol count - 1
+    bytes([1, 6, 9])
+    # (symbol, code length) pairs
+    + b"".join(
+        bytes([c, length]) for c, length in sorted(TEST_STRING_SHORT_CODE_LENGTHS.items())
+    )
+    + bitarray(
+        "".join(_CODES[c].to01() for c in TEST_STRING_SHORT.encode("ascii"))
+    ).tobytes()
+)
 
 HTN = HuffmanTreeNode
 # Source for test tree gotten from here: https://huffman-coding-online.vercel.app/
@@ -0,0 +1,107 @@
+from io import BytesIO
+import pytest
+
+from compressor.compression_methods.canonical_huffman import (
+    canonical_codes,
+    code_lengths_to_bytes,
+    limited_code_lengths,
+    read_code_lengths,
+)
+from compressor.compression_methods.interface import CompressionMethodError
+
+from .constants import (
+    TEST_STRING_SHORT_CANONICAL_CODES,
+    TEST_STRING_SHORT_CHAR_FREQS,
+    TEST_STRING_SHORT_CODE_LENGTHS,
+)
+
+# Fibonacci frequencies give the deepest possible Huffman tree
+FIBONACCI_FREQS = {0: 1, 1: 1}
+for _symbol in range(2, 40):
+    FIBONACCI_FREQS[_symbol] = FIBONACCI_FREQS[_symbol - 1] + FIBONACCI_FREQS[_symbol - 2]
+
+
+def _cost(frequencies: dict[int, int], code_lengths: dict[int, int]) -> int:
+    return sum(freq * code_lengths[symbol] for symbol, freq in frequencies.items())
+
+
+def test_canonical_codes():
+    codes = canonical_codes(TEST_STRING_SHORT_CODE_LENGTHS)
+    assert codes == TEST_STRING_SHORT_CANONICAL_CODES
+
+
+def test_canonical_codes_single_symbol():
+    assert canonical_codes({65: 1}) == {65: TEST_STRING_SHORT_CANONICAL_CODES[ord("l")][:1]}
+
+
+@pytest.mark.parametrize(
+    "code_lengths, table_len",
+    [
+        (TEST_STRING_SHORT_CODE_LENGTHS, 1 + 2 * 10),
+        ({0: 1, 255: 1}, 1 + 2 * 2),
+        # 31 symbols are stored as pairs, 32 and more with a bitmap
+        ({i: 5 for i in range(31)}, 1 + 2 * 31),
+        ({i: 5 for i in range(100, 132)}, 1 + 32 + 32),
+        ({i: 8 for i in range(256)}, 1 + 32 + 256),
+    ],
+)
+def test_code_length_table_roundtrip(code_lengths: dict[int, int], table_len: int):
+    table = code_lengths_to_bytes(code_lengths)
+    assert len(table) == table_len
+
+    bin_in = BytesIO(table + b"rest")
+    assert read_code_lengths(bin_in) == code_lengths
+    assert bin_in.read() == b"rest"
+
+
+@pytest.mark.parametrize(
+    "table",
+    [
+        # Three codes of length 1 can't form a prefix code
+        bytes([2, 1, 1, 2, 1, 3, 1]),
+        # Zero length code
+        bytes([1, 1, 0, 2, 1]),
+        # Duplicate symbol
+        bytes([1, 1, 1, 1, 1]),
+        # Truncated
+        bytes([1, 1, 1]),
+        b"",
+    ],
+)
+def test_read_invalid_code_length_table(table: bytes):
+    with pytest.raises(CompressionMethodError, match="Invalid header"):
+        read_code_lengths(BytesIO(table))
+
+
+def test_limited_code_lengths_not_limiting():
+    frequencies = {ord(c): freq for freq, c in TEST_STRING_SHORT_CHAR_FREQS}
+    code_lengths = limited_code_lengths(frequencies, 15)
+    assert _cost(frequencies, code_lengths) == _cost(
+        frequencies, TEST_STRING_SHORT_CODE_LENGTHS
+    )
+
+
+@pytest.mark.parametrize("max_len", [6, 8, 12, 15])
+def test_limited_code_lengths_fibonacci(max_len: int):
+    code_lengths = limited_code_lengths(FIBONACCI_FREQS, max_len)
+    assert max(code_lengths.values()) == max_len
+
+    # Complete prefix code
+    assert sum(1 << (max_len - length) for length in code_lengths.values()) == 1 << max_len
+
+    # Unlimited codes are as deep as there are symbols, and optimal
+    unlimited = limited_code_lengths(FIBONACCI_FREQS, len(FIBONACCI_FREQS))
+    assert max(unlimited.values()) == len(FIBONACCI_FREQS) - 1
+    assert _cost(FIBONACCI_FREQS, code_lengths) > _cost(FIBONACCI_FREQS, unlimited)
+
+
+def test_limited_code_lengths_all_symbols():
+    code_lengths = limited_code_lengths({i: i + 1 for i in range(256)}, 8)
+    assert set(code_lengths.values()) == {8}
+
+    with pytest.raises(ValueError):
+        limited_code_lengths({i: i + 1 for i in range(256)}, 7)
+
+
+def test_limited_code_lengths_single_symbol():
+    assert limited_code_lengths({65: 10}, 8) == {65: 1}
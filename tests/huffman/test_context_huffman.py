@@ -0,0 +1,45 @@
+from io import BytesIO
+import pytest
+
+from compressor.compression_methods.context_huffman import (
+    context_tables_to_bytes,
+    read_context_tables,
+    select_context_tables,
+)
+from compressor.compression_methods.interface import CompressionMethodError
+
+
+def test_select_context_tables_fallback_to_shared():
+    # Context 0 has plenty of skewed data, context 1 a single byte
+    context_frequencies = {
+        0: {ord("a"): 10000, ord("b"): 1000},
+        1: {ord("c"): 1},
+    }
+    shared, contexts, encoded_len = select_context_tables(context_frequencies, 12)
+
+    assert set(shared) == {ord("a"), ord("b"), ord("c")}
+    assert set(contexts) == {0}
+    assert encoded_len == 11000 + shared[ord("c")]
+
+
+def test_select_context_tables_all_shared():
+    # Same distribution in both contexts: own tables would not pay for themselves
+    context_frequencies = {0: {0: 5, 1: 5}, 1: {0: 5, 1: 5}}
+    shared, contexts, encoded_len = select_context_tables(context_frequencies, 12)
+
+    assert shared == {0: 1, 1: 1}
+    assert contexts == {}
+    assert encoded_len == 20
+
+
+def test_context_tables_roundtrip():
+    shared = {0: 1, 1: 2, 2: 2}
+    contexts = {3: {0: 1, 2: 1}, 200: {1: 1}}
+    tables = context_tables_to_bytes(shared, contexts)
+    assert read_context_tables(BytesIO(tables)) == (shared, contexts)
+
+
+def test_read_context_tables_truncated_bitmap():
+    tables = context_tables_to_bytes({0: 1, 1: 1}, {})
+    with pytest.raises(CompressionMethodError, match="bitmap is truncated"):
+        read_context_tables(BytesIO(tables[:-1]))
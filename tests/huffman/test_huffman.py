@@ -1,25 +1,34 @@
+from collections import Counter
 from typing import Callable
 import pytest
-from io import BytesIO, StringIO
+from bitarray import bitarray
+from io import BytesIO, StringIO, TextIOWrapper
 from pathlib import Path
 from filecmp import cmp
 
-from compressor.compression_methods.huffman import Huffman, HuffmanTreeNode
+from compressor.compression_methods import HuffmanDictionary
+from compressor.compression_methods.huffman import Huffman
+from compressor.compression_methods.huffman_tree import FlatHuffmanTree, HuffmanTreeNode
+from compressor.compression_methods.interface import CompressionMethodError
 
 from .constants import (
     TEST_STRING_SHORT,
     TEST_STRING_SHORT_CHAR_FREQS,
     TEST_STRING_SHORT_COMPRESSED,
+    TEST_STRING_SHORT_COMPRESSED_LEGACY,
     TEST_STRING_SHORT_HUFFMAN_TREE,
     TEST_STRING_SHORT_HUFFMAN_CODES,
 )
 from ..common import (
+    BINARY_DATA,
+    NON_ASCII_TEXT,
     LONG_TEXT_FILE,
     RANDOM_TEXT_FILE,
     REPETITIVE_SENTENCE_TEXT_FILE,
     REPETITIVE_SINGLE_CHAR_TEXT_FILE,
     MEDIUM_SIZE,
     SHORT_SIZE,
+    PipeIO,
     check_roundtrip_integrity,
     check_compression_ratio,
 )
@@ -31,11 +40,37 @@ def h():
 
 
 def test_frequency_counter_short_input(h: Huffman):
-    a = StringIO(TEST_STRING_SHORT)
+    a = BytesIO(TEST_STRING_SHORT.encode("ascii"))
     f = h._count_frequencies(a)
     assert set(f) == set(TEST_STRING_SHORT_CHAR_FREQS)
 
 
+@pytest.mark.parametrize(
+    "data",
+    [
+        NON_ASCII_TEXT.encode("utf-8"),
+        # More distinct bytes than counted one by one
+        BINARY_DATA,
+        # Bytes not seen in the first 1024 bytes
+        b"a" * 5000 + b"xyz" + b"a" * 100,
+    ],
+    ids=["non_ascii_text", "binary_data", "new_bytes_at_end"],
+)
+@pytest.mark.parametrize("chunk_size", [7, 64 * 1024])
+def test_frequency_counter(h: Huffman, data: bytes, chunk_size: int):
+    h._CHUNK_SIZE = chunk_size
+    f = h._count_frequencies(BytesIO(data))
+    assert f == sorted(((f, chr(c)) for c, f in Counter(data).items()), reverse=True)
+
+    context_freqs = h._count_context_frequencies(BytesIO(data))
+    pair_freqs = {
+        (context, c): f
+        for context, freqs in context_freqs.items()
+        for c, f in freqs.items()
+    }
+    assert pair_freqs == Counter(zip(b"\0" + data, data))
+
+
 def test_huffman_tree_with_short_input(h: Huffman):
     # Multiple ways to arrange the tree in terms of character position,
     # as characters may have the same frequency.
@@ -54,6 +89,63 @@ def test_huffman_coding(h: Huffman):
     assert codes == TEST_STRING_SHORT_HUFFMAN_CODES
 
 
+def test_flat_huffman_tree_with_short_input():
+    tree = FlatHuffmanTree.build(TEST_STRING_SHORT_CHAR_FREQS)
+    assert tree is not None
+    assert len(tree) == 2 * len(TEST_STRING_SHORT_CHAR_FREQS) - 1
+    assert tree.freq[-1] == len(TEST_STRING_SHORT)
+
+    # Optimal: same encoded length as from the object tree
+    freqs = {ord(c): freq for freq, c in TEST_STRING_SHORT_CHAR_FREQS}
+    lengths = tree.code_lengths()
+    assert sum(freqs[c] * length for c, length in lengths.items()) == sum(
+        freqs[ord(c)] * len(code) for c, code in TEST_STRING_SHORT_HUFFMAN_CODES.items()
+    )
+    # The codes form a complete prefix code with the same lengths
+    codes = tree.codes()
+    assert {c: len(code) for c, code in codes.items()} == lengths
+    assert sum(2 ** -length for length in lengths.values()) == 1
+    assert FlatHuffmanTree.from_bytes(tree.to_bytes()).codes() == codes
+
+
+def test_flat_huffman_tree_matches_object_tree():
+    tree_bytes = TEST_STRING_SHORT_HUFFMAN_TREE.to_bytes()
+    tree = FlatHuffmanTree.from_bytes(tree_bytes)
+    assert tree.codes() == {
+        ord(c): code for c, code in TEST_STRING_SHORT_HUFFMAN_CODES.items()
+    }
+    assert tree.to_bytes() == tree_bytes
+
+
+def test_flat_huffman_tree_single_byte():
+    tree = FlatHuffmanTree.build([(5, "a")])
+    assert tree is not None
+    assert tree.codes() == {ord("a"): bitarray("1")}
+    assert tree.code_lengths() == {ord("a"): 1}
+    assert FlatHuffmanTree.build([]) is None
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 10])
+def test_flat_huffman_tree_truncated(length: int):
+    tree_bytes = TEST_STRING_SHORT_HUFFMAN_TREE.to_bytes()
+    with pytest.raises(CompressionMethodError, match="truncated"):
+        FlatHuffmanTree.from_bytes(tree_bytes[:length])
+
+
+def test_flat_huffman_tree_too_many_leaves(h: Huffman):
+    # A tree of 257 leaves cannot come from byte frequencies, and a larger one would
+    # not fit the node arrays
+    for leaves in (257, 20_000):
+        tree_bytes = b"0" * (leaves - 1) + b"1a" * leaves
+        with pytest.raises(CompressionMethodError, match="too many leaves"):
+            FlatHuffmanTree.from_bytes(tree_bytes)
+
+        legacy = bytes(8) + len(tree_bytes).to_bytes(8, "big") + tree_bytes
+        with pytest.raises(CompressionMethodError, match="too many leaves"):
+            h.decompress_bytes(legacy)
+    assert len(FlatHuffmanTree.from_bytes(b"0" * 255 + b"1a" * 256)) == 511
+
+
 def test_decompression_short_input(h: Huffman):
     i = BytesIO(TEST_STRING_SHORT_COMPRESSED)
     o = StringIO()
@@ -70,6 +162,174 @@ def test_compression_short_input(h: Huffman):
     assert o.read() == TEST_STRING_SHORT_COMPRESSED
 
 
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_chunked_compression_short_input(h: Huffman, chunk_size: int):
+    h._CHUNK_SIZE = chunk_size
+    i = StringIO(TEST_STRING_SHORT)
+    o = BytesIO()
+    h.compress(i, o)
+    assert o.getvalue() == TEST_STRING_SHORT_COMPRESSED
+
+
+@pytest.mark.parametrize(
+    "compressed", [TEST_STRING_SHORT_COMPRESSED, TEST_STRING_SHORT_COMPRESSED_LEGACY]
+)
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 1000])
+def test_chunked_decompression_short_input(
+    h: Huffman, chunk_size: int, compressed: bytes
+):
+    h._CHUNK_SIZE = chunk_size
+    i = BytesIO(compressed)
+    o = StringIO()
+    h.decompress(i, o)
+    assert o.getvalue() == TEST_STRING_SHORT
+
+
+def test_decompression_legacy_format(h: Huffman):
+    i = BytesIO(TEST_STRING_SHORT_COMPRESSED_LEGACY)
+    o = StringIO()
+    h.decompress(i, o)
+    assert o.getvalue() == TEST_STRING_SHORT
+
+
+def test_decompression_truncated_tree(h: Huffman):
+    i = BytesIO(TEST_STRING_SHORT_COMPRESSED_LEGACY[:20])
+    o = StringIO()
+    with pytest.raises(CompressionMethodError, match="Invalid header"):
+        h.decompress(i, o)
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 10])
+def test_decompression_truncated_code_length_table(h: Huffman, length: int):
+    with pytest.raises(CompressionMethodError, match="Invalid header"):
+        h.decompress_bytes(TEST_STRING_SHORT_COMPRESSED[:length])
+
+
+def test_decompression_unknown_format(h: Huffman):
+    with pytest.raises(CompressionMethodError, match="unknown format"):
+        h.decompress_bytes(b"\x7f" + TEST_STRING_SHORT_COMPRESSED[1:])
+
+
+def test_roundtrip_binary_data(h: Huffman):
+    compressed = h.compress_bytes(BINARY_DATA)
+    assert h.decompress_bytes(compressed) == BINARY_DATA
+
+
+def test_roundtrip_non_ascii_text(h: Huffman):
+    compressed = BytesIO()
+    h.compress(StringIO(NON_ASCII_TEXT), compressed)
+    assert compressed.getvalue() == h.compress_bytes(NON_ASCII_TEXT.encode("utf-8"))
+
+    compressed.seek(0)
+    o = StringIO()
+    h.decompress(compressed, o)
+    assert o.getvalue() == NON_ASCII_TEXT
+
+
+@pytest.mark.parametrize("max_code_len", [8, 12, 15])
+def test_roundtrip_max_code_len(max_code_len: int):
+    # Skewed frequencies, which would give codes of up to 19 bits
+    data = b"".join(bytes([i]) * (2**i) for i in range(20))
+
+    h = Huffman(max_code_len=max_code_len)
+    compressed = h.compress_bytes(data)
+    # Format, padding length, max code length
+    assert compressed[0] == 2
+    assert compressed[2] == max_code_len
+    assert h.decompress_bytes(compressed) == data
+    assert Huffman().decompress_bytes(compressed) == data
+
+    assert len(compressed) > len(Huffman().compress_bytes(data))
+
+
+def test_decompression_code_longer_than_max_code_len(h: Huffman):
+    # A valid prefix code with lengths of 1-10 bits, but the max code length is 8
+    table = bytes([9]) + b"".join(bytes([i, i + 1]) for i in range(10))
+    compressed = bytes([2, 0, 8]) + table + b"\x00"
+    with pytest.raises(CompressionMethodError, match="longer than the max code length"):
+        h.decompress_bytes(compressed)
+
+
+def test_invalid_max_code_len():
+    with pytest.raises(ValueError):
+        Huffman(max_code_len=7)
+    with pytest.raises(ValueError):
+        Huffman(max_code_len=33)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"a",
+        b"ab",
+        TEST_STRING_SHORT.encode("ascii"),
+        NON_ASCII_TEXT.encode("utf-8"),
+        BINARY_DATA,
+    ],
+)
+def test_roundtrip_order1(data: bytes):
+    h = Huffman(order=1)
+    compressed = h.compress_bytes(data)
+    # Format, padding length, max code length
+    assert compressed[0] == 3
+    assert compressed[2] == 12
+    assert h.decompress_bytes(compressed) == data
+    assert Huffman().decompress_bytes(compressed) == data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 100])
+def test_chunked_roundtrip_order1(chunk_size: int):
+    data = TEST_STRING_SHORT.encode("ascii") * 20
+    h = Huffman(order=1)
+    h._CHUNK_SIZE = chunk_size
+    assert h.decompress_bytes(h.compress_bytes(data)) == data
+
+
+def test_roundtrip_order1_max_code_len():
+    data = b"".join(bytes([i]) * (2**i) for i in range(20))
+    h = Huffman(max_code_len=8, order=1)
+    compressed = h.compress_bytes(data)
+    assert compressed[2] == 8
+    assert h.decompress_bytes(compressed) == data
+
+
+def test_order1_max_code_len_bound(h: Huffman):
+    # Order 1 decode tables have 2**max_code_len entries per context
+    with pytest.raises(ValueError):
+        Huffman(max_code_len=13, order=1)
+
+    compressed = bytearray(Huffman(order=1).compress_bytes(BINARY_DATA))
+    compressed[2] = 32
+    with pytest.raises(CompressionMethodError, match="max code length"):
+        h.decompress_bytes(bytes(compressed))
+
+
+def test_order1_smaller_for_repetitive_input():
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[:MEDIUM_SIZE]
+    order0 = Huffman().compress_bytes(data)
+    order1 = Huffman(order=1).compress_bytes(data)
+    assert len(order1) < len(order0) / 2
+
+
+def test_decompression_order1_invalid_code(h: Huffman):
+    # Shared table with codes for 'a' (0) and 'b' (10), no context tables; 11 is not a code
+    table = bytes([1, ord("a"), 1, ord("b"), 2]) + bytes(32)
+    compressed = bytes([3, 6, 8]) + table + bytes([0b11000000])
+    with pytest.raises(CompressionMethodError, match="invalid code"):
+        h.decompress_bytes(compressed)
+
+
+def test_decompression_order1_truncated_tables(h: Huffman):
+    compressed = Huffman(order=1).compress_bytes(TEST_STRING_SHORT.encode("ascii"))
+    with pytest.raises(CompressionMethodError, match="truncated"):
+        h.decompress_bytes(compressed[:30])
+
+
+def test_invalid_order():
+    with pytest.raises(ValueError):
+        Huffman(order=2)
+
+
 def test_compression_empty_input(h: Huffman):
     i = StringIO("")
     o = BytesIO()
@@ -91,22 +351,38 @@ def test_roundtrip(h: Huffman, tmp_path: Path, test_file: Path):
     assert check_roundtrip_integrity(method=h, tmp_path=tmp_path, test_file=test_file)
 
 
+@pytest.mark.parametrize(
+    "test_file",
+    [
+        (LONG_TEXT_FILE),
+        (REPETITIVE_SENTENCE_TEXT_FILE),
+        (REPETITIVE_SINGLE_CHAR_TEXT_FILE),
+        (RANDOM_TEXT_FILE),
+    ],
+)
+def test_roundtrip_order1_files(tmp_path: Path, test_file: Path):
+    assert check_roundtrip_integrity(
+        method=Huffman(order=1), tmp_path=tmp_path, test_file=test_file
+    )
+
+
 @pytest.mark.parametrize(
     "test_file, size_limit, ratio_range",
     [
         # Test english input, should be fairly efficient for longer files
-        (LONG_TEXT_FILE, SHORT_SIZE, (0.8, 0.9)),
+        # Short inputs: the header is a notable part of the output
+        (LONG_TEXT_FILE, SHORT_SIZE, (0.7, 0.9)),
         (LONG_TEXT_FILE, MEDIUM_SIZE, (0.5, 0.6)),
         (LONG_TEXT_FILE, None, (0.5, 0.6)),
         # Test repetitive input, should be very efficient for longer files, more so for single char
-        (REPETITIVE_SENTENCE_TEXT_FILE, SHORT_SIZE, (0.7, 0.8)),
+        (REPETITIVE_SENTENCE_TEXT_FILE, SHORT_SIZE, (0.65, 0.7)),
         (REPETITIVE_SENTENCE_TEXT_FILE, MEDIUM_SIZE, (0.5, 0.6)),
         (REPETITIVE_SENTENCE_TEXT_FILE, None, (0.5, 0.6)),
         (REPETITIVE_SINGLE_CHAR_TEXT_FILE, SHORT_SIZE, (0.1, 0.2)),
         (REPETITIVE_SINGLE_CHAR_TEXT_FILE, MEDIUM_SIZE, (0.1, 0.2)),
         (REPETITIVE_SINGLE_CHAR_TEXT_FILE, None, (0.1, 0.2)),
         # Test random input, should be quite inefficient, better than LZW though
-        (RANDOM_TEXT_FILE, SHORT_SIZE, (1.1, 1.2)),
+        (RANDOM_TEXT_FILE, SHORT_SIZE, (0.9, 1.2)),
         (RANDOM_TEXT_FILE, MEDIUM_SIZE, (0.7, 0.8)),
         (RANDOM_TEXT_FILE, None, (0.7, 0.8)),
     ],
@@ -125,3 +401,81 @@ def test_compression_ratio(
         test_file_path=test_file,
         ratio_range=ratio_range,
     )
+
+
+@pytest.mark.parametrize("h", [Huffman(), Huffman(max_code_len=10), Huffman(order=1)])
+def test_compressor_objects(h: Huffman):
+    inputs = [TEST_STRING_SHORT.encode("ascii"), BINARY_DATA, b"", b"aaab"]
+
+    compressor = h.compressor()
+    decompressor = h.decompressor()
+    for data in inputs:
+        compressed = compressor.compress(data)
+        assert compressed == h.compress_bytes(data)
+        if data:
+            assert decompressor.decompress(compressed) == data
+
+    compressor.reset()
+    decompressor.reset()
+    assert decompressor.decompress(compressor.compress(BINARY_DATA)) == BINARY_DATA
+
+
+@pytest.mark.parametrize(
+    "h",
+    [
+        Huffman(),
+        Huffman(order=1),
+        Huffman(dictionary=HuffmanDictionary.train([NON_ASCII_TEXT.encode()])),
+    ],
+    ids=["order0", "order1", "dictionary"],
+)
+def test_non_seekable_streams(h: Huffman):
+    data = NON_ASCII_TEXT.encode()
+
+    bin_out = PipeIO()
+    h.compress_stream(PipeIO(data), bin_out)
+    assert bin_out.getvalue() == h.compress_bytes(data)
+
+    decompressed = PipeIO()
+    h.decompress_stream(PipeIO(bin_out.getvalue()), decompressed)
+    assert decompressed.getvalue() == data
+
+
+def test_non_seekable_text(h: Huffman):
+    text_in = TextIOWrapper(
+        PipeIO(NON_ASCII_TEXT.encode()), encoding="utf-8", newline=""
+    )
+    compressed = BytesIO()
+    h.compress(text_in, compressed)
+    assert compressed.getvalue() == h.compress_bytes(NON_ASCII_TEXT.encode())
+
+    text_out = StringIO()
+    h.decompress(BytesIO(compressed.getvalue()), text_out)
+    assert text_out.getvalue() == NON_ASCII_TEXT
+
+
+@pytest.mark.parametrize("h", [Huffman(), Huffman(order=1)], ids=["order0", "order1"])
+def test_stats(h: Huffman):
+    data = NON_ASCII_TEXT.encode()
+
+    bin_out = BytesIO()
+    stats = h.compress_stream(BytesIO(data), bin_out)
+    assert (stats.method, stats.operation) == ("Huffman", "compress")
+    assert (stats.bytes_in, stats.bytes_out) == (len(data), len(bin_out.getvalue()))
+    assert set(stats.wall_time) == {"count", "tree", "codes", "encode", "pack", "write"}
+    assert stats.counters["symbols"] == len(data)
+    assert stats.counters["distinct_symbols"] == len(set(data))
+    assert 0 < stats.counters["max_code_len"] <= 32
+
+    decompressed = BytesIO()
+    stats = h.decompress_stream(BytesIO(bin_out.getvalue()), decompressed)
+    assert (stats.bytes_in, stats.bytes_out) == (len(bin_out.getvalue()), len(data))
+    assert {"header", "codes", "decode"} <= set(stats.wall_time)
+    assert stats.counters["symbols"] == len(data)
+
+
+def test_stats_untimed(h: Huffman):
+    stats = h.untimed_stats("compress")
+    h.compress_stream(BytesIO(BINARY_DATA), BytesIO(), stats)
+    assert stats.wall_time == stats.cpu_time == {}
+    assert stats.bytes_in == len(BINARY_DATA)
@@ -0,0 +1,102 @@
+import pytest
+
+from compressor.compression_methods import Huffman, HuffmanDictionary
+from compressor.compression_methods.interface import CompressionMethodError
+
+from .constants import TEST_STRING_SHORT
+from ..common import BINARY_DATA, REPETITIVE_SENTENCE_TEXT_FILE, SHORT_SIZE
+
+
+@pytest.fixture
+def dictionary():
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()
+    return HuffmanDictionary.train([data[i : i + 1000] for i in range(0, 50_000, 1000)])
+
+
+def test_train_codes_all_bytes(dictionary: HuffmanDictionary):
+    assert len(dictionary.codes) == 256
+    assert max(dictionary.code_lengths.values()) <= 15
+
+    # Bytes common in the samples get the shortest codes
+    assert dictionary.code_lengths[ord(" ")] < dictionary.code_lengths[0]
+
+
+def test_to_bytes_roundtrip(dictionary: HuffmanDictionary):
+    loaded = HuffmanDictionary.from_bytes(dictionary.to_bytes())
+    assert loaded.code_lengths == dictionary.code_lengths
+    assert loaded.dict_id == dictionary.dict_id
+
+
+@pytest.mark.parametrize(
+    "data, match",
+    [
+        (b"XXXX\x01", "invalid header"),
+        (b"CMPD\x02", "version"),
+        (b"CMPD\x01\x01\x00", "truncated"),
+    ],
+)
+def test_from_bytes_invalid(data: bytes, match: str):
+    with pytest.raises(CompressionMethodError, match=match):
+        HuffmanDictionary.from_bytes(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"a",
+        TEST_STRING_SHORT.encode("ascii"),
+        BINARY_DATA,
+        REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[-SHORT_SIZE:],
+    ],
+)
+def test_roundtrip(dictionary: HuffmanDictionary, data: bytes):
+    h = Huffman(dictionary=dictionary)
+    compressed = h.compress_bytes(data)
+    # Format, padding length, dictionary id
+    assert compressed[0] == 4
+    assert int.from_bytes(compressed[2:6], byteorder="big") == dictionary.dict_id
+    assert h.decompress_bytes(compressed) == data
+
+
+def test_smaller_than_own_codes_for_small_input(dictionary: HuffmanDictionary):
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[-SHORT_SIZE:]
+    assert len(Huffman(dictionary=dictionary).compress_bytes(data)) < len(
+        Huffman().compress_bytes(data)
+    )
+
+
+def test_compression_empty_input(dictionary: HuffmanDictionary):
+    assert Huffman(dictionary=dictionary).compress_bytes(b"") == b""
+
+
+def test_decompression_without_dictionary(dictionary: HuffmanDictionary):
+    compressed = Huffman(dictionary=dictionary).compress_bytes(b"abc")
+    with pytest.raises(CompressionMethodError, match="needed for decompression"):
+        Huffman().decompress_bytes(compressed)
+
+
+def test_decompression_with_other_dictionary(dictionary: HuffmanDictionary):
+    compressed = Huffman(dictionary=dictionary).compress_bytes(b"abc")
+    other = HuffmanDictionary.train([BINARY_DATA])
+    with pytest.raises(CompressionMethodError, match="but dictionary"):
+        Huffman(dictionary=other).decompress_bytes(compressed)
+
+
+def test_invalid_args(dictionary: HuffmanDictionary):
+    with pytest.raises(ValueError):
+        Huffman(max_code_len=12, dictionary=dictionary)
+    with pytest.raises(ValueError):
+        Huffman(order=1, dictionary=dictionary)
+    with pytest.raises(ValueError):
+        HuffmanDictionary.train([b"abc"], max_code_len=7)
+
+
+def test_decompressor_object(dictionary: HuffmanDictionary):
+    h = Huffman(dictionary=dictionary)
+    decompressor = h.decompressor()
+    for data in [b"abc", BINARY_DATA, TEST_STRING_SHORT.encode("ascii")]:
+        assert decompressor.decompress(h.compress_bytes(data)) == data
+
+    # Files compressed without the dictionary are decoded with their own codes
+    compressed = Huffman().compress_bytes(b"abc")
+    assert decompressor.decompress(compressed) == b"abc"
@@ -0,0 +1,6 @@
+# common.SHORT_TEXT compressed with 12-bit codes
+SHORT_TEXT_COMPRESSED = (
+    b"\x04\x05@h\x06P \x07\x10u\x06\x90c\x06\xb0 \x06 r\x06\xf0w\x06\xe0 \x06`o\x07\x80"
+    b" \x06\xa0u\x06\xd0p\x070 \x06\xf0v\x06Pr\x02\x00t\x10\x10 \x06\xc0a\x07\xa0y\x02"
+    b"\x00d\x06\xf0g\x02\xe0"
+)
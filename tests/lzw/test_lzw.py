@@ -1,11 +1,15 @@
 from typing import Callable
 import pytest
-from io import BytesIO, StringIO
+from io import BytesIO, StringIO, TextIOWrapper
 from pathlib import Path
 
+from compressor.compression_methods.interface import CompressionMethodError
 from compressor.compression_methods.lzw import LZW
 
+from .constants import SHORT_TEXT_COMPRESSED
 from ..common import (
+    BINARY_DATA,
+    NON_ASCII_TEXT,
     SHORT_TEXT,
     LONG_TEXT_FILE,
     RANDOM_TEXT_FILE,
@@ -13,6 +17,7 @@ from ..common import (
     REPETITIVE_SINGLE_CHAR_TEXT_FILE,
     MEDIUM_SIZE,
     SHORT_SIZE,
+    PipeIO,
     check_roundtrip_integrity,
     check_compression_ratio,
 )
@@ -49,6 +54,42 @@ def test_compression_short_input(lzw: LZW):
     assert len(o.getvalue()) > 1
 
 
+def test_compression_short_input_format(lzw: LZW):
+    i = StringIO(SHORT_TEXT)
+    o = BytesIO()
+    lzw.compress(i, o)
+    assert o.getvalue() == SHORT_TEXT_COMPRESSED
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_chunked_compression_matches_whole_input(lzw: LZW, chunk_size: int):
+    with open(REPETITIVE_SENTENCE_TEXT_FILE, "r", encoding="ascii") as f:
+        text = f.read(MEDIUM_SIZE)
+
+    whole = BytesIO()
+    lzw.compress(StringIO(text), whole)
+
+    chunked_lzw = LZW()
+    chunked_lzw._CHUNK_SIZE = chunk_size
+    chunked = BytesIO()
+    chunked_lzw.compress(StringIO(text), chunked)
+
+    assert chunked.getvalue() == whole.getvalue()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 1000])
+def test_chunked_decompression(lzw: LZW, chunk_size: int):
+    text = SHORT_TEXT * 50
+    compressed = BytesIO()
+    lzw.compress(StringIO(text), compressed)
+    compressed.seek(0)
+
+    lzw._CHUNK_SIZE = chunk_size
+    o = StringIO()
+    lzw.decompress(compressed, o)
+    assert o.getvalue() == text
+
+
 @pytest.mark.parametrize(
     "test_file",
     [
@@ -96,3 +137,163 @@ def test_compression_ratio(
         test_file_path=test_file,
         ratio_range=ratio_range,
     )
+
+
+@pytest.mark.parametrize("max_code_size", [9, 12, 16])
+@pytest.mark.parametrize(
+    "test_file",
+    [
+        (LONG_TEXT_FILE),
+        (REPETITIVE_SENTENCE_TEXT_FILE),
+        (REPETITIVE_SINGLE_CHAR_TEXT_FILE),
+        (RANDOM_TEXT_FILE),
+    ],
+)
+def test_variable_width_roundtrip(tmp_path: Path, test_file: Path, max_code_size: int):
+    lzw = LZW(variable_width=True, max_code_size=max_code_size)
+    assert check_roundtrip_integrity(method=lzw, tmp_path=tmp_path, test_file=test_file)
+
+
+def test_variable_width_header(lzw: LZW):
+    o = BytesIO()
+    LZW(variable_width=True, max_code_size=13).compress(StringIO(SHORT_TEXT), o)
+    assert o.getvalue()[0] == 0x80 | 13
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 1000])
+def test_variable_width_dictionary_clear(lzw: LZW, chunk_size: int):
+    # Alternate between inputs with very different phrases,
+    # so that the ratio degrades and the dictionary gets cleared.
+    with open(REPETITIVE_SENTENCE_TEXT_FILE, "r", encoding="ascii") as f:
+        sentences = f.read(5000)
+    text = (sentences + "0123456789" * 500) * 4
+
+    compressing_lzw = LZW(variable_width=True, max_code_size=9)
+    compressing_lzw._CHUNK_SIZE = chunk_size
+    compressed = BytesIO()
+    compressing_lzw.compress(StringIO(text), compressed)
+    compressed.seek(0)
+
+    o = StringIO()
+    lzw.decompress(compressed, o)
+    assert o.getvalue() == text
+
+
+def test_variable_width_smaller_than_fixed(lzw: LZW):
+    with open(REPETITIVE_SENTENCE_TEXT_FILE, "r", encoding="ascii") as f:
+        text = f.read(MEDIUM_SIZE)
+
+    fixed = BytesIO()
+    lzw.compress(StringIO(text), fixed)
+    variable = BytesIO()
+    LZW(variable_width=True).compress(StringIO(text), variable)
+    assert len(variable.getvalue()) < len(fixed.getvalue())
+
+
+def test_invalid_max_code_size():
+    with pytest.raises(ValueError):
+        LZW(variable_width=True, max_code_size=8)
+    with pytest.raises(ValueError):
+        LZW(variable_width=True, max_code_size=17)
+
+
+@pytest.mark.parametrize("header", [b"\x08", b"\x80", b"\x91"])
+def test_decompression_invalid_header(lzw: LZW, header: bytes):
+    with pytest.raises(CompressionMethodError, match="Invalid input file header"):
+        lzw.decompress(BytesIO(header + b"\x00\x00"), StringIO())
+
+
+@pytest.mark.parametrize("lzw", [LZW(), LZW(variable_width=True, max_code_size=9)])
+def test_roundtrip_binary_data(lzw: LZW):
+    compressed = lzw.compress_bytes(BINARY_DATA)
+    assert lzw.decompress_bytes(compressed) == BINARY_DATA
+
+
+def test_roundtrip_non_ascii_text(lzw: LZW):
+    compressed = BytesIO()
+    lzw.compress(StringIO(NON_ASCII_TEXT), compressed)
+    assert compressed.getvalue() == lzw.compress_bytes(NON_ASCII_TEXT.encode("utf-8"))
+
+    compressed.seek(0)
+    o = StringIO()
+    lzw.decompress(compressed, o)
+    assert o.getvalue() == NON_ASCII_TEXT
+
+
+def test_decompression_binary_data_as_text(lzw: LZW):
+    compressed = lzw.compress_bytes(b"abc\xff")
+    with pytest.raises(CompressionMethodError, match="not utf-8 text"):
+        lzw.decompress(BytesIO(compressed), StringIO())
+
+
+@pytest.mark.parametrize(
+    "lzw", [LZW(), LZW(variable_width=True), LZW(variable_width=True, max_code_size=9)]
+)
+def test_compressor_objects(lzw: LZW):
+    text = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[:20_000]
+    # A long input filling the dictionary, followed by short ones reusing it
+    inputs = [text, b"abcabcabc", BINARY_DATA[:1000], text[:500], b"", b"x"]
+
+    compressor = lzw.compressor()
+    decompressor = lzw.decompressor()
+    for data in inputs:
+        compressed = compressor.compress(data)
+        assert compressed == lzw.compress_bytes(data)
+        if data:
+            assert decompressor.decompress(compressed) == data
+
+    compressor.reset()
+    decompressor.reset()
+    assert decompressor.decompress(compressor.compress(text)) == text
+
+
+@pytest.mark.parametrize(
+    "lzw", [LZW(), LZW(variable_width=True)], ids=["fixed", "variable_width"]
+)
+def test_non_seekable_streams(lzw: LZW):
+    data = NON_ASCII_TEXT.encode() + BINARY_DATA
+
+    bin_out = PipeIO()
+    lzw.compress_stream(PipeIO(data), bin_out)
+    # The padding length in the fixed width header cannot be filled in without seeking
+    assert bin_out.getvalue()[1:] == lzw.compress_bytes(data)[1:]
+
+    decompressed = PipeIO()
+    lzw.decompress_stream(PipeIO(bin_out.getvalue()), decompressed)
+    assert decompressed.getvalue() == data
+
+
+def test_non_seekable_text(lzw: LZW):
+    text_in = TextIOWrapper(
+        PipeIO(NON_ASCII_TEXT.encode()), encoding="utf-8", newline=""
+    )
+    compressed = BytesIO()
+    lzw.compress(text_in, compressed)
+    assert compressed.getvalue() == lzw.compress_bytes(NON_ASCII_TEXT.encode())
+
+    text_out = StringIO()
+    lzw.decompress(BytesIO(compressed.getvalue()), text_out)
+    assert text_out.getvalue() == NON_ASCII_TEXT
+
+
+@pytest.mark.parametrize(
+    "lzw", [LZW(), LZW(variable_width=True)], ids=["fixed", "variable_width"]
+)
+def test_stats(lzw: LZW):
+    data = NON_ASCII_TEXT.encode() + BINARY_DATA
+
+    bin_out = BytesIO()
+    stats = lzw.compress_stream(BytesIO(data), bin_out)
+    assert (stats.method, stats.operation) == ("LZW", "compress")
+    assert (stats.bytes_in, stats.bytes_out) == (len(data), len(bin_out.getvalue()))
+    assert set(stats.wall_time) == {"encode", "pack", "write"}
+    assert 0 < stats.counters["dictionary_size"] <= stats.counters["dictionary_capacity"]
+
+    decompressed = BytesIO()
+    decompress_stats = lzw.decompress_stream(BytesIO(bin_out.getvalue()), decompressed)
+    assert (decompress_stats.bytes_in, decompress_stats.bytes_out) == (
+        len(bin_out.getvalue()),
+        len(data),
+    )
+    assert {"header", "pack", "decode"} <= set(decompress_stats.wall_time)
+    assert decompress_stats.counters == stats.counters
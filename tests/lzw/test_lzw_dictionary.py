@@ -0,0 +1,125 @@
+import pytest
+
+from compressor.compression_methods import LZW, LZWDictionary
+from compressor.compression_methods.interface import CompressionMethodError
+
+from ..common import BINARY_DATA, REPETITIVE_SENTENCE_TEXT_FILE, SHORT_SIZE
+
+
+@pytest.fixture
+def dictionary():
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()
+    return LZWDictionary.train([data[i : i + 1000] for i in range(0, 50_000, 1000)])
+
+
+def test_train_phrases_prefix_closed(dictionary: LZWDictionary):
+    assert len(dictionary) == LZWDictionary.DEFAULT_SIZE
+
+    phrases = set()
+    for phrase in dictionary.phrases:
+        assert len(phrase) == 2 or phrase[:-1] in phrases
+        phrases.add(phrase)
+
+
+def test_train_small_samples():
+    dictionary = LZWDictionary.train([b"abababab", b""], size=100)
+    assert dictionary.phrases[:2] == [b"ab", b"ba"]
+    assert len(dictionary) < 100
+
+
+def test_invalid_phrases():
+    with pytest.raises(ValueError, match="earlier phrase"):
+        LZWDictionary([b"abc"])
+    with pytest.raises(ValueError, match="at least 2 bytes"):
+        LZWDictionary([b"a"])
+
+
+def test_trie():
+    dictionary = LZWDictionary([b"ab", b"abc"])
+    assert dictionary.trie(256) == {ord("a") << 8 | ord("b"): 256, 256 << 8 | ord("c"): 257}
+    assert dictionary.trie(257) == {ord("a") << 8 | ord("b"): 257, 257 << 8 | ord("c"): 258}
+
+
+def test_to_bytes_roundtrip(dictionary: LZWDictionary):
+    loaded = LZWDictionary.from_bytes(dictionary.to_bytes())
+    assert loaded.phrases == dictionary.phrases
+    assert loaded.dict_id == dictionary.dict_id
+
+
+@pytest.mark.parametrize(
+    "data, match",
+    [
+        (b"XXXX\x01", "invalid header"),
+        (b"CMPL\x02", "version"),
+        (b"CMPL\x01\x00\x02\x00\x61\x62", "size mismatch"),
+        (b"CMPL\x01\x00\x01\x01\x00\x62", "invalid prefix"),
+    ],
+)
+def test_from_bytes_invalid(data: bytes, match: str):
+    with pytest.raises(CompressionMethodError, match=match):
+        LZWDictionary.from_bytes(data)
+
+
+@pytest.mark.parametrize("variable_width", [False, True])
+@pytest.mark.parametrize(
+    "data",
+    [b"a", b"abab", BINARY_DATA, REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[-SHORT_SIZE:]],
+)
+def test_roundtrip(dictionary: LZWDictionary, variable_width: bool, data: bytes):
+    lzw = LZW(variable_width=variable_width, dictionary=dictionary)
+    compressed = lzw.compress_bytes(data)
+    assert compressed[0] & 0x40
+    assert int.from_bytes(compressed[1:5], byteorder="big") == dictionary.dict_id
+    assert lzw.decompress_bytes(compressed) == data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100, 1000])
+def test_variable_width_dictionary_clear(chunk_size: int):
+    # Like in test_lzw, but the dictionary is reset to the primed phrases
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[:5000]
+    data = (data + b"0123456789" * 500) * 4
+    dictionary = LZWDictionary.train([data[:1000]], size=200)
+
+    lzw = LZW(variable_width=True, max_code_size=9, dictionary=dictionary)
+    lzw._CHUNK_SIZE = chunk_size
+    assert lzw.decompress_bytes(lzw.compress_bytes(data)) == data
+
+
+def test_primed_smaller_for_small_input(dictionary: LZWDictionary):
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[-SHORT_SIZE:]
+    primed = LZW(dictionary=dictionary).compress_bytes(data)
+    assert len(primed) < len(LZW().compress_bytes(data)) / 2
+
+
+def test_decompression_without_dictionary(dictionary: LZWDictionary):
+    compressed = LZW(dictionary=dictionary).compress_bytes(b"abc")
+    with pytest.raises(CompressionMethodError, match="needed for decompression"):
+        LZW().decompress_bytes(compressed)
+
+
+def test_decompression_with_other_dictionary(dictionary: LZWDictionary):
+    compressed = LZW(dictionary=dictionary).compress_bytes(b"abc")
+    other = LZWDictionary.train([b"abcabcabc"])
+    with pytest.raises(CompressionMethodError, match="but dictionary"):
+        LZW(dictionary=other).decompress_bytes(compressed)
+
+
+def test_dictionary_too_large(dictionary: LZWDictionary):
+    with pytest.raises(ValueError, match="does not fit"):
+        LZW(variable_width=True, max_code_size=10, dictionary=dictionary)
+    with pytest.raises(ValueError):
+        LZWDictionary.train([b"abc"], size=0)
+    with pytest.raises(ValueError, match="between 1 and"):
+        LZWDictionary.train([b"abc"], size=LZWDictionary.MAX_SIZE + 1)
+
+
+@pytest.mark.parametrize("variable_width", [False, True])
+def test_decompressor_object(dictionary: LZWDictionary, variable_width: bool):
+    lzw = LZW(variable_width=variable_width, dictionary=dictionary)
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()
+
+    decompressor = lzw.decompressor()
+    # Unprimed input first, so the cached dictionaries must be kept apart
+    assert decompressor.decompress(LZW(variable_width).compress_bytes(b"abab")) == b"abab"
+    for message in [data[:20_000], b"abc", data[-SHORT_SIZE:]]:
+        assert decompressor.decompress(lzw.compress_bytes(message)) == message
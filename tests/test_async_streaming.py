@@ -0,0 +1,181 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+from time import sleep
+from pytest import mark, raises
+
+from compressor import streaming
+from compressor.async_streaming import (
+    AsyncCompressWriter,
+    AsyncDecompressReader,
+    CompressionPool,
+    compress_stream,
+    decompress_stream,
+)
+from compressor.block_container import BlockContainerError
+from compressor.compression_methods import LZW, Huffman
+from compressor.compression_methods.interface import (
+    CompressionMethod,
+    CompressionMethodError,
+)
+
+from .common import BINARY_DATA, NON_ASCII_TEXT
+
+DATA = NON_ASCII_TEXT.encode() + BINARY_DATA
+
+
+class BytesWriter:
+    """Collects the written data, like a `StreamWriter` to a fast peer."""
+
+    def __init__(self) -> None:
+        self.output = BytesIO()
+
+    def write(self, data: bytes) -> None:
+        self.output.write(data)
+
+    async def drain(self) -> None:
+        await asyncio.sleep(0)
+
+
+def stream_reader(data: bytes) -> asyncio.StreamReader:
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+def thread_pool(max_jobs: int = 4) -> CompressionPool:
+    return CompressionPool(ThreadPoolExecutor(4), max_jobs=max_jobs)
+
+
+async def roundtrip(
+    method: CompressionMethod, pool: CompressionPool, block_size: int | None
+) -> tuple[bytes, bytes]:
+    compressed = BytesWriter()
+    await compress_stream(stream_reader(DATA), compressed, method, pool, block_size)
+    decompressed = BytesWriter()
+    await decompress_stream(
+        stream_reader(compressed.output.getvalue()), decompressed, method, pool
+    )
+    return compressed.output.getvalue(), decompressed.output.getvalue()
+
+
+@mark.parametrize(
+    "method, block_size",
+    [(LZW(), None), (LZW(variable_width=True), 1000), (Huffman(), 1000), (Huffman(), None)],
+    ids=["lzw", "lzw_blocks", "huffman_blocks", "huffman_default_blocks"],
+)
+def test_async_roundtrip(method: CompressionMethod, block_size: int | None):
+    _, decompressed = asyncio.run(roundtrip(method, thread_pool(), block_size))
+    assert decompressed == DATA
+
+
+def test_async_roundtrip_process_pool():
+    async def run() -> tuple[bytes, bytes]:
+        async with CompressionPool(max_jobs=2) as pool:
+            return await roundtrip(Huffman(), pool, 2000)
+
+    compressed, decompressed = asyncio.run(run())
+    assert decompressed == DATA
+    # Readable by the synchronous API too
+    decompressobj = streaming.decompressobj(Huffman())
+    assert decompressobj.decompress(compressed) + decompressobj.flush() == DATA
+
+
+def test_async_output_matches_streaming():
+    compressed, _ = asyncio.run(roundtrip(Huffman(), thread_pool(), 1000))
+
+    compressobj = streaming.compressobj(Huffman(), block_size=1000)
+    assert compressed == compressobj.compress(DATA) + compressobj.flush()
+
+
+def test_async_pool_bounds_jobs():
+    lock = Lock()
+    running = 0
+    max_running = 0
+
+    def job() -> None:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        sleep(0.01)
+        with lock:
+            running -= 1
+
+    async def run() -> None:
+        pool = CompressionPool(ThreadPoolExecutor(8), max_jobs=3)
+        await asyncio.gather(*(pool.run(job) for _ in range(20)))
+
+    asyncio.run(run())
+    assert max_running == 3
+
+
+def test_async_compress_writer_window():
+    async def run() -> int:
+        pool = thread_pool()
+        writer = AsyncCompressWriter(BytesWriter(), Huffman(), pool, 100, window=2)
+        max_in_flight = 0
+        for i in range(0, len(DATA), 250):
+            await writer.write(DATA[i : i + 250])
+            max_in_flight = max(max_in_flight, len(writer._jobs))
+        await writer.finish()
+        return max_in_flight
+
+    assert asyncio.run(run()) == 2
+
+
+def test_async_many_concurrent_streams():
+    async def run() -> list[bytes]:
+        pool = thread_pool(max_jobs=2)
+        return [
+            decompressed
+            for _, decompressed in await asyncio.gather(
+                *(roundtrip(Huffman(), pool, 500) for _ in range(10))
+            )
+        ]
+
+    assert asyncio.run(run()) == [DATA] * 10
+
+
+def test_async_message_helpers():
+    async def run() -> bytes:
+        pool = thread_pool()
+        return await pool.decompress(LZW(), await pool.compress(LZW(), DATA))
+
+    assert asyncio.run(run()) == DATA
+
+
+def test_async_truncated_stream():
+    async def run() -> None:
+        compressed, _ = await roundtrip(Huffman(), thread_pool(), 1000)
+        reader = stream_reader(compressed[: len(compressed) // 2])
+        async with AsyncDecompressReader(reader, Huffman(), thread_pool()) as decompress:
+            async for _ in decompress:
+                pass
+
+    with raises(BlockContainerError):
+        asyncio.run(run())
+
+
+def test_async_huffman_single_stream():
+    async def run() -> None:
+        reader = stream_reader(Huffman().compress_bytes(DATA))
+        await decompress_stream(reader, BytesWriter(), Huffman(), thread_pool())
+
+    with raises(CompressionMethodError):
+        asyncio.run(run())
+
+
+def test_async_invalid_arguments():
+    with raises(ValueError):
+        CompressionPool(ThreadPoolExecutor(1), max_jobs=0)
+    with raises(ValueError):
+        AsyncCompressWriter(BytesWriter(), LZW(), thread_pool(), block_size=0)
+
+    async def run() -> None:
+        AsyncDecompressReader(stream_reader(b""), LZW(), thread_pool(), window=0)
+
+    with raises(ValueError):
+        asyncio.run(run())
@@ -0,0 +1,67 @@
+import pytest
+from bitarray import bitarray
+
+from compressor.compression_methods.code_packing import (
+    CodePacker,
+    CodeUnpacker,
+    pack_codes,
+    unpack_codes,
+)
+
+
+@pytest.mark.parametrize("code_size", [1, 8, 9, 12, 16, 17, 32, 64])
+def test_pack_unpack_roundtrip(code_size: int):
+    codes = [0, 1, 2**code_size - 1] + [i % 2**code_size for i in range(0, 5000, 7)]
+    bits = pack_codes(codes, code_size)
+    assert len(bits) == len(codes) * code_size
+    assert unpack_codes(bits, code_size) == codes
+
+
+def test_pack_codes_bit_order():
+    assert pack_codes([1, 4095, 256], 12) == bitarray(
+        "000000000001" + "111111111111" + "000100000000"
+    )
+
+
+def test_unpack_codes_ignores_incomplete_code():
+    bits = pack_codes([5, 6], 12) + bitarray("1111")
+    assert unpack_codes(bits, 12) == [5, 6]
+
+
+def test_pack_code_too_large():
+    with pytest.raises(ValueError):
+        pack_codes([4096], 12)
+    with pytest.raises(ValueError):
+        pack_codes([2**16], 16)
+
+
+def test_code_packer_matches_single_pack():
+    codes = list(range(0, 4096, 3))
+    packer = CodePacker()
+    packed = b"".join(packer.pack(codes[i : i + 5], 12) for i in range(0, len(codes), 5))
+    remaining, padding_len = packer.flush()
+    packed += remaining
+
+    bits = pack_codes(codes, 12)
+    assert padding_len == bits.padbits
+    assert packed == bits.tobytes()
+
+
+def test_code_unpacker_partial_input():
+    data = pack_codes(list(range(101)), 12).tobytes()
+    unpacker = CodeUnpacker()
+    codes: list[int] = []
+    for byte in data:
+        unpacker.feed(bytes([byte]))
+        codes += unpacker.unpack(12)
+    assert codes == list(range(101))
+    assert len(unpacker) == 4
+
+
+def test_code_unpacker_count_and_unread():
+    unpacker = CodeUnpacker()
+    unpacker.feed(pack_codes([1, 2, 3, 4], 16).tobytes())
+    assert unpacker.unpack(16, count=3) == [1, 2, 3]
+    unpacker.unread([2, 3], 16)
+    assert unpacker.unpack(16) == [2, 3, 4]
+    assert len(unpacker) == 0
@@ -1,12 +1,40 @@
+import logging
+import random
+import subprocess
+import sys
+from io import TextIOWrapper
 from pathlib import Path
+from typing import Any, Callable, Iterable
 import filecmp
 from os import path
-from pytest import fixture, raises
+from pytest import fixture, mark, raises
 
-from compressor.file_compressor import FileCompressor, FileCompressionError
-from compressor.compression_methods import LZW, Huffman
+from compressor.cli import run
+from compressor import file_compressor
+from compressor.file_compressor import (
+    FileCompressor,
+    FileCompressionError,
+    IOBackend,
+    STDIO_PATH,
+    batch_inputs,
+)
+from compressor.compression_methods import (
+    LZW,
+    CompressionStats,
+    Huffman,
+    HuffmanDictionary,
+    LZWDictionary,
+)
+from compressor.compression_methods.interface import CompressionMethod
+from compressor.utils.logging import configure, logfile
 
-from .common import LONG_TEXT_FILE
+from .common import (
+    BINARY_DATA,
+    LONG_TEXT_FILE,
+    NON_ASCII_TEXT,
+    REPETITIVE_SENTENCE_TEXT_FILE,
+    PipeIO,
+)
 
 
 @fixture
@@ -92,3 +120,589 @@ def test_file_compressor_input_file_not_exists(tmp_path: Path, fc: FileCompresso
     # Make sure neither file was created
     assert not path.exists(i_file)
     assert not path.exists(o_file)
+
+
+@mark.parametrize("method", [Huffman(), LZW(), LZW(variable_width=True)])
+@mark.parametrize("workers", [1, 2])
+def test_file_compressor_block_mode_roundtrip(
+    tmp_path: Path, method: CompressionMethod, workers: int
+):
+    fc = FileCompressor(block_size=64 * 1024, workers=workers)
+
+    tmp_compressed = tmp_path / "compressed"
+    tmp_decompressed = tmp_path / "decompressed.txt"
+
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, method)
+    with open(tmp_compressed, "rb") as f:
+        assert f.read(4) == b"CMPB"
+
+    # Block mode files are detected without a block size being given
+    FileCompressor(workers=workers).decompress(tmp_compressed, tmp_decompressed, method)
+
+    assert filecmp.cmp(REPETITIVE_SENTENCE_TEXT_FILE, tmp_decompressed)
+
+
+@mark.parametrize("method", [Huffman(), LZW()])
+@mark.parametrize("workers", [1, 2])
+def test_file_compressor_block_mode_roundtrip_mmap(
+    tmp_path: Path, method: CompressionMethod, workers: int
+):
+    fc = FileCompressor(block_size=64 * 1024, workers=workers, io_backend="mmap")
+
+    tmp_compressed = tmp_path / "compressed"
+    tmp_decompressed = tmp_path / "decompressed.txt"
+
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, method)
+    fc.decompress(tmp_compressed, tmp_decompressed, method)
+
+    assert filecmp.cmp(REPETITIVE_SENTENCE_TEXT_FILE, tmp_decompressed)
+
+    # The container is the same regardless of the backend
+    tmp_compressed_stream = tmp_path / "compressed_stream"
+    FileCompressor(block_size=64 * 1024, workers=1).compress(
+        REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed_stream, method
+    )
+    assert filecmp.cmp(tmp_compressed, tmp_compressed_stream)
+
+
+@mark.parametrize("io_backend", ["stream", "mmap"])
+def test_file_compressor_mmap_skips_stream_reads(
+    tmp_path: Path, monkeypatch: Any, io_backend: IOBackend
+):
+    # With mmap, the blocks reach the method as views of the mapped files instead of
+    # being read from the files
+    stream_reads: list[str] = []
+    block_types: list[type] = []
+    read_blocks = FileCompressor._read_blocks
+    decompress_blocks = FileCompressor._decompress_blocks
+    compress_block = file_compressor._compress_block
+    decompress_block = file_compressor._decompress_block
+
+    def record_read_blocks(self: FileCompressor, bin_in: Any) -> Iterable[bytes]:
+        stream_reads.append("compress")
+        return read_blocks(self, bin_in)
+
+    def record_decompress_blocks(self: FileCompressor, *args: Any) -> CompressionStats:
+        stream_reads.append("decompress")
+        return decompress_blocks(self, *args)
+
+    def record_compress_block(method: CompressionMethod, block: Any) -> Any:
+        block_types.append(type(block))
+        return compress_block(method, block)
+
+    def record_decompress_block(method: CompressionMethod, block: Any, data: Any) -> Any:
+        block_types.append(type(data))
+        return decompress_block(method, block, data)
+
+    monkeypatch.setattr(FileCompressor, "_read_blocks", record_read_blocks)
+    monkeypatch.setattr(FileCompressor, "_decompress_blocks", record_decompress_blocks)
+    monkeypatch.setattr(file_compressor, "_compress_block", record_compress_block)
+    monkeypatch.setattr(file_compressor, "_decompress_block", record_decompress_block)
+
+    fc = FileCompressor(block_size=4096, workers=1, io_backend=io_backend)
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_path / "compressed", LZW())
+    fc.decompress(tmp_path / "compressed", tmp_path / "decompressed.txt", LZW())
+    assert filecmp.cmp(REPETITIVE_SENTENCE_TEXT_FILE, tmp_path / "decompressed.txt")
+
+    if io_backend == "mmap":
+        assert stream_reads == []
+        assert set(block_types) == {memoryview}
+    else:
+        assert stream_reads == ["compress", "decompress"]
+        assert set(block_types) == {bytes}
+
+
+@mark.parametrize("method", [Huffman(), LZW()])
+def test_file_compressor_roundtrip_binary_data(tmp_path: Path, method: CompressionMethod):
+    fc = FileCompressor()
+
+    i_file = tmp_path / "i_file"
+    tmp_compressed = tmp_path / "compressed"
+    tmp_decompressed = tmp_path / "decompressed"
+    i_file.write_bytes(BINARY_DATA)
+
+    fc.compress(i_file, tmp_compressed, method)
+    fc.decompress(tmp_compressed, tmp_decompressed, method)
+
+    assert filecmp.cmp(i_file, tmp_decompressed)
+
+
+@mark.parametrize("method", [Huffman(), LZW()])
+@mark.parametrize("io_backend", ["stream", "mmap"])
+@mark.parametrize("block_size", [1, 2, 3, 5, 7])
+def test_file_compressor_block_mode_multibyte_chars(
+    tmp_path: Path, block_size: int, io_backend: IOBackend, method: CompressionMethod
+):
+    fc = FileCompressor(block_size=block_size, workers=1, io_backend=io_backend)
+
+    i_file = tmp_path / "i_file"
+    tmp_compressed = tmp_path / "compressed"
+    tmp_decompressed = tmp_path / "decompressed.txt"
+    with open(i_file, "w", encoding="utf-8", newline="") as i:
+        # Blocks are cut in the middle of chars
+        i.write(NON_ASCII_TEXT[:50])
+
+    fc.compress(i_file, tmp_compressed, method)
+    fc.decompress(tmp_compressed, tmp_decompressed, method)
+
+    assert filecmp.cmp(i_file, tmp_decompressed)
+
+
+@mark.parametrize("io_backend", ["stream", "mmap"])
+def test_file_compressor_block_mode_empty_input(tmp_path: Path, io_backend: IOBackend):
+    fc = FileCompressor(block_size=1024, workers=1, io_backend=io_backend)
+    method = LZW()
+
+    i_file = tmp_path / "i_file"
+    i_file.touch()
+    tmp_compressed = tmp_path / "compressed"
+    tmp_decompressed = tmp_path / "decompressed.txt"
+
+    fc.compress(i_file, tmp_compressed, method)
+    fc.decompress(tmp_compressed, tmp_decompressed, method)
+
+    assert tmp_decompressed.read_bytes() == b""
+
+
+def test_file_compressor_block_mode_truncated_file(tmp_path: Path):
+    fc = FileCompressor(block_size=64 * 1024, workers=1)
+    method = LZW()
+
+    tmp_compressed = tmp_path / "compressed"
+    tmp_truncated = tmp_path / "truncated"
+    tmp_decompressed = tmp_path / "decompressed.txt"
+
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, method)
+    tmp_truncated.write_bytes(tmp_compressed.read_bytes()[:-1])
+
+    with raises(FileCompressionError, match="Invalid block container"):
+        fc.decompress(tmp_truncated, tmp_decompressed, method)
+
+
+@mark.parametrize(
+    "start,length",
+    [(0, 10), (0, 64 * 1024), (64 * 1024 - 5, 10), (100_000, 200_000), (5, 0)],
+)
+def test_file_compressor_read_range(tmp_path: Path, start: int, length: int):
+    fc = FileCompressor(block_size=64 * 1024, workers=1)
+    tmp_compressed = tmp_path / "compressed"
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, LZW())
+
+    expected = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[start : start + length]
+    assert fc.read_range(tmp_compressed, start, length) == expected
+
+
+def test_file_compressor_read_range_past_end(tmp_path: Path):
+    fc = FileCompressor(block_size=1024, workers=1)
+    tmp_compressed = tmp_path / "compressed"
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, Huffman())
+
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()
+    assert fc.read_range(tmp_compressed, len(data) - 3, 10) == data[-3:]
+    assert fc.read_range(tmp_compressed, len(data) + 10, 10) == b""
+
+
+@mark.parametrize("block_size", [None, 1000])
+def test_file_compressor_stats(tmp_path: Path, block_size: int | None):
+    reported: list[CompressionStats] = []
+    fc = FileCompressor(block_size=block_size, workers=2, stats_hook=reported.append)
+    tmp_compressed = tmp_path / "compressed.huffman"
+
+    stats = fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, Huffman())
+    assert reported == [stats]
+    assert stats.bytes_in == path.getsize(REPETITIVE_SENTENCE_TEXT_FILE)
+    assert stats.bytes_out == path.getsize(tmp_compressed)
+    assert stats.total_wall_time is not None and stats.total_wall_time > 0
+    assert "encode" in stats.wall_time
+    if block_size is not None:
+        assert stats.counters["blocks"] == -(-stats.bytes_in // block_size)
+
+    stats = fc.decompress(tmp_compressed, tmp_path / "decompressed.txt", Huffman())
+    assert reported[1] is stats
+    assert (stats.operation, stats.bytes_out) == ("decompress", reported[0].bytes_in)
+    assert stats.counters["symbols"] == reported[0].counters["symbols"]
+
+
+def test_file_compressor_stats_hook_error(tmp_path: Path):
+    def hook(stats: CompressionStats) -> None:
+        raise RuntimeError("hook failed")
+
+    fc = FileCompressor(stats_hook=hook)
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_path / "compressed.lzw", LZW())
+    assert (tmp_path / "compressed.lzw").exists()
+
+
+def test_compression_stats_merge():
+    stats = CompressionStats("LZW", "compress")
+    for size in (10, 20):
+        block_stats = CompressionStats("LZW", "compress")
+        block_stats.add_time("encode", 1.0, 0.5)
+        block_stats.bytes_in = size
+        block_stats.add_count("symbols", size)
+        block_stats.set_max("dictionary_size", size)
+        stats.merge(block_stats)
+
+    assert stats.to_dict() == {
+        "method": "LZW",
+        "operation": "compress",
+        "bytes_in": 30,
+        "bytes_out": 0,
+        "wall_s": None,
+        "cpu_s": None,
+        "stages": {"encode": {"wall_s": 2.0, "cpu_s": 1.0}},
+        "counters": {"symbols": 30, "dictionary_size": 20},
+    }
+
+
+def test_file_compressor_read_range_not_block_compressed(tmp_path: Path):
+    fc = FileCompressor()
+    tmp_compressed = tmp_path / "compressed"
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, LZW())
+
+    with raises(FileCompressionError, match="not block compressed"):
+        fc.read_range(tmp_compressed, 0, 10)
+
+
+def test_file_compressor_block_mode_checksum_mismatch(tmp_path: Path):
+    fc = FileCompressor(block_size=64 * 1024, workers=1)
+    tmp_compressed = tmp_path / "compressed"
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, LZW())
+
+    # Flip a bit in the checksum of the first index entry, its last byte
+    data = bytearray(tmp_compressed.read_bytes())
+    index_offset = int.from_bytes(data[-8:], byteorder="big")
+    data[index_offset + 36] ^= 1
+    tmp_compressed.write_bytes(data)
+
+    with raises(FileCompressionError, match="checksum mismatch"):
+        fc.read_range(tmp_compressed, 0, 10)
+    with raises(FileCompressionError, match="checksum mismatch"):
+        fc.decompress(tmp_compressed, tmp_path / "decompressed.txt", LZW())
+
+
+def test_file_compressor_invalid_block_mode_args():
+    with raises(ValueError):
+        FileCompressor(block_size=0)
+    with raises(ValueError):
+        FileCompressor(workers=0)
+    with raises(ValueError):
+        FileCompressor(io_backend="bad")  # type: ignore[arg-type]
+
+
+@mark.parametrize(
+    "train, create_method",
+    [
+        (HuffmanDictionary.train, lambda d: Huffman(dictionary=d)),
+        (LZWDictionary.train, lambda d: LZW(dictionary=d)),
+    ],
+)
+def test_file_compressor_train_dictionary(
+    tmp_path: Path,
+    train: Callable[[Iterable[bytes]], HuffmanDictionary | LZWDictionary],
+    create_method: Callable[[Any], CompressionMethod],
+):
+    fc = FileCompressor(block_size=4 * 1024, workers=2)
+    samples = tmp_path / "samples"
+    (samples / "nested").mkdir(parents=True)
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()
+    (samples / "a.txt").write_bytes(data[:10_000])
+    (samples / "nested" / "b.txt").write_bytes(data[10_000:20_000])
+
+    dictionary = fc.train_dictionary(samples, tmp_path / "dict", train)
+    assert type(dictionary).load(tmp_path / "dict").dict_id == dictionary.dict_id
+
+    # Block mode, blocks decompressed in worker processes
+    tmp_compressed = tmp_path / "compressed"
+    tmp_decompressed = tmp_path / "decompressed.txt"
+    method = create_method(dictionary)
+    fc.compress(REPETITIVE_SENTENCE_TEXT_FILE, tmp_compressed, method)
+    fc.decompress(tmp_compressed, tmp_decompressed, method)
+    assert filecmp.cmp(REPETITIVE_SENTENCE_TEXT_FILE, tmp_decompressed)
+
+    with raises(FileCompressionError, match="already exists"):
+        fc.train_dictionary(samples, tmp_path / "dict", train)
+    with raises(FileCompressionError, match="needed for decompression"):
+        fc.decompress(tmp_compressed, tmp_path / "decompressed2.txt", type(method)())
+
+
+@fixture
+def batch_dir(tmp_path: Path) -> Path:
+    """Directory of files to compress in a batch, also in a subdirectory."""
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()
+    input_dir = tmp_path / "input"
+    (input_dir / "nested").mkdir(parents=True)
+    (input_dir / "a.txt").write_bytes(data[:10_000])
+    (input_dir / "b.bin").write_bytes(BINARY_DATA)
+    (input_dir / "nested" / "c.txt").write_bytes(NON_ASCII_TEXT.encode())
+    return input_dir
+
+
+@mark.parametrize("workers", [1, 2])
+@mark.parametrize("block_size", [None, 1000])
+def test_file_compressor_batch_roundtrip(
+    tmp_path: Path, batch_dir: Path, workers: int, block_size: int | None
+):
+    reported: list[CompressionStats] = []
+    fc = FileCompressor(block_size=block_size, workers=workers, stats_hook=reported.append)
+    inputs = batch_inputs([str(batch_dir)])
+
+    results = fc.compress_batch(inputs, tmp_path / "compressed", Huffman(), ".huffman")
+    assert reported == [result.stats for result in results]
+    assert [result.output_path for result in results] == [
+        tmp_path / "compressed" / relative.with_name(relative.name + ".huffman")
+        for _, relative in inputs
+    ]
+    assert sum(result.input_size for result in results) == sum(
+        file.stat().st_size for file, _ in inputs
+    )
+
+    fc.decompress_batch(
+        batch_inputs([str(tmp_path / "compressed")]),
+        tmp_path / "decompressed",
+        Huffman(),
+        ".huffman",
+    )
+    for file, relative in inputs:
+        assert filecmp.cmp(file, tmp_path / "decompressed" / relative, shallow=False)
+
+
+def test_file_compressor_batch_failures(tmp_path: Path, batch_dir: Path):
+    fc = FileCompressor(workers=2)
+    output_dir = tmp_path / "compressed"
+    output_dir.mkdir()
+    (output_dir / "a.txt.lzw").write_bytes(b"existing")
+
+    inputs = batch_inputs([str(batch_dir / "*.*")])
+    with raises(FileCompressionError, match="1 of 2 files failed"):
+        fc.compress_batch(inputs, output_dir, LZW(), ".lzw")
+
+    # The other files are compressed, and the existing file is left as it was
+    assert (output_dir / "a.txt.lzw").read_bytes() == b"existing"
+    assert LZW().decompress_bytes((output_dir / "b.bin.lzw").read_bytes()) == BINARY_DATA
+
+    # Invalid compressed files fail without leaving partial output behind
+    with raises(FileCompressionError, match="2 of 2 files failed"):
+        fc.decompress_batch(
+            batch_inputs([str(batch_dir / "**" / "*.txt")]), tmp_path / "out", LZW(), ".lzw"
+        )
+    assert not (tmp_path / "out" / "a.txt").exists()
+
+
+def test_batch_inputs(tmp_path: Path, batch_dir: Path):
+    file_list = tmp_path / "list"
+    file_list.write_text(f"{batch_dir / 'a.txt'}\n\n{batch_dir / 'nested'}\n")
+
+    assert batch_inputs([f"@{file_list}", str(batch_dir / "**" / "a.txt")]) == [
+        (batch_dir / "a.txt", Path("a.txt")),
+        (batch_dir / "nested" / "c.txt", Path("c.txt")),
+    ]
+    assert batch_inputs([str(batch_dir / "**" / "*.txt")]) == [
+        (batch_dir / "a.txt", Path("a.txt")),
+        (batch_dir / "nested" / "c.txt", Path("c.txt")),
+    ]
+
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "a.txt").write_bytes(b"other")
+    with raises(FileCompressionError, match="same output path"):
+        batch_inputs([str(batch_dir), str(tmp_path / "other")])
+    with raises(FileCompressionError, match="No input files"):
+        batch_inputs([str(tmp_path / "missing*")])
+
+
+def pipe_stdio(monkeypatch: Any, stdin: bytes) -> PipeIO:
+    """Replaces stdin and stdout with pipes, returning the stdout pipe."""
+    stdout = PipeIO()
+    monkeypatch.setattr(sys, "stdin", TextIOWrapper(PipeIO(stdin)))
+    monkeypatch.setattr(sys, "stdout", TextIOWrapper(stdout))
+    return stdout
+
+
+@mark.parametrize(
+    "method", [Huffman(), Huffman(order=1), LZW(), LZW(variable_width=True)]
+)
+@mark.parametrize("block_size", [None, 1000])
+@mark.parametrize("workers", [1, 2])
+def test_file_compressor_stdio_roundtrip(
+    monkeypatch: Any,
+    method: CompressionMethod,
+    block_size: int | None,
+    workers: int,
+):
+    data = NON_ASCII_TEXT.encode() + BINARY_DATA
+    fc = FileCompressor(block_size=block_size, workers=workers)
+
+    stdout = pipe_stdio(monkeypatch, data)
+    fc.compress(STDIO_PATH, STDIO_PATH, method)
+    compressed = stdout.getvalue()
+
+    stdout = pipe_stdio(monkeypatch, compressed)
+    fc.decompress(STDIO_PATH, STDIO_PATH, method)
+    assert stdout.getvalue() == data
+
+
+@mark.parametrize("io_backend", ["stream", "mmap"])
+def test_file_compressor_stdio_to_files(
+    tmp_path: Path, monkeypatch: Any, io_backend: IOBackend
+):
+    data = NON_ASCII_TEXT.encode()
+    fc = FileCompressor(block_size=1000, workers=1, io_backend=io_backend)
+
+    tmp_compressed = tmp_path / "compressed"
+    pipe_stdio(monkeypatch, data)
+    fc.compress(STDIO_PATH, tmp_compressed, Huffman())
+
+    stdout = pipe_stdio(monkeypatch, b"")
+    fc.decompress(tmp_compressed, STDIO_PATH, Huffman())
+    assert stdout.getvalue() == data
+
+
+@mark.parametrize("workers", [1, 2])
+def test_file_compressor_stdio_block_method_from_container(
+    tmp_path: Path, monkeypatch: Any, workers: int
+):
+    # Blocks are decompressed with their own method, whether the container is read
+    # from a file, with the index, or from a pipe
+    data = NON_ASCII_TEXT.encode()
+    fc = FileCompressor(block_size=1000, workers=workers)
+    tmp_compressed = tmp_path / "compressed"
+    pipe_stdio(monkeypatch, data)
+    fc.compress(STDIO_PATH, tmp_compressed, LZW())
+
+    stdout = pipe_stdio(monkeypatch, b"")
+    fc.decompress(tmp_compressed, STDIO_PATH, Huffman())
+    assert stdout.getvalue() == data
+
+    stdout = pipe_stdio(monkeypatch, tmp_compressed.read_bytes())
+    fc.decompress(STDIO_PATH, STDIO_PATH, Huffman())
+    assert stdout.getvalue() == data
+
+
+def test_file_compressor_stdio_truncated_block_container(monkeypatch: Any):
+    fc = FileCompressor(block_size=1000, workers=1)
+    stdout = pipe_stdio(monkeypatch, NON_ASCII_TEXT.encode())
+    fc.compress(STDIO_PATH, STDIO_PATH, Huffman())
+    compressed = stdout.getvalue()
+
+    pipe_stdio(monkeypatch, compressed[: len(compressed) // 2])
+    with raises(FileCompressionError, match="truncated"):
+        fc.decompress(STDIO_PATH, STDIO_PATH, Huffman())
+
+
+def test_logging_opt_in(tmp_path: Path, monkeypatch: Any):
+    input_path = REPETITIVE_SENTENCE_TEXT_FILE.absolute()
+    monkeypatch.chdir(tmp_path)
+    fc = FileCompressor()
+    fc.compress(input_path, tmp_path / "a.lzw", LZW())
+    assert list(tmp_path.iterdir()) == [tmp_path / "a.lzw"]
+    assert logfile() is None
+
+    package_logger = logging.getLogger("compressor")
+    handlers = list(package_logger.handlers)
+    try:
+        configure(tmp_path / "debug.log")
+        fc.compress(input_path, tmp_path / "b.lzw", LZW())
+        configure(tmp_path / "debug.log")  # Appends instead of truncating
+        assert logfile() == tmp_path / "debug.log"
+    finally:
+        for handler in package_logger.handlers[len(handlers) :]:
+            handler.close()
+        package_logger.handlers = handlers
+        package_logger.setLevel(logging.NOTSET)
+    assert "Compression method" in (tmp_path / "debug.log").read_text()
+
+
+def test_cli_import_defers_methods():
+    # The methods and multiprocessing are imported only when used, e.g. not for -h
+    check = (
+        "import sys, compressor.cli; "
+        + "print(sorted({'bitarray', 'multiprocessing', 'compressor.compression_methods.lzw'}"
+        + " & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+@mark.parametrize("method", ["huffman", "lzw"])
+def test_cli_batch_multiple_inputs(
+    tmp_path: Path, batch_dir: Path, monkeypatch: Any, method: str
+):
+    inputs = [str(batch_dir / "a.txt"), str(batch_dir / "b.bin"), str(batch_dir / "nested")]
+    compressed = tmp_path / "compressed"
+    monkeypatch.setattr(
+        sys, "argv", ["compressor", "compress", method, *inputs, str(compressed), "--batch"]
+    )
+    run()
+    assert sorted(file.name for file in compressed.rglob("*") if file.is_file()) == [
+        f"a.txt.{method}",
+        f"b.bin.{method}",
+        f"c.txt.{method}",
+    ]
+
+    decompressed = tmp_path / "decompressed"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["compressor", "decompress", method, str(compressed), str(decompressed), "--batch"],
+    )
+    run()
+    for file, relative in batch_inputs([str(batch_dir / "a.txt"), str(batch_dir / "b.bin")]):
+        assert filecmp.cmp(file, decompressed / relative, shallow=False)
+    assert filecmp.cmp(
+        batch_dir / "nested" / "c.txt", decompressed / "c.txt", shallow=False
+    )
+
+
+@mark.parametrize(
+    "options", [["--huffman-order", "1"], ["--huffman-max-code-len", "12"]]
+)
+def test_cli_huffman_dictionary_rejects_code_options(
+    tmp_path: Path, monkeypatch: Any, capsys: Any, options: list[str]
+):
+    dictionary_path = tmp_path / "dictionary"
+    HuffmanDictionary.train([NON_ASCII_TEXT.encode()]).save(dictionary_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "compressor",
+            "compress",
+            "huffman",
+            str(REPETITIVE_SENTENCE_TEXT_FILE),
+            str(tmp_path / "compressed"),
+            "--huffman-dictionary",
+            str(dictionary_path),
+            *options,
+        ],
+    )
+    with raises(SystemExit) as exit_info:
+        run()
+    assert exit_info.value.code == 2
+    assert "--huffman-dictionary cannot be used" in capsys.readouterr().err
+    assert not (tmp_path / "compressed").exists()
+
+
+def test_cli_lzw_dictionary_too_large(tmp_path: Path, monkeypatch: Any, capsys: Any):
+    dictionary_path = tmp_path / "dictionary"
+    samples = [random.Random(0).randbytes(100_000)]
+    LZWDictionary.train(samples, size=5000).save(dictionary_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "compressor",
+            "compress",
+            "lzw",
+            str(REPETITIVE_SENTENCE_TEXT_FILE),
+            str(tmp_path / "compressed"),
+            "--lzw-dictionary",
+            str(dictionary_path),
+        ],
+    )
+    # Too large for the 12-bit codes of the fixed width mode
+    with raises(SystemExit) as exit_info:
+        run()
+    assert exit_info.value.code == 2
+    assert "does not fit in 12 bit codes" in capsys.readouterr().err
+    assert not (tmp_path / "compressed").exists()
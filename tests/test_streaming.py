@@ -0,0 +1,168 @@
+from io import BytesIO
+from typing import Iterator
+from pytest import mark, raises
+
+from compressor import streaming
+from compressor.block_container import (
+    MAGIC,
+    BlockContainerError,
+    read_index,
+)
+from compressor.compression_methods import LZW, Huffman, LZWDictionary
+from compressor.compression_methods.interface import (
+    CompressionMethod,
+    CompressionMethodError,
+)
+
+from .common import BINARY_DATA, NON_ASCII_TEXT, REPETITIVE_SENTENCE_TEXT_FILE
+
+DATA = NON_ASCII_TEXT.encode() + BINARY_DATA
+
+
+def fragments(data: bytes, size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def stream_compress(
+    method: CompressionMethod, data: bytes, size: int, block_size: int | None = None
+) -> bytes:
+    compressobj = streaming.compressobj(method, block_size)
+    compressed = b"".join(compressobj.compress(f) for f in fragments(data, size))
+    return compressed + compressobj.flush()
+
+
+def stream_decompress(method: CompressionMethod, compressed: bytes, size: int) -> bytes:
+    decompressobj = streaming.decompressobj(method)
+    data = b"".join(decompressobj.decompress(f) for f in fragments(compressed, size))
+    return data + decompressobj.flush()
+
+
+@mark.parametrize(
+    "method",
+    [LZW(), LZW(variable_width=True), Huffman(), Huffman(order=1)],
+    ids=["lzw", "lzw_variable_width", "huffman", "huffman_order1"],
+)
+@mark.parametrize("size", [1, 100, 1 << 20])
+def test_streaming_roundtrip(method: CompressionMethod, size: int):
+    compressed = stream_compress(method, DATA, size, block_size=3000)
+    assert stream_decompress(method, compressed, size) == DATA
+
+
+@mark.parametrize(
+    "method", [LZW(), LZW(variable_width=True)], ids=["fixed", "variable_width"]
+)
+def test_lzw_streaming_matches_compress_bytes(method: LZW):
+    data = REPETITIVE_SENTENCE_TEXT_FILE.read_bytes()[:200_000]
+    compressed = stream_compress(method, data, 777)
+
+    # Only the padding length in the fixed width header differs
+    assert compressed[1:] == method.compress_bytes(data)[1:]
+    assert stream_decompress(method, method.compress_bytes(data), 555) == data
+
+
+def test_lzw_streaming_with_dictionary():
+    dictionary = LZWDictionary.train([DATA], size=100)
+    method = LZW(dictionary=dictionary)
+
+    compressed = stream_compress(method, DATA, 3)
+    assert stream_decompress(method, compressed, 2) == DATA
+    assert method.decompress_bytes(compressed) == DATA
+
+
+def test_huffman_streaming_uses_block_mode():
+    compressed = stream_compress(Huffman(), DATA, 1000, block_size=4096)
+    assert compressed.startswith(b"CMPB")
+    assert stream_decompress(Huffman(), compressed, 1000) == DATA
+
+
+def test_streaming_output_before_flush():
+    compressobj = streaming.compressobj(Huffman(), block_size=1000)
+    assert len(compressobj.compress(DATA[:2500])) > 0
+
+    decompressobj = streaming.decompressobj(LZW())
+    compressed = LZW().compress_bytes(DATA)
+    assert DATA.startswith(decompressobj.decompress(compressed[:1000]))
+    assert len(decompressobj.decompress(compressed[1000:2000])) > 0
+
+
+def test_streaming_block_method_from_container():
+    # Each block is decompressed with the method stored before it, like FileCompressor
+    # does with the method in the index
+    compressed = stream_compress(LZW(), DATA, 1000, block_size=1000)
+    assert stream_decompress(Huffman(), compressed, 700) == DATA
+
+
+def version3_container(compressed: bytes) -> bytes:
+    """Rewrites a block container without the method ids before the blocks."""
+    blocks = read_index(BytesIO(compressed))
+    container = bytearray(MAGIC + bytes([3]))
+    index: list[bytes] = []
+    for block in blocks:
+        data = compressed[
+            block.compressed_offset : block.compressed_offset + block.compressed_size
+        ]
+        container += block.compressed_size.to_bytes(8, "big")
+        index.append(block._replace(compressed_offset=len(container)).to_bytes())
+        container += data
+    container += bytes(8)
+    index_offset = len(container)
+    container += b"".join(index)
+    container += len(blocks).to_bytes(8, "big") + index_offset.to_bytes(8, "big")
+    return bytes(container)
+
+
+def test_streaming_version3_block_container():
+    compressed = version3_container(
+        stream_compress(Huffman(), DATA, 1000, block_size=1000)
+    )
+    assert stream_decompress(Huffman(), compressed, 700) == DATA
+
+    # The blocks are expected to be compressed with the given method
+    decompressobj = streaming.decompressobj(Huffman())
+    with raises((BlockContainerError, CompressionMethodError)):
+        decompressobj.decompress(
+            version3_container(stream_compress(LZW(), DATA, 1000, block_size=1000))
+        )
+        decompressobj.flush()
+
+
+def test_streaming_empty_block_container():
+    compressed = stream_compress(Huffman(), b"", 1)
+    assert stream_decompress(Huffman(), compressed, 1) == b""
+
+
+def test_streaming_truncated_block_container():
+    compressed = stream_compress(Huffman(), DATA, 1000, block_size=1000)
+
+    decompressobj = streaming.decompressobj(Huffman())
+    decompressobj.decompress(compressed[: len(compressed) // 2])
+    with raises(BlockContainerError):
+        decompressobj.flush()
+
+
+def test_streaming_corrupted_index():
+    compressed = bytearray(stream_compress(Huffman(), DATA, 1000, block_size=1000))
+    # Flip a bit in the checksum of the last block
+    compressed[-17] ^= 1
+
+    with raises(BlockContainerError):
+        stream_decompress(Huffman(), bytes(compressed), 1000)
+
+
+def test_streaming_huffman_single_stream():
+    with raises(CompressionMethodError):
+        stream_decompress(Huffman(), Huffman().compress_bytes(DATA), 1000)
+
+
+def test_streaming_use_after_flush():
+    compressobj = streaming.compressobj(LZW())
+    compressobj.compress(DATA)
+    compressobj.flush()
+    with raises(CompressionMethodError):
+        compressobj.compress(DATA)
+
+
+def test_streaming_invalid_block_size():
+    with raises(ValueError):
+        streaming.compressobj(LZW(), block_size=0)